@@ -0,0 +1,90 @@
+import heapq
+from datetime import datetime
+import numpy as np
+
+# ---------- CONFIG ----------
+MATCH_WEIGHT = 10    # points par mot-clé tendance présent dans l'article
+MAX_RECENCY = 30     # points de récence : 30 aujourd'hui, 0 après 30 jours
+
+
+def parse_alert_date(raw):
+    """Date d'un article (datetime, "%Y-%m-%d %H:%M:%S" ou ISO), None sinon."""
+    if not raw:
+        return None
+    if isinstance(raw, datetime):
+        d_obj = raw
+    else:
+        s = str(raw)
+        try:
+            d_obj = datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            try:
+                d_obj = datetime.fromisoformat(s)
+            except ValueError:
+                return None
+    # dates avec fuseau : non comparables à datetime.now(), ignorées
+    return d_obj if d_obj.tzinfo is None else None
+
+
+class AlertScorer:
+    """
+    Score des articles pour les alertes :
+      score = MATCH_WEIGHT * nb de mots-clés tendance contenus dans le texte
+              + récence (MAX_RECENCY - âge en jours, au moins 0),
+    seuls les articles contenant au moins un mot-clé sont retenus.
+    Les textes (title + summary + mots_cles, en minuscules) et les dates sont
+    préparés une seule fois ; chaque mot-clé distinct donne ensuite un seul
+    balayage des textes, et récence, scores et seuil sont calculés en NumPy.
+    """
+
+    def __init__(self, articles):
+        self.articles = list(articles)
+        texts = []
+        dates = []
+        for art in self.articles:
+            title = art.get("title", "") or ""
+            summary = art.get("summary", "") or art.get("summary_short", "") or ""
+            mots_cles = art.get("mots_cles", "") or ""
+            texts.append(f"{title} {summary} {mots_cles}".lower())
+            dates.append(parse_alert_date(art.get("collected_at") or art.get("published")))
+
+        self.texts = texts
+        self.dates = np.array(dates, dtype="datetime64[us]")   # None -> NaT
+
+    def __len__(self):
+        return len(self.articles)
+
+    def match_counts(self, keywords):
+        """Nombre de mots-clés (avec répétitions de la liste) contenus dans chaque article."""
+        counts = np.zeros(len(self.articles), dtype=np.int64)
+        multiplicity = {}
+        for kw in keywords:
+            kw_lower = (kw or "").lower()
+            if kw_lower:
+                multiplicity[kw_lower] = multiplicity.get(kw_lower, 0) + 1
+
+        n = len(self.texts)
+        for kw, weight in multiplicity.items():
+            found = np.fromiter((kw in text for text in self.texts), dtype=bool, count=n)
+            counts[found] += weight
+        return counts
+
+    def recency_scores(self, now=None):
+        """MAX_RECENCY - âge en jours (borné à 0), 0 pour les dates inconnues."""
+        now = np.datetime64(now or datetime.now(), "us")
+        missing = np.isnat(self.dates)
+        days = (now - np.where(missing, now, self.dates)) // np.timedelta64(1, "D")
+        return np.where(missing, 0, np.maximum(0, MAX_RECENCY - days))
+
+    def top(self, keywords, top_n=3, now=None):
+        """Retourne [(article, score)] des top_n meilleurs articles, score décroissant."""
+        if not self.articles:
+            return []
+        counts = self.match_counts(keywords)
+        candidates = np.nonzero(counts)[0]
+        if not len(candidates):
+            return []
+        scores = (counts * MATCH_WEIGHT + self.recency_scores(now)).tolist()
+        # à score égal, l'ordre d'origine des articles est conservé
+        best = heapq.nlargest(top_n, candidates.tolist(), key=scores.__getitem__)
+        return [(self.articles[i], scores[i]) for i in best]
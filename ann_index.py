@@ -0,0 +1,576 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+from db_mysql import iter_article_embeddings
+
+# ---------- CONFIG ----------
+BASE_DIR = os.path.dirname(__file__)
+ANN_DIR = os.path.join(BASE_DIR, "data", "ann_index")
+
+# journal des ajouts / suppressions depuis la dernière génération
+_OP_REMOVE = 0
+_OP_ADD = 1
+
+
+def _normalize(mat):
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _normalized_f16(vectors, chunk_size=20000):
+    """Vecteurs normalisés en float16, par paquets (pas de copie float32 complète)."""
+    vectors = np.asarray(vectors)
+    out = np.empty(vectors.shape, dtype=np.float16)
+    for i in range(0, len(vectors), chunk_size):
+        out[i:i + chunk_size] = _normalize(vectors[i:i + chunk_size])
+    return out
+
+
+def _record_dtype(dim):
+    return np.dtype([("op", "i1"), ("id", "<i8"), ("vec", "<f2", (dim,))])
+
+
+def _load_array(path):
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # tableau vide : rien à projeter en mémoire
+        return np.load(path)
+
+
+class IVFIndex:
+    """
+    Index de plus proches voisins approché (IVF) en NumPy :
+    les vecteurs normalisés sont répartis en listes selon le centroïde
+    (k-means sphérique) le plus proche ; une recherche ne parcourt que les
+    nprobe listes les plus proches de la requête.
+    Tant que l'index est petit, une seule liste = recherche exacte.
+
+    Stockage : une base (vecteurs contigus par liste, projetables en mémoire
+    depuis le disque) + un delta en mémoire (ajouts et suppressions depuis la
+    base, rejoués depuis le journal). compact() refond le delta dans la base.
+    Les mises à jour et les recherches sur une même instance sont
+    sérialisées par un verrou (l'index est partagé entre threads).
+    """
+
+    MIN_BUILD_SIZE = 2000       # en dessous : une seule liste (force brute)
+    REBUILD_FACTOR = 4          # re-clustering quand la taille a été multipliée par 4
+    COMPACT_MIN_DELTA = 20000   # compaction quand le delta dépasse ce nombre de lignes...
+    COMPACT_RATIO = 0.1         # ... et cette fraction de la base
+
+    def __init__(self, dim=None):
+        self.dim = dim
+        self.centroids = None           # (nlist, dim) float32 normalisés
+        self.built_size = 0
+        self._set_base(np.empty(0, dtype=np.int64),
+                       np.empty((0, dim or 0), dtype=np.float16),
+                       np.zeros(2, dtype=np.int64))
+        self._lock = threading.RLock()
+
+    def _set_base(self, ids, vecs, offsets, sorted_ids=None, order=None):
+        """Base : ids / vecs triés par liste, liste c = lignes offsets[c]:offsets[c+1]."""
+        self._ids = ids
+        self._vecs = vecs
+        self._offsets = offsets
+        if order is None:
+            order = np.argsort(ids, kind="stable")
+            sorted_ids = np.asarray(ids)[order]
+        self._order = order
+        self._sorted_ids = sorted_ids
+        self._removed = set()           # ids de la base supprimés ou remplacés
+        self._removed_arr = None
+        self._delta_ids = np.empty(0, dtype=np.int64)
+        self._delta_vecs = np.empty((0, self.dim or 0), dtype=np.float16)
+        self._delta_assign = np.empty(0, dtype=np.int64)
+        self._delta_alive = np.empty(0, dtype=bool)
+        self._delta_pos = {}            # article_id -> ligne vivante du delta
+
+    def __len__(self):
+        return len(self._ids) - len(self._removed) + len(self._delta_pos)
+
+    @property
+    def nlist(self):
+        return len(self._offsets) - 1
+
+    # --------- construction ---------
+
+    def build(self, ids, vectors, nlist=None, iters=10, seed=0):
+        """(Re)construit l'index complet à partir de tous les vecteurs."""
+        with self._lock:
+            self._build(np.asarray(ids, dtype=np.int64), _normalized_f16(vectors),
+                        nlist, iters, seed)
+
+    def _build(self, ids, vecs, nlist, iters, seed):
+        """ids / vecs : float16 déjà normalisés."""
+        n = len(ids)
+        if n:
+            self.dim = vecs.shape[1]
+
+        if n < self.MIN_BUILD_SIZE:
+            self.centroids = None
+            self.built_size = n
+            self._set_base(ids, vecs, np.array([0, n], dtype=np.int64))
+            return
+
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = vecs[np.sort(rng.choice(n, size=min(n, nlist * 40), replace=False))].astype(np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        self.centroids = centroids
+        self.built_size = n
+        self._set_lists(ids, vecs, self._assign(vecs))
+
+    def _set_lists(self, ids, vecs, assign):
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(self._nlist_for_centroids() + 1))
+        self._set_base(ids[order], vecs[order], offsets.astype(np.int64))
+
+    def _nlist_for_centroids(self):
+        return 1 if self.centroids is None else len(self.centroids)
+
+    def _assign(self, vecs, chunk_size=20000):
+        if self.centroids is None:
+            return np.zeros(len(vecs), dtype=np.int64)
+        out = np.empty(len(vecs), dtype=np.int64)
+        for i in range(0, len(vecs), chunk_size):
+            chunk = np.asarray(vecs[i:i + chunk_size], dtype=np.float32)
+            out[i:i + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return out
+
+    def _base_row(self, article_id):
+        """Ligne de l'article dans la base (recherche dichotomique), ou None."""
+        k = int(np.searchsorted(self._sorted_ids, article_id))
+        if k < len(self._sorted_ids) and int(self._sorted_ids[k]) == article_id:
+            return int(self._order[k])
+        return None
+
+    # --------- mise à jour incrémentale ---------
+
+    def add(self, ids, vectors):
+        """Ajoute (ou remplace) des vecteurs sans reconstruire l'index."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        with self._lock:
+            self._add(ids, _normalized_f16(vectors))
+
+    def _add(self, ids, vecs):
+        if self.dim is None or not self._vecs.shape[1]:
+            self.dim = vecs.shape[1]
+            self._vecs = np.empty((0, self.dim), dtype=np.float16)
+            self._delta_vecs = np.empty((0, self.dim), dtype=np.float16)
+        # dernière occurrence d'un id répété dans le lot
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - last)
+        ids, vecs = ids[keep], vecs[keep]
+        self._remove(ids.tolist())
+
+        start = len(self._delta_ids)
+        self._delta_ids = np.concatenate([self._delta_ids, ids])
+        self._delta_vecs = np.concatenate([self._delta_vecs, vecs])
+        self._delta_assign = np.concatenate([self._delta_assign, self._assign(vecs)])
+        self._delta_alive = np.concatenate([self._delta_alive, np.ones(len(ids), dtype=bool)])
+        self._delta_pos.update({int(i): start + k for k, i in enumerate(ids.tolist())})
+
+    def remove(self, ids):
+        with self._lock:
+            self._remove(ids)
+
+    def _remove(self, ids):
+        for i in ids:
+            i = int(i)
+            row = self._delta_pos.pop(i, None)
+            if row is not None:
+                self._delta_alive[row] = False
+            elif i not in self._removed and self._base_row(i) is not None:
+                self._removed.add(i)
+                self._removed_arr = None
+
+    def needs_compaction(self):
+        """Delta trop gros, ou index à (re)clusteriser."""
+        n = len(self)
+        if n >= self.MIN_BUILD_SIZE and (
+                self.centroids is None or n > self.REBUILD_FACTOR * self.built_size):
+            return True
+        pending = len(self._delta_ids) + len(self._removed)
+        return pending > max(self.COMPACT_MIN_DELTA, self.COMPACT_RATIO * len(self._ids))
+
+    def compact(self):
+        """
+        Refond le delta dans la base. Les listes existantes sont conservées
+        (pas de ré-affectation) sauf si l'index doit être re-clusterisé.
+        """
+        with self._lock:
+            base_labels = np.repeat(np.arange(self.nlist), np.diff(self._offsets))
+            live = np.ones(len(self._ids), dtype=bool)
+            if self._removed:
+                live = ~np.isin(self._ids, self._removed_array())
+            alive = self._delta_alive
+            ids = np.concatenate([np.asarray(self._ids)[live], self._delta_ids[alive]])
+            vecs = np.concatenate([np.asarray(self._vecs)[live], self._delta_vecs[alive]])
+            labels = np.concatenate([base_labels[live], self._delta_assign[alive]])
+
+            n = len(ids)
+            if n >= self.MIN_BUILD_SIZE and (
+                    self.centroids is None or n > self.REBUILD_FACTOR * self.built_size):
+                self._build(ids, vecs, None, 10, 0)
+            else:
+                self._set_lists(ids, vecs, labels)
+
+    def _removed_array(self):
+        if self._removed_arr is None:
+            self._removed_arr = np.fromiter(self._removed, dtype=np.int64, count=len(self._removed))
+        return self._removed_arr
+
+    # --------- recherche ---------
+
+    def get_vector(self, article_id):
+        with self._lock:
+            return self._get_vector(article_id)
+
+    def _get_vector(self, article_id):
+        article_id = int(article_id)
+        row = self._delta_pos.get(article_id)
+        if row is not None:
+            return self._delta_vecs[row].astype(np.float32)
+        if article_id in self._removed:
+            return None
+        row = self._base_row(article_id)
+        return None if row is None else np.asarray(self._vecs[row], dtype=np.float32)
+
+    def search(self, vector, k=5, nprobe=8, exclude=()):
+        """Retourne [(article_id, score)] des k voisins approchés de vector."""
+        with self._lock:
+            return self._search(vector, k, nprobe, exclude)
+
+    def _search(self, vector, k, nprobe, exclude):
+        if not len(self):
+            return []
+        q = _normalize(vector)
+        if self.centroids is None:
+            probes = np.array([0])
+        else:
+            nprobe = min(nprobe, len(self.centroids))
+            probes = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+
+        # base : seules les listes sondées sont lues (tranches contiguës)
+        id_parts, score_parts = [], []
+        for c in probes:
+            lo, hi = self._offsets[c], self._offsets[c + 1]
+            if hi > lo:
+                id_parts.append(np.asarray(self._ids[lo:hi]))
+                score_parts.append(np.asarray(self._vecs[lo:hi], dtype=np.float32) @ q)
+        ids = np.concatenate(id_parts) if id_parts else np.empty(0, dtype=np.int64)
+        scores = np.concatenate(score_parts) if score_parts else np.empty(0, dtype=np.float32)
+        if self._removed and len(ids):
+            keep = ~np.isin(ids, self._removed_array())
+            ids, scores = ids[keep], scores[keep]
+
+        # delta : lignes vivantes affectées aux listes sondées
+        sel = self._delta_alive & np.isin(self._delta_assign, probes)
+        if sel.any():
+            ids = np.concatenate([ids, self._delta_ids[sel]])
+            scores = np.concatenate([scores, self._delta_vecs[sel].astype(np.float32) @ q])
+
+        if exclude:
+            keep = ~np.isin(ids, list(exclude))
+            ids, scores = ids[keep], scores[keep]
+        k = min(k, len(ids))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def related(self, article_id, k=5, nprobe=8):
+        with self._lock:
+            vec = self._get_vector(article_id)
+            if vec is None:
+                return []
+            return self._search(vec, k, nprobe, (int(article_id),))
+
+
+class PersistentIVFIndex(IVFIndex):
+    """
+    IVFIndex persisté dans un répertoire :
+      - CURRENT : génération courante (JSON, remplacé atomiquement) ;
+      - g<N>.<tableau>.npy : base de la génération, ouverte en memmap
+        (seules les listes sondées sont lues depuis le disque) ;
+      - g<N>.delta : journal append-only des ajouts / suppressions depuis la
+        base, relu par la fin (offset) pour suivre les autres processus.
+    Les écritures se font sous le verrou fichier de l'appelant (update_related_index).
+    """
+
+    _ARRAYS = ("ids", "vecs", "offsets", "sorted_ids", "order")
+
+    def __init__(self, directory, dim=None):
+        super().__init__(dim=dim)
+        self.directory = directory
+        self.generation = 0
+        self._current_mtime = None
+        self._delta_offset = 0
+
+    def _path(self, name, generation=None):
+        return os.path.join(self.directory, f"g{generation or self.generation}.{name}")
+
+    @staticmethod
+    def current_state(directory):
+        """(génération, dim, built_size, mtime_ns de CURRENT) ou None."""
+        path = os.path.join(directory, "CURRENT")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta["generation"], meta["dim"], meta["built_size"], mtime
+
+    @classmethod
+    def open(cls, directory):
+        """Ouvre la génération courante (base en memmap + delta rejoué), ou None."""
+        state = cls.current_state(directory)
+        if state is None:
+            return None
+        generation, dim, built_size, mtime = state
+        index = cls(directory, dim=dim or None)
+        index.generation = generation
+        index.built_size = built_size
+        index._current_mtime = mtime
+        arrays = {name: _load_array(index._path(f"{name}.npy")) for name in cls._ARRAYS}
+        centroids = np.load(index._path("centroids.npy"))
+        index.centroids = centroids if len(centroids) else None
+        index._set_base(arrays["ids"], arrays["vecs"], np.asarray(arrays["offsets"]),
+                        arrays["sorted_ids"], arrays["order"])
+        index.refresh()
+        return index
+
+    def is_current(self):
+        state = self.current_state(self.directory)
+        return state is not None and state[0] == self.generation and state[3] == self._current_mtime
+
+    def refresh(self):
+        """Rejoue les enregistrements ajoutés au journal depuis la dernière lecture."""
+        if not self.dim:
+            return
+        rec = _record_dtype(self.dim)
+        with self._lock:
+            try:
+                with open(self._path("delta"), "rb") as f:
+                    f.seek(self._delta_offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            # un enregistrement en cours d'écriture n'est lu qu'une fois complet
+            usable = len(data) - len(data) % rec.itemsize
+            if usable:
+                self._apply_records(np.frombuffer(data[:usable], dtype=rec))
+                self._delta_offset += usable
+
+    def _apply_records(self, records):
+        # groupes consécutifs de même opération, dans l'ordre du journal
+        ops = records["op"]
+        bounds = np.flatnonzero(np.diff(ops)) + 1
+        for group in np.split(records, bounds):
+            if group["op"][0] == _OP_ADD:
+                # vecteurs déjà normalisés par l'écrivain
+                self._add(group["id"].astype(np.int64), group["vec"].astype(np.float16))
+            else:
+                self._remove(group["id"].tolist())
+
+    def append(self, op, ids, vectors=None):
+        """Ajoute au journal et à l'index en mémoire (sous le verrou fichier)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        if op == _OP_ADD:
+            vecs = _normalized_f16(vectors)
+            if not self.dim:
+                self.dim = vecs.shape[1]
+                self._write_current()
+        else:
+            if not self.dim:
+                return
+            vecs = np.zeros((len(ids), self.dim), dtype=np.float16)
+        rec = _record_dtype(self.dim)
+        records = np.empty(len(ids), dtype=rec)
+        records["op"] = op
+        records["id"] = ids
+        records["vec"] = vecs
+
+        with self._lock:
+            self.refresh()
+            path = self._path("delta")
+            with open(path, "ab") as f:
+                # fin de fichier tronquée par un écrivain interrompu
+                size = f.seek(0, os.SEEK_END)
+                if size != self._delta_offset:
+                    f.truncate(self._delta_offset)
+                f.write(records.tobytes())
+            self._delta_offset += records.nbytes
+            self._apply_records(records)
+
+    def write_generation(self):
+        """
+        Écrit la base courante comme nouvelle génération (journal vide), puis
+        bascule CURRENT. L'avant-dernière génération reste lisible le temps
+        que les autres processus basculent ; les plus anciennes sont supprimées.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            previous = self.generation
+            self.generation = previous + 1
+            arrays = {
+                "ids": self._ids, "vecs": self._vecs, "offsets": self._offsets,
+                "sorted_ids": self._sorted_ids, "order": self._order,
+                "centroids": (self.centroids if self.centroids is not None
+                              else np.empty((0, self.dim or 0), dtype=np.float32)),
+            }
+            for name, arr in arrays.items():
+                tmp = self._path(f"{name}.tmp.npy")
+                np.save(tmp, np.asarray(arr))
+                os.replace(tmp, self._path(f"{name}.npy"))
+            open(self._path("delta"), "wb").close()
+            self._delta_offset = 0
+            self._write_current()
+            # la nouvelle base est relue en memmap (mémoire libérée)
+            self._set_base(*(_load_array(self._path(f"{name}.npy")) for name in self._ARRAYS))
+        self._cleanup(keep_from=previous)
+
+    def _write_current(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, f"CURRENT.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"generation": self.generation, "dim": self.dim or 0,
+                       "built_size": self.built_size}, f)
+        os.replace(tmp, os.path.join(self.directory, "CURRENT"))
+        self._current_mtime = os.stat(os.path.join(self.directory, "CURRENT")).st_mtime_ns
+
+    def _cleanup(self, keep_from):
+        for name in os.listdir(self.directory):
+            if not name.startswith("g"):
+                continue
+            try:
+                generation = int(name[1:].split(".", 1)[0])
+            except ValueError:
+                continue
+            if generation < keep_from:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass  # encore projeté en mémoire (Windows) : au prochain passage
+
+
+# ---------- INDEX PARTAGÉ PAR LE PROCESSUS ----------
+# Les requêtes web ne font que lire : l'index est construit puis tenu à jour
+# par la veille / les workers (update_related_index), sous un verrou fichier
+# qui sérialise les écritures de tous les processus. Un processus lecteur
+# rejoue seulement la fin du journal ; il ne relit la base (en memmap) qu'au
+# changement de génération.
+
+_lock = threading.Lock()
+_indexes = {}   # model_id -> PersistentIVFIndex
+
+
+def _index_dir(model_id):
+    return os.path.join(ANN_DIR, model_id)
+
+
+@contextmanager
+def _file_lock(model_id):
+    """Verrou exclusif inter-processus sur l'index d'un modèle."""
+    directory = _index_dir(model_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "lock"), "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _build_from_db(model_id):
+    ids, blobs, dim = [], [], None
+    for rows in iter_article_embeddings(model_id):
+        dim = rows[0][1]
+        ids.extend(r[0] for r in rows)
+        blobs.extend(r[2] for r in rows)
+    index = PersistentIVFIndex(_index_dir(model_id), dim=dim)
+    if ids:
+        vecs = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(-1, dim)
+        index.build(ids, vecs)
+    index.write_generation()
+    try:
+        # ancien format : un .npz réécrit à chaque paquet
+        os.remove(os.path.join(ANN_DIR, f"{model_id}.npz"))
+    except OSError:
+        pass
+    return index
+
+
+def get_related_index(model_id):
+    """
+    Retourne l'index du modèle (data/ann_index/<model_id>/), à jour des
+    écritures des autres processus, ou None s'il n'a pas encore été construit.
+    """
+    with _lock:
+        index = _indexes.get(model_id)
+        if index is not None and index.is_current():
+            index.refresh()
+            return index
+        try:
+            fresh = PersistentIVFIndex.open(_index_dir(model_id))
+        except (OSError, ValueError) as e:
+            # génération supprimée entre la lecture de CURRENT et l'ouverture
+            print(f"⚠️ Index des articles similaires illisible : {e}")
+            return index
+        if fresh is not None:
+            _indexes[model_id] = fresh
+        return fresh or index
+
+
+def update_related_index(model_id, ids, vectors):
+    """
+    Ajoute les nouveaux vecteurs au journal de l'index (quelques Ko par
+    paquet) ; la base n'est réécrite qu'à la compaction. Au premier appel
+    (pas encore d'index), il est construit depuis la BDD, qui contient déjà
+    ces vecteurs.
+    """
+    with _file_lock(model_id):
+        index = get_related_index(model_id)
+        if index is None:
+            index = _build_from_db(model_id)
+        else:
+            index.append(_OP_ADD, ids, vectors)
+            if index.needs_compaction():
+                index.compact()
+                index.write_generation()
+        with _lock:
+            _indexes[model_id] = index
+
+
+def remove_from_related_index(model_id, ids):
+    """Retire des articles (rejetés) de l'index, s'il existe."""
+    with _file_lock(model_id):
+        index = get_related_index(model_id)
+        if index is not None:
+            index.append(_OP_REMOVE, ids)
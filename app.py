@@ -1,12 +1,17 @@
 # ------------------ Modules standard ------------------
 import datetime
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import json
+import time
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 
 # ------------------ Flask et extensions ------------------
-from flask import Flask, render_template, request, jsonify, session, g, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, g, redirect, url_for
 from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash
 from flask import flash
@@ -16,19 +21,42 @@ from flask import flash
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # ------------------ Modules du projet ------------------
-from roles.analyste import Analyste
+from roles.analyste import Analyste, model_registry, article_term_counts, get_analysis
 from roles.veilleur import Veilleur
+from ann_index import get_related_index, remove_from_related_index
+from response_cache import ResponseCache, cached_view
+from alert_scoring import AlertScorer
+from source_scheduling import SOURCE_STATE_PREFIX, custom_source_name, source_schedules, due_sources
 from db_mysql import (
     get_connection,
+    close_request_connection,
     init_db,
-    get_all_articles,
+    get_articles_page,
+    get_recent_articles,
+    get_articles_for_alerts,
+    get_decideur_stats,
+    bump_data_version,
+    get_source_counts,
     reject_article,
     verify_user,
     get_user_by_id,
     update_password,
     create_user,
     get_user_statistics,
-    get_all_users
+    get_all_users,
+    get_articles_by_ids,
+    create_veille_job,
+    update_veille_job,
+    get_veille_job,
+    add_veille_job_event,
+    prune_veille_job_events,
+    get_veille_job_events,
+    get_scheduler_states,
+    set_scheduler_last_runs,
+    get_last_collected_at,
+    enqueue_task,
+    count_pending_tasks,
+    AdvisoryLock
 )
 
 
@@ -38,6 +66,9 @@ app.secret_key = 'super_secret_key_for_dev_only'
 # Initialise / migre le schéma de la BDD au démarrage de l'app
 init_db()
 
+# Une connexion (issue du pool) par requête, rendue au pool en fin de requête
+app.teardown_appcontext(close_request_connection)
+
 # ========== ROLE-BASED ACCESS CONTROL ==========
 
 
@@ -79,6 +110,16 @@ BASE_DIR = os.path.dirname(__file__)
 CONFIG_FILE = os.path.join(BASE_DIR, "data", "config.json")
 CONFIG_FILE_SAVE = os.path.join(BASE_DIR, "data", "config_save.json")
 
+# nombre d'articles par page sur la page veilleur
+ARTICLES_PAGE_SIZE = 30
+
+# fenêtre (jours de collecte) des articles candidats aux alertes, si
+# alerts_window_days n'est pas configuré ; null/0 = tout le corpus
+ALERTS_WINDOW_DAYS = 90
+
+# cache des tableaux de bord, invalidé par la version des données (BDD)
+response_cache = ResponseCache(max_entries=256, ttl=300)
+
 
 def parse_keywords(raw: str):
     # Transforme une chaîne de mots-clés en liste propre
@@ -105,6 +146,14 @@ def load_config():
     return {}
 
 
+def config_mtime():
+    # Date de modification de la config : les pages qui l'affichent en dépendent
+    try:
+        return os.path.getmtime(CONFIG_FILE)
+    except OSError:
+        return None
+
+
 def save_config(cfg: dict):
     # Sauvegarde la configuration dans un fichier JSON
     # Crée le dossier si nécessaire
@@ -117,139 +166,255 @@ def save_config(cfg: dict):
 
 
 # ---------- SCHEDULER ----------
-# Démarre un planificateur en arrière-plan
-scheduler = BackgroundScheduler()
+# Chaque processus (worker gunicorn) démarre un planificateur, mais seul le
+# leader (détenteur du verrou MySQL) y planifie la veille. Les autres
+# retentent de prendre le verrou à chaque tick : si le leader s'arrête, MySQL
+# libère le verrou et un autre processus prend le relais.
+SCHEDULER_LEADER_LOCK = "veille_ia_scheduler_leader"
+SCHEDULED_RUN_LOCK = "veille_ia_scheduled_run"
+SCHEDULER_TICK_SECONDS = 30
+VEILLE_JOB_ID = "veille_job"
+# le leader vérifie à cet intervalle quelles sources sont dues
+DISPATCH_INTERVAL_MINUTES = 5
+# collecte du dernier article couvert par un envoi d'alertes (mode file)
+ALERTS_STATE = "alerts"
+# dernier rattrapage des articles sans catégorie (mode file), et sa période
+BACKFILL_STATE = "backfill"
+BACKFILL_INTERVAL = timedelta(hours=6)
+
+# coalesce / max_instances : un run en retard n'est exécuté qu'une fois,
+# et jamais en parallèle d'un run encore en cours
+scheduler = BackgroundScheduler(job_defaults={"coalesce": True, "max_instances": 1})
 scheduler.start()
 
+leader_lock = AdvisoryLock(SCHEDULER_LEADER_LOCK)
+_schedule_lock = threading.Lock()
+_dispatch_scheduled = False   # job de dispatch planifié par ce processus
+
 
-def run_veille_from_config():
+def run_veille_from_config(source_names=None):
     """
-    Lance la veille en utilisant la configuration sauvegardée
+    Lance la veille avec la configuration sauvegardée, sur les sources dues
+    (ou sur source_names si fourni).
     """
-    cfg = load_config()
+    # garde-fou inter-processus : un seul run planifié à la fois, même
+    # pendant un changement de leader
+    run_lock = AdvisoryLock(SCHEDULED_RUN_LOCK)
+    if not run_lock.acquire():
+        print("ℹ️ Veille planifiée ignorée : une exécution est déjà en cours")
+        return
+    try:
+        cfg = load_config()
+        if cfg.get("use_work_queue"):
+            send_queued_alerts()
+            enqueue_category_backfill(cfg)
+        due = due_sources(cfg) if source_names is None else list(source_names)
+        names = set(due)
+        if not names:
+            return
+        # la prochaine échéance de chaque source se calcule depuis ce run
+        set_scheduler_last_runs([SOURCE_STATE_PREFIX + n for n in names], datetime.now())
+
+        # Mode file de travail : une tâche de collecte par source, exécutée
+        # (puis classée) par les workers (python worker.py)
+        if cfg.get("use_work_queue"):
+            enqueue_source_fetches(cfg, due)
+            return
+
+        # Sources sélectionnées, flux personnalisés et mots-clés
+        sources = [s for s in cfg.get("sources", []) if s in names]
+        custom_sources = [
+            item for item in cfg.get("custom_sources", [])
+            if custom_source_name(item) in names
+        ]
+        keywords = cfg.get("keywords", "")
+
+        # Séparer les flux RSS de Google Scholar
+        rss_sources = [s for s in sources if s != "google_scholar"]
+
+        # Requête Scholar seulement si sélectionné
+        scholar_query = keywords if "google_scholar" in sources and keywords else None
+
+        print(f"🕒 Veille planifiée : {', '.join(sorted(names))}")
+        # Création et exécution du veilleur (inclut les flux personnalisés persistés)
+        veilleur = Veilleur(
+            sources=rss_sources or None,
+            custom_sources=custom_sources or None,
+            scholar_query=scholar_query,
+            max_workers=cfg.get("max_workers"),
+            analysis_window_days=cfg.get("analysis_window_days")
+        )
+        result = veilleur.run() or {}
 
-    # Sources sélectionnées, flux personnalisés et mots-clés
-    sources = cfg.get("sources", [])
-    custom_sources = cfg.get("custom_sources", [])
+        # Alertes aux décideurs seulement si ce run a apporté des articles
+        # (les sources fréquentes ne déclenchent pas un email à chaque passage)
+        if result.get("inserted"):
+            try:
+                send_veille_alerts()
+            except Exception as e:
+                print(f"Erreur lors de l'envoi des alertes post-veille : {e}")
+    finally:
+        run_lock.release()
+
+
+def enqueue_source_fetches(cfg, names):
+    """Met en file une tâche "fetch" par source (priorité de la source)."""
+    priorities = {name: priority for name, _, priority in source_schedules(cfg)}
+    custom_by_name = {custom_source_name(item): item for item in cfg.get("custom_sources", [])}
     keywords = cfg.get("keywords", "")
 
-    # Séparer les flux RSS de Google Scholar
-    rss_sources = [s for s in sources if s != "google_scholar"]
+    for name in names:
+        if name in custom_by_name:
+            params = {"custom_sources": [custom_by_name[name]]}
+        elif name == "google_scholar":
+            if not keywords:
+                continue
+            params = {"scholar_query": keywords}
+        else:
+            params = {"sources": [name]}
+        enqueue_task(
+            "fetch",
+            {
+                "veilleur": params,
+                "priority": priorities.get(name, 0),
+                "analysis_window_days": cfg.get("analysis_window_days"),
+            },
+            priority=priorities.get(name, 0),
+            pending_key=f"fetch:{name}",
+        )
+    print(f"📥 {len(names)} collectes mises en file : {', '.join(names)}")
 
-    # Requête Scholar seulement si sélectionné
-    scholar_query = keywords if "google_scholar" in sources and keywords else None
 
-    # Création et exécution du veilleur (inclut les flux personnalisés persistés)
-    veilleur = Veilleur(
-        sources=rss_sources or None,
-        custom_sources=custom_sources or None,
-        scholar_query=scholar_query
+def send_queued_alerts():
+    """
+    Mode file de travail : alertes envoyées une fois que les workers ont
+    fini de collecter et classer des articles arrivés depuis le dernier envoi.
+    """
+    latest = get_last_collected_at()
+    if latest is None:
+        return
+    states = get_scheduler_states()
+    if states is None:
+        return
+    last_sent = states.get(ALERTS_STATE)
+    if last_sent is not None and latest <= last_sent:
+        return
+    if count_pending_tasks(("fetch", "classify")):
+        return
+    set_scheduler_last_runs([ALERTS_STATE], latest)
+    send_veille_alerts()
+
+
+def enqueue_category_backfill(cfg):
+    """
+    Mode file de travail : met en file, au plus toutes les BACKFILL_INTERVAL,
+    le rattrapage des articles restés sans catégorie (classification en
+    échec définitif), une fois collectes et classifications terminées.
+    """
+    states = get_scheduler_states()
+    if states is None:
+        return
+    last_run = states.get(BACKFILL_STATE)
+    if last_run is not None and last_run + BACKFILL_INTERVAL > datetime.now():
+        return
+    if count_pending_tasks(("fetch", "classify")):
+        return
+    set_scheduler_last_runs([BACKFILL_STATE], datetime.now())
+    enqueue_task(
+        "backfill",
+        {"analysis_window_days": cfg.get("analysis_window_days")},
+        pending_key="backfill",
     )
-    veilleur.run()
-
-    # Après la fin de la veille, génère et envoie les alertes par email aux décideurs
-    try:
-        send_veille_alerts()
-    except Exception as e:
-        print(f"Erreur lors de l'envoi des alertes post-veille : {e}")
 
 
 def reschedule_job():
-    scheduler.remove_all_jobs()
-    cfg = load_config()
-    freq = cfg.get("frequency", "once")
-
-    if freq == "daily":
-        scheduler.add_job(
-            run_veille_from_config,
-            "interval",
-            days=1,
-            id="veille_job"
-        )
-    elif freq == "weekly":
-        scheduler.add_job(
-            run_veille_from_config,
-            "interval",
-            weeks=1,
-            id="veille_job"
-        )
-    elif freq == "monthly":
-        scheduler.add_job(
-            run_veille_from_config,
-            "interval",
-            weeks=4,
-            id="veille_job"
-        )
-
+    """
+    Planifie le dispatch des sources dues, dans le processus leader
+    seulement. La configuration (intervalles, priorités) est relue à chaque
+    dispatch : une modification faite depuis n'importe quel processus est
+    prise en compte par le leader sans autre propagation.
+    """
+    global _dispatch_scheduled
+    with _schedule_lock:
+        wanted = leader_lock.is_held() and bool(source_schedules(load_config()))
+        if wanted == _dispatch_scheduled:
+            return
+        if wanted:
+            scheduler.add_job(
+                run_veille_from_config,
+                "interval",
+                minutes=DISPATCH_INTERVAL_MINUTES,
+                id=VEILLE_JOB_ID,
+                next_run_time=datetime.now(),
+                replace_existing=True,
+            )
+        elif scheduler.get_job(VEILLE_JOB_ID):
+            scheduler.remove_job(VEILLE_JOB_ID)
+        _dispatch_scheduled = wanted
 
-reschedule_job()
 
+def scheduler_tick():
+    """Élection du leader puis application de la planification courante."""
+    with _schedule_lock:
+        was_leader = leader_lock.is_held()
+        if leader_lock.acquire(timeout=0) and not was_leader:
+            print(f"ℹ️ Processus {os.getpid()} : leader du planificateur")
+    reschedule_job()
 
-# ---------- ALERTS (génération & envoi) ----------
 
-def compute_alerts_from_articles(articles, top_n=3):
-    """Retourne la liste des alertes triées à partir d'une liste d'articles."""
-    analyste_obj = Analyste(load_model=False)
-    analysis = analyste_obj.analyze(data=articles)
-    trending_keywords = analysis.get("trends", {}).get("top_keywords", [])
-    trending_keywords = trending_keywords[:8]
+scheduler.add_job(
+    scheduler_tick,
+    "interval",
+    seconds=SCHEDULER_TICK_SECONDS,
+    id="scheduler_tick",
+    next_run_time=datetime.now(),
+)
 
-    from datetime import datetime
+# Préchargement optionnel des modèles ML partagés : le premier run
+# n'a alors plus à payer le chargement depuis le disque
+if load_config().get("preload_model"):
+    threading.Thread(target=model_registry.warm_up, daemon=True).start()
 
-    alerts = []
-    for art in articles:
-        title = art.get("title", "") or ""
-        summary = art.get("summary", "") or art.get("summary_short", "") or ""
-        mots_cles = art.get("mots_cles", "") or ""
 
-        full_text = f"{title} {summary} {mots_cles}".lower()
+# ---------- ANALYSE ----------
 
-        # Score de correspondance avec les mots-clés tendance
-        match_score = 0
-        for kw in trending_keywords:
-            kw_lower = kw.lower()
-            if kw_lower and kw_lower in full_text:
-                match_score += 1
+def build_analysis():
+    """
+    Analyse des articles non rejetés, lue depuis le snapshot produit en fin
+    de veille (recalculée seulement s'il est absent ou périmé).
+    Fenêtre optionnelle : clé analysis_window_days de la configuration.
+    En mode file de travail, le recalcul avec le modèle est confié aux workers.
+    """
+    cfg = load_config()
+    return get_analysis(days=cfg.get("analysis_window_days"),
+                        queue_refresh=bool(cfg.get("use_work_queue")))
 
-        if match_score == 0:
-            continue
 
-        # Score de récence sur 0-30 (plus récent = plus élevé)
-        raw_date = art.get("collected_at") or art.get("published")
-        recency_label = calculate_recency(raw_date)
+# ---------- ALERTS (génération & envoi) ----------
 
-        recency_score = 0
-        if raw_date:
-            try:
-                if isinstance(raw_date, datetime):
-                    d_obj = raw_date
-                else:
-                    s = str(raw_date)
-                    try:
-                        d_obj = datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
-                    except ValueError:
-                        d_obj = datetime.fromisoformat(s)
-                days = (datetime.now() - d_obj).days
-                recency_score = max(0, 30 - days)
-            except Exception:
-                recency_score = 0
-
-        total_score = match_score * 10 + recency_score
+def compute_alerts_from_articles(articles, top_n=3, trending_keywords=None):
+    """
+    Retourne les top_n alertes (score décroissant) parmi les articles.
+    Mots-clés tendance : ceux de l'analyse si non fournis.
+    """
+    if trending_keywords is None:
+        analysis = build_analysis()
+        trending_keywords = analysis.get("trends", {}).get("top_keywords", [])[:8]
 
+    alerts = []
+    for art, score in AlertScorer(articles).top(trending_keywords, top_n=top_n):
+        summary = art.get("summary", "") or art.get("summary_short", "") or ""
         alerts.append({
-            "title": title,
+            "title": art.get("title", "") or "",
             "source": art.get("source", "Inconnu"),
             "published": art.get("published") or "Date inconnue",
             "summary": summary,
             "summary_short": art.get("summary_short") or (summary[:600] if summary else ""),
             "link": art.get("link"),
-            "recency_label": recency_label,
-            "score": total_score,
+            "recency_label": calculate_recency(art.get("collected_at") or art.get("published")),
+            "score": score,
         })
-
-    # Trier par score décroissant et garder les N meilleures alertes
-    alerts.sort(key=lambda x: x["score"], reverse=True)
-    return alerts[:top_n]
+    return alerts
 
 
 def send_alerts_via_email(alerts):
@@ -333,16 +498,80 @@ def send_alerts_via_email(alerts):
         print(f"Erreur lors de l'envoi des alertes par email : {e}")
 
 
+def alerts_window_days():
+    """Fenêtre des alertes : alerts_window_days de la configuration, sinon ALERTS_WINDOW_DAYS."""
+    return load_config().get("alerts_window_days", ALERTS_WINDOW_DAYS)
+
+
 def send_veille_alerts():
-    """Collecte les articles récents, calcule les alertes et les envoie."""
+    """Collecte les articles récents, calcule les alertes et les envoie.
+    Retourne le nombre d'alertes envoyées."""
     try:
-        articles = get_all_articles()
+        articles = get_articles_for_alerts(days=alerts_window_days())
         alerts = compute_alerts_from_articles(articles, top_n=3)
         if alerts:
             send_alerts_via_email(alerts)
+        return len(alerts)
     except Exception as e:
         print(
             f"Erreur lors de la génération/envoi des alertes post-veille : {e}")
+        return 0
+
+
+# ---------- JOBS DE VEILLE (arrière-plan) ----------
+# durée max d'un flux SSE de progression (le worker HTTP est occupé pendant
+# ce temps ; le navigateur se reconnecte ensuite), intervalle de lecture
+JOB_EVENTS_MAX_DURATION = 60
+JOB_EVENTS_POLL_INTERVAL = 1
+
+# Les veilles lancées depuis l'interface tournent hors de la requête HTTP ;
+# leur statut est persisté en BDD (consultable depuis n'importe quel worker).
+veille_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="veille")
+
+
+def submit_veille_job(params, created_by=None):
+    """
+    Crée le job et le soumet à l'exécuteur, sauf si une veille avec les mêmes
+    paramètres est déjà en cours. Retourne (job_id, créé ?).
+    """
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    config_key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    job_id, created = create_veille_job(uuid.uuid4().hex, config_key, payload, created_by)
+    if created:
+        veille_executor.submit(run_veille_job, job_id, params)
+    return job_id, created
+
+
+def run_veille_job(job_id, params):
+    """Exécute une veille puis l'envoi des alertes, en suivant le statut du job."""
+    def progress(event, data):
+        add_veille_job_event(job_id, event, json.dumps(data, default=str))
+
+    update_veille_job(job_id, "running", "Collecte en cours")
+    try:
+        result = Veilleur(progress=progress, **params).run() or {}
+    except Exception as e:
+        print(f"Erreur lors du job de veille {job_id} : {e}")
+        # "error" est réservé par EventSource (erreur de connexion)
+        progress("run_error", {"message": str(e)})
+        update_veille_job(job_id, "error", f"Erreur lors de la veille : {e}")
+        prune_veille_job_events()
+        return
+
+    # Après la veille, envoyer les alertes par email
+    started = time.perf_counter()
+    progress("alerts_started", {})
+    sent = send_veille_alerts()
+    progress("alerts_finished", {
+        "alerts": sent,
+        "duration_ms": int((time.perf_counter() - started) * 1000),
+    })
+    update_veille_job(
+        job_id, "done",
+        f"{result.get('inserted', 0)} articles ajoutés",
+        json.dumps(result),
+    )
+    prune_veille_job_events()
 
 
 # ---------- LOGIN & SESSION ----------
@@ -535,6 +764,7 @@ def dashboard_admin_create_account():
 
 @app.route('/api/admin/stats', methods=['GET'])
 @require_role('admin')
+@cached_view(response_cache)
 def api_admin_stats():
     """
     Récupère les statistiques des utilisateurs
@@ -616,9 +846,11 @@ def logout():
 
 @app.route('/')
 @require_role('admin', 'veilleur')
+@cached_view(response_cache, vary=config_mtime)
 def index():
-    articles = get_all_articles()
-    sources = sorted({a["source"] for a in articles})
+    # première page seulement, les suivantes sont chargées via /api/articles
+    articles, next_cursor = get_articles_page(limit=ARTICLES_PAGE_SIZE)
+    source_counts = get_source_counts()
 
     # Charger la configuration actuelle pour afficher
     # les flux RSS personnalisés et autres paramètres sur la page veilleur
@@ -627,11 +859,35 @@ def index():
     return render_template(
         "veilleur.html",
         articles=articles,
-        sources=sources,
+        next_cursor=next_cursor,
+        sources=list(source_counts),
+        source_counts=source_counts,
+        total_articles=sum(source_counts.values()),
         current_config=current_config,
     )
 
 
+@app.route('/api/articles', methods=['GET'])
+@require_role('admin', 'veilleur', 'analyste')
+def api_articles():
+    """
+    Liste paginée (curseur) des articles non rejetés, filtrable par source /
+    catégorie, avec recherche q sur le titre et le résumé.
+    """
+    limit = min(max(request.args.get('limit', ARTICLES_PAGE_SIZE, type=int), 1), 100)
+    try:
+        articles, next_cursor = get_articles_page(
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            source=request.args.get('source') or None,
+            categorie=request.args.get('categorie') or None,
+            q=(request.args.get('q') or '').strip()[:200] or None,
+        )
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Curseur invalide'}), 400
+    return jsonify({'articles': articles, 'next_cursor': next_cursor})
+
+
 @app.route('/configuration')
 @require_role('admin', 'veilleur')
 def configuration():
@@ -751,31 +1007,95 @@ def lancer():
     # --- préparer la query Google Scholar ---
     scholar_query = keywords if "google_scholar" in selected_sources else None
 
-    # --- création du Veilleur avec paramètres directs ---
-    veilleur = Veilleur(
-        sources=[s for s in selected_sources if s !=
-                 "google_scholar"],  # flux prédéfinis
+    # --- paramètres du Veilleur pour ce run ---
+    params = {
+        "sources": [s for s in selected_sources if s != "google_scholar"],  # flux prédéfinis
         # flux personnalisés
-        custom_sources=custom_sources_to_use if custom_sources_to_use else None,
-        scholar_query=scholar_query,
-        keywords=keywords,
-        frequency=frequency,
-        date_from=date_from,
-        date_to=date_to,
-    )
+        "custom_sources": custom_sources_to_use if custom_sources_to_use else None,
+        "scholar_query": scholar_query,
+        "keywords": keywords,
+        "frequency": frequency,
+        "date_from": date_from,
+        "date_to": date_to,
+        "max_workers": cfg.get("max_workers"),
+        "analysis_window_days": cfg.get("analysis_window_days"),
+    }
+
+    # --- lancer la veille en arrière-plan (une seule par configuration) ---
+    job_id, created = submit_veille_job(params, created_by=session.get('user_id'))
+    if created:
+        flash("✅ Veille lancée en arrière-plan.", "success")
+    else:
+        flash("ℹ️ Une veille identique est déjà en cours.", "success")
 
-    # --- lancer la veille ---
-    veilleur.run()
+    return redirect(url_for('index', job=job_id))
 
-    # Après lancement manuel, envoyer les alertes par email
-    try:
-        send_veille_alerts()
-        flash("✅ Veille lancée et alertes envoyées.", "success")
-    except Exception as e:
-        print(f"Erreur envoi alertes après lancement manuel: {e}")
-        flash("✅ Veille lancée (mais erreur lors de l'envoi des alertes).", "warning")
 
-    return redirect("/")
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@require_role('admin', 'veilleur')
+def api_job_status(job_id):
+    """Statut d'un job de veille (pending, running, done, error)."""
+    job = get_veille_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job introuvable'}), 404
+    return jsonify({
+        'success': True,
+        'id': job['id'],
+        'status': job['status'],
+        'message': job['message'],
+        'result': json.loads(job['result']) if job['result'] else None,
+        'created_at': job['created_at'].isoformat() if job['created_at'] else None,
+        'started_at': job['started_at'].isoformat() if job['started_at'] else None,
+        'finished_at': job['finished_at'].isoformat() if job['finished_at'] else None,
+    })
+
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+@require_role('admin', 'veilleur')
+def api_job_events(job_id):
+    """
+    Progression d'un job en Server-Sent Events (un évènement SSE par étape :
+    fetch_started / fetch_finished par source, stage, alerts_*, run_finished,
+    run_error), terminée par un évènement "end". Au bout de
+    JOB_EVENTS_MAX_DURATION, un évènement "reconnect" invite le client à
+    rouvrir le flux avec ?after= (reprise aussi possible via Last-Event-ID).
+    """
+    if not get_veille_job(job_id):
+        return jsonify({'success': False, 'message': 'Job introuvable'}), 404
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.args.get("after") or 0)
+    except ValueError:
+        last_id = 0
+
+    # hors contexte de requête : chaque lecture prend (et rend) sa propre
+    # connexion du pool, sans en garder une pendant toute la durée du flux
+    def stream(last_id):
+        deadline = time.monotonic() + JOB_EVENTS_MAX_DURATION
+        while time.monotonic() < deadline:
+            events = get_veille_job_events(job_id, after_id=last_id)
+            for ev in events:
+                last_id = ev["id"]
+                yield f"id: {ev['id']}\nevent: {ev['event']}\ndata: {ev['data']}\n\n"
+            if events:
+                continue
+
+            job = get_veille_job(job_id)
+            if not job or job["status"] in ("done", "error"):
+                # derniers évènements écrits avant le changement de statut
+                for ev in get_veille_job_events(job_id, after_id=last_id):
+                    yield f"id: {ev['id']}\nevent: {ev['event']}\ndata: {ev['data']}\n\n"
+                status = job["status"] if job else None
+                yield f"event: end\ndata: {json.dumps({'status': status})}\n\n"
+                return
+            yield ": keep-alive\n\n"
+            time.sleep(JOB_EVENTS_POLL_INTERVAL)
+        yield f"event: reconnect\ndata: {json.dumps({'after': last_id})}\n\n"
+
+    return Response(
+        stream(last_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/api/delete_rss", methods=["POST"])
@@ -806,14 +1126,10 @@ def api_delete_rss():
 
 @app.route("/analyste")
 @require_role('admin', 'analyste')
+@cached_view(response_cache, vary=config_mtime)
 def analyste():
-    # pas de modèle ML ici
-    analyste_obj = Analyste(load_model=False)
-    articles = get_all_articles()
-
-    analysis = analyste_obj.analyze(data=articles)
-
-    recent_articles = articles[:10]
+    analysis = build_analysis()
+    recent_articles = get_recent_articles(limit=10)
 
     return render_template(
         "analyste.html",
@@ -827,150 +1143,93 @@ def analyste():
     )
 
 
+@app.route("/api/search/semantic", methods=["GET"])
+@require_role('admin', 'analyste')
+def api_semantic_search():
+    """Recherche sémantique : top-k articles les plus proches d'une requête libre."""
+    query = request.args.get("q", "").strip()
+    top_k = min(max(request.args.get("k", 10, type=int), 1), 50)
+    if not query:
+        return jsonify({"results": []})
+
+    # modèle partagé (registry) : pas de rechargement par requête
+    analyste_obj = Analyste(load_model=True)
+    if not analyste_obj.use_ml:
+        return jsonify({"results": [], "message": "Modèle ML indisponible"}), 503
+
+    results = analyste_obj.semantic_search(query, top_k=top_k)
+    return jsonify({"results": results})
+
+
+@app.route("/api/articles/<int:article_id>/related", methods=["GET"])
+@require_role('admin', 'veilleur', 'analyste')
+def api_related_articles(article_id):
+    """Articles les plus proches d'un article (index IVF sur les embeddings)."""
+    top_k = min(max(request.args.get("k", 5, type=int), 1), 20)
+    try:
+        # l'id du modèle suffit : pas besoin de charger le SentenceTransformer
+        index = get_related_index(model_registry.model_id)
+        if index is None:
+            # construit par la prochaine veille (jamais dans une requête web)
+            return jsonify({"results": [], "message": "Index en cours de construction"})
+        # quelques voisins en plus pour compenser les articles rejetés
+        neighbours = index.related(article_id, k=top_k + 5)
+    except Exception as e:
+        print(f"Erreur lors de la recherche d'articles similaires : {e}")
+        return jsonify({"results": []}), 500
+
+    score_by_id = dict(neighbours)
+    results = get_articles_by_ids(list(score_by_id), only_active=True)[:top_k]
+    for art in results:
+        art["score"] = round(score_by_id[art["id"]], 4)
+    return jsonify({"results": results})
+
+
 @app.route("/decideur")
 @require_role('admin', 'decideur')
+@cached_view(response_cache, vary=config_mtime)
 def decideur():
     """Dashboard Décideur : KPIs + tendances + alertes stratégiques."""
 
     # ----------------- KPIs globaux -----------------
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Nombre total d'articles non rejetés
-    cur.execute("SELECT COUNT(*) FROM articles WHERE verifie = 0")
-    total_articles = cur.fetchone()[0] or 0
-
-    # Nombre de sources distinctes (articles non rejetés)
-    cur.execute("SELECT COUNT(DISTINCT source) FROM articles WHERE verifie = 0")
-    total_sources = cur.fetchone()[0] or 0
-
-    # Classe la plus fréquente (sur les articles non rejetés)
-    cur.execute(
-        "SELECT categorie, COUNT(*) AS cnt FROM articles "
-        "WHERE verifie = 0 "
-        "GROUP BY categorie ORDER BY cnt DESC LIMIT 1"
-    )
-    top_category = cur.fetchone()
-
-    # Dernière date de collecte (articles non rejetés)
-    cur.execute("SELECT MAX(collected_at) FROM articles WHERE verifie = 0")
-    last_fetch = cur.fetchone()[0]
+    # Lus depuis la table d'agrégats (article_rollup), tenue à jour à l'écriture
+    stats = get_decideur_stats()
+    total_articles = stats["total_articles"]
+    total_sources = stats["total_sources"]
+    top_category = stats["top_category"]
+    last_fetch = stats["last_fetch"]
 
     # ----------------- Données de tendance -----------------
-    # Récupère les données de tendance par date et catégorie
-    # recuperer les lables et leurs données a fin de les passer au graphique
-    cur.execute(
-        "SELECT classe, COUNT(*) AS cnt "
-        "FROM articles "
-        "WHERE verifie = 0 "
-        "GROUP BY classe "
-    )
-    rows = cur.fetchall()
+    # Répartition par classe (graphique en barres)
     trend_labels = []
     trend_series = []
-
-    for categorie, cnt in rows:
-        trend_labels.append(categorie)
+    for classe, cnt in stats["by_classe"]:
+        trend_labels.append(classe)
         trend_series.append(cnt)
 
-    # Donnees pour le graphique de suivi par classification au fil du temps
-    cur.execute(
-        "SELECT classe, DATE_FORMAT(collected_at, '%Y-%m') AS mois, COUNT(*) AS cnt "
-        "FROM articles "
-        "WHERE verifie = 0 "
-        "GROUP BY classe, mois "
-        "ORDER BY mois"
-    )
-    line_rows = cur.fetchall()
-    # First, collect all unique months in order
-    line_labels = []
-    for row in line_rows:
-        mois = row[1]
-        if mois not in line_labels:
-            line_labels.append(mois)
-
-    # Then, build the data structure
+    # Suivi par classe au fil du temps : mois triés + index mois -> position
+    line_labels = sorted({mois for _, mois, _ in stats["by_classe_month"]})
+    month_index = {mois: i for i, mois in enumerate(line_labels)}
     line_data = {}
-    for row in line_rows:
-        classe, mois, cnt = row
+    for classe, mois, cnt in stats["by_classe_month"]:
         if classe not in line_data:
             line_data[classe] = [0] * len(line_labels)
-        idx = line_labels.index(mois)
-        line_data[classe][idx] = cnt
-
-    print(line_data)
-
-    cur.close()
-    conn.close()
+        line_data[classe][month_index[mois]] = cnt
 
     # ----------------- Articles & tendances Analyste -----------------
-    articles = get_all_articles()
-    recent_articles = articles[:10]
+    recent_articles = get_recent_articles(limit=10)
+    articles = get_articles_for_alerts(days=alerts_window_days())
 
     # Analyse des tendances pour récupérer les mots-clés forts
-    analyste_obj = Analyste(load_model=False)
-    analysis = analyste_obj.analyze(data=articles)
+    analysis = build_analysis()
     trending_keywords = analysis.get("trends", {}).get("top_keywords", [])
 
     # On limite l'affichage des tags de tendance
     trending_keywords = trending_keywords[:8]
 
     # ----------------- Sélection des alertes -----------------
-    from datetime import datetime
-
-    alerts = []
-    for art in articles:
-        title = art.get("title", "") or ""
-        summary = art.get("summary", "") or art.get("summary_short", "") or ""
-        mots_cles = art.get("mots_cles", "") or ""
-
-        full_text = f"{title} {summary} {mots_cles}".lower()
-
-        # Score de correspondance avec les mots-clés tendance
-        match_score = 0
-        for kw in trending_keywords:
-            kw_lower = kw.lower()
-            if kw_lower and kw_lower in full_text:
-                match_score += 1
-
-        if match_score == 0:
-            # on ignore les articles qui ne matchent aucune tendance
-            continue
-
-        # Score de récence sur 0-30 (plus récent = plus élevé)
-        raw_date = art.get("collected_at") or art.get("published")
-        recency_label = calculate_recency(raw_date)
-
-        recency_score = 0
-        if raw_date:
-            try:
-                if isinstance(raw_date, datetime):
-                    d_obj = raw_date
-                else:
-                    s = str(raw_date)
-                    try:
-                        d_obj = datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
-                    except ValueError:
-                        d_obj = datetime.fromisoformat(s)
-                days = (datetime.now() - d_obj).days
-                recency_score = max(0, 30 - days)
-            except Exception:
-                recency_score = 0
-
-        total_score = match_score * 10 + recency_score
-
-        alerts.append({
-            "title": title,
-            "source": art.get("source", "Inconnu"),
-            "published": art.get("published") or "Date inconnue",
-            "summary": summary,
-            "recency_label": recency_label,
-            "score": total_score,
-        })
-
-    # Trier par score décroissant et garder les 3 meilleures alertes
-    alerts.sort(key=lambda x: x["score"], reverse=True)
-    alerts = alerts[:3]
+    alerts = compute_alerts_from_articles(
+        articles, top_n=3, trending_keywords=trending_keywords)
 
     return render_template(
         "decideur.html",
@@ -991,7 +1250,12 @@ def decideur():
 @app.route("/rejeter/<int:article_id>", methods=["POST"])
 @require_role('admin', 'veilleur')
 def rejeter_article(article_id):
-    reject_article(article_id)
+    # statistiques de termes retirées dans la transaction du rejet
+    if reject_article(article_id, term_counter=article_term_counts):
+        try:
+            remove_from_related_index(model_registry.model_id, [article_id])
+        except Exception as e:
+            print(f"⚠️ Retrait de l'index des articles similaires impossible : {e}")
     return jsonify({"status": "ok"})
 
 
@@ -1009,6 +1273,7 @@ def add_synthese(class_id):
                 "INSERT into syntheses (title, content, class) values (%s, %s, %s)",
                 (title, content, class_id)
             )
+            bump_data_version(cur)
             conn.commit()
             cur.close()
             conn.close()
@@ -1,6 +1,10 @@
 import mysql.connector
+import mysql.connector.pooling
+import json
 import hashlib
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from flask import g, has_request_context
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # ---------- CONFIG DB ----------
@@ -11,19 +15,142 @@ DB_CONFIG = {
     "database": "veille_ia"
 }
 
+# Pool de connexions partagé par le processus (pool_size max 32 côté connecteur)
+DB_POOL_CONFIG = {
+    "pool_name": "veille_ia_pool",
+    "pool_size": 10,
+}
+
 # ---------- CONNEXION ----------
 
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = mysql.connector.pooling.MySQLConnectionPool(
+                    **DB_POOL_CONFIG, **DB_CONFIG)
+    return _pool
+
+
+def _pooled_connection():
+    """Connexion prise dans le pool ; connexion directe si le pool est épuisé."""
+    try:
+        return _get_pool().get_connection()
+    except mysql.connector.errors.PoolError:
+        return mysql.connector.connect(**DB_CONFIG)
+
+
+class _RequestConnection:
+    """
+    Connexion partagée par toute une requête Flask : close() ne fait rien,
+    la connexion est rendue au pool en fin de requête (close_request_connection).
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
 
 def get_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    # Dans une requête Flask : une seule connexion, stockée dans g
+    if has_request_context():
+        conn = g.get("db_conn")
+        if conn is None or not conn.is_connected():
+            conn = g.db_conn = _pooled_connection()
+        return _RequestConnection(conn)
+    # Hors requête (scheduler, scripts) : connexion du pool, rendue par close()
+    return _pooled_connection()
+
+
+def close_request_connection(exc=None):
+    """À enregistrer en teardown Flask : rend la connexion de la requête au pool."""
+    conn = g.pop("db_conn", None)
+    if conn is None:
+        return
+    try:
+        if exc is not None:
+            conn.rollback()
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de la libération de la connexion : {e}")
 
-# ---------- INIT DB ----------
+# ---------- VERROUS CONSULTATIFS ----------
 
+class AdvisoryLock:
+    """
+    Verrou MySQL nommé (GET_LOCK) tenu par une connexion dédiée, hors pool :
+    libéré par release() ou automatiquement par MySQL si le processus (ou la
+    connexion) disparaît. Non thread-safe : à protéger par l'appelant.
+    """
 
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
+    def __init__(self, name):
+        self.name = name
+        self._conn = None
+
+    def acquire(self, timeout=0):
+        """Prend le verrou (attente max timeout secondes). True si tenu."""
+        if self.is_held():
+            return True
+        self._disconnect()
+        try:
+            self._conn = mysql.connector.connect(**DB_CONFIG)
+            cur = self._conn.cursor()
+            cur.execute("SELECT GET_LOCK(%s, %s)", (self.name, timeout))
+            acquired = cur.fetchone()[0] == 1
+        except mysql.connector.Error as e:
+            print(f"Erreur lors de la prise du verrou {self.name} : {e}")
+            acquired = False
+        if not acquired:
+            self._disconnect()
+        return acquired
+
+    def is_held(self):
+        """True si ce processus tient toujours le verrou (connexion vivante)."""
+        if self._conn is None:
+            return False
+        try:
+            cur = self._conn.cursor()
+            cur.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (self.name,))
+            return bool(cur.fetchone()[0])
+        except mysql.connector.Error:
+            self._disconnect()
+            return False
+
+    def release(self):
+        if self._conn is None:
+            return
+        try:
+            cur = self._conn.cursor()
+            cur.execute("SELECT RELEASE_LOCK(%s)", (self.name,))
+            cur.fetchone()
+        except mysql.connector.Error as e:
+            print(f"Erreur lors de la libération du verrou {self.name} : {e}")
+        finally:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
 
+# ---------- INIT DB ----------
+
+
+def _migration_1_baseline(cur):
+    """Schéma de base (tables historiques + colonnes ajoutées au fil du temps)."""
     # Table articles
     cur.execute("""
     CREATE TABLE IF NOT EXISTS articles (
@@ -79,6 +206,56 @@ def init_db():
         print(
             f"Erreur lors de la vérification du schéma de la table articles : {e}")
 
+    # Validateurs HTTP (ETag / Last-Modified) des flux RSS
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS feed_cache (
+        source VARCHAR(100) PRIMARY KEY,
+        url TEXT,
+        etag VARCHAR(255),
+        modified VARCHAR(64),
+        filter_key CHAR(64),
+        last_published DATETIME,
+        updated_at DATETIME
+    )
+    """)
+
+    # Embeddings des articles (vecteurs float32 sérialisés)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS article_embeddings (
+        article_id INT PRIMARY KEY,
+        model_id VARCHAR(128) NOT NULL,
+        dim INT NOT NULL,
+        vector BLOB NOT NULL,
+        INDEX idx_embeddings_model (model_id)
+    )
+    """)
+
+    # Statistiques de termes (TF / DF) maintenues incrémentalement
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS term_stats (
+        term VARCHAR(64) PRIMARY KEY,
+        tf INT NOT NULL DEFAULT 0,
+        df INT NOT NULL DEFAULT 0,
+        INDEX idx_term_stats_tf (tf)
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS term_stats_meta (
+        id TINYINT PRIMARY KEY,
+        n_docs INT NOT NULL DEFAULT 0,
+        built_at DATETIME
+    )
+    """)
+
+    # Points de reprise des traitements par lots (backfill des catégories)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS backfill_state (
+        name VARCHAR(150) PRIMARY KEY,
+        last_id INT NOT NULL DEFAULT 0,
+        updated_at DATETIME
+    )
+    """)
+
     # Table users pour le login
     cur.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -91,8 +268,270 @@ def init_db():
     )
     """)
 
+    # Fiches de synthèse (aussi créée par script.sql)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS syntheses (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title TEXT,
+        content LONGTEXT,
+        class INT,
+        date DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def _create_index(cur, table, name, columns):
+    """CREATE INDEX tolérant : ignore l'index s'il existe déjà (ex. script.sql)."""
+    try:
+        cur.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    except mysql.connector.Error as e:
+        if e.errno != 1061:  # ER_DUP_KEYNAME
+            raise
+
+
+def _add_column(cur, table, name, definition):
+    """ADD COLUMN tolérant : ignore la colonne si elle existe déjà (ex. script.sql)."""
+    try:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    except mysql.connector.Error as e:
+        if e.errno != 1060:  # ER_DUP_FIELDNAME
+            raise
+
+
+def _migration_2_indexes(cur):
+    """Index secondaires des chemins d'accès principaux (filtre verifie = 0)."""
+    # listes triées par date + MAX(collected_at)
+    _create_index(cur, "articles", "idx_articles_verifie_collected", "verifie, collected_at")
+    # top catégorie
+    _create_index(cur, "articles", "idx_articles_verifie_categorie", "verifie, categorie")
+    # répartition par classe et par classe x mois
+    _create_index(cur, "articles", "idx_articles_verifie_classe", "verifie, classe, collected_at")
+    # facettes / comptage par source
+    _create_index(cur, "articles", "idx_articles_verifie_source", "verifie, source")
+
+
+def _migration_3_listing_indexes(cur):
+    """Index des listes paginées filtrées par source / catégorie (tri par date)."""
+    _create_index(cur, "articles", "idx_articles_verifie_source_collected",
+                  "verifie, source, collected_at")
+    _create_index(cur, "articles", "idx_articles_verifie_categorie_collected",
+                  "verifie, categorie, collected_at")
+
+
+def _migration_4_rollup(cur):
+    """Table d'agrégats des articles non rejetés (KPIs décideur), remplie une fois."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS article_rollup (
+        source VARCHAR(100) NOT NULL,
+        categorie VARCHAR(100) NOT NULL,
+        classe VARCHAR(100) NOT NULL,
+        mois CHAR(7) NOT NULL,
+        cnt INT NOT NULL DEFAULT 0,
+        last_collected DATETIME,
+        PRIMARY KEY (source, categorie, classe, mois)
+    )
+    """)
+    cur.execute("DELETE FROM article_rollup")
+    cur.execute("""
+        INSERT INTO article_rollup (source, categorie, classe, mois, cnt, last_collected)
+        SELECT source, COALESCE(categorie, ''), COALESCE(classe, ''),
+               COALESCE(DATE_FORMAT(collected_at, '%Y-%m'), ''),
+               COUNT(*), MAX(collected_at)
+        FROM articles
+        WHERE verifie = 0
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def _migration_5_analysis_snapshot(cur):
+    """Snapshot de l'analyse (une ligne par fenêtre d'analyse, 0 = tout)."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS analysis_snapshot (
+        window_days INT PRIMARY KEY,
+        version INT NOT NULL,
+        fingerprint VARCHAR(64),
+        payload LONGTEXT NOT NULL,
+        created_at DATETIME NOT NULL
+    )
+    """)
+
+
+def _migration_6_data_version(cur):
+    """Compteur global incrémenté à chaque modification des données affichées."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS data_version (
+        id TINYINT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    """)
+    cur.execute("INSERT IGNORE INTO data_version (id, version) VALUES (1, 0)")
+
+
+def _migration_7_veille_jobs(cur):
+    """Jobs de veille lancés en arrière-plan (statut consultable par API)."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS veille_jobs (
+        id CHAR(32) PRIMARY KEY,
+        config_key CHAR(64) NOT NULL,
+        active_key CHAR(64) NULL,
+        status VARCHAR(20) NOT NULL,
+        params LONGTEXT,
+        message TEXT,
+        result LONGTEXT,
+        created_by INT NULL,
+        created_at DATETIME NOT NULL,
+        started_at DATETIME NULL,
+        finished_at DATETIME NULL,
+        UNIQUE KEY uq_veille_jobs_active (active_key)
+    )
+    """)
+
+
+def _migration_8_veille_job_events(cur):
+    """Évènements de progression des jobs de veille (flux SSE)."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS veille_job_events (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        job_id CHAR(32) NOT NULL,
+        event VARCHAR(50) NOT NULL,
+        data TEXT,
+        created_at DATETIME NOT NULL,
+        INDEX idx_veille_job_events_job (job_id, id)
+    )
+    """)
+
+
+def _migration_9_scheduler_state(cur):
+    """Dernière exécution des tâches planifiées (survit aux redémarrages)."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS scheduler_state (
+        name VARCHAR(100) PRIMARY KEY,
+        last_run_at DATETIME,
+        updated_at DATETIME
+    )
+    """)
+
+
+def _migration_10_work_queue(cur):
+    """File de travail des workers (collecte par source, classification...)."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS work_queue (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        kind VARCHAR(30) NOT NULL,
+        payload LONGTEXT,
+        status VARCHAR(20) NOT NULL,
+        priority INT NOT NULL DEFAULT 0,
+        attempts INT NOT NULL DEFAULT 0,
+        max_attempts INT NOT NULL DEFAULT 3,
+        timeout_seconds INT NOT NULL DEFAULT 600,
+        available_at DATETIME NOT NULL,
+        pending_key VARCHAR(191) NULL,
+        locked_by VARCHAR(100) NULL,
+        last_error TEXT,
+        result TEXT,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        UNIQUE KEY uq_work_queue_pending (pending_key),
+        INDEX idx_work_queue_claim (status, available_at)
+    )
+    """)
+
+
+def _migration_11_job_events_purge(cur):
+    """Index de purge des évènements de progression (prune_veille_job_events)."""
+    _create_index(cur, "veille_job_events", "idx_veille_job_events_created", "created_at")
+
+
+def _migration_12_snapshot_with_model(cur):
+    """Snapshot d'analyse : calculé avec ou sans le modèle ML (catégories des mots-clés)."""
+    _add_column(cur, "analysis_snapshot", "with_model", "TINYINT(1) NOT NULL DEFAULT 1")
+
+
+def _migration_13_feed_cache_watermark(cur):
+    """Watermark par source, pour les feed_cache créées avant last_published."""
+    _add_column(cur, "feed_cache", "last_published", "DATETIME")
+
+
+def _migration_14_term_stats_drop_df(cur):
+    """Nombre de documents par terme jamais lu : plus maintenu."""
+    try:
+        cur.execute("ALTER TABLE term_stats DROP COLUMN df")
+    except mysql.connector.Error as e:
+        if e.errno != 1091:  # ER_CANT_DROP_FIELD_OR_KEY : déjà supprimée
+            raise
+
+
+# Migrations versionnées : (version, description, fonction). Ne jamais modifier
+# une migration déjà livrée, en ajouter une nouvelle à la suite.
+MIGRATIONS = [
+    (1, "schéma de base", _migration_1_baseline),
+    (2, "index secondaires sur articles", _migration_2_indexes),
+    (3, "index des listes paginées", _migration_3_listing_indexes),
+    (4, "agrégats des KPIs décideur", _migration_4_rollup),
+    (5, "snapshot de l'analyse", _migration_5_analysis_snapshot),
+    (6, "version des données", _migration_6_data_version),
+    (7, "jobs de veille en arrière-plan", _migration_7_veille_jobs),
+    (8, "progression des jobs de veille", _migration_8_veille_job_events),
+    (9, "état du planificateur", _migration_9_scheduler_state),
+    (10, "file de travail des workers", _migration_10_work_queue),
+    (11, "purge des évènements de jobs", _migration_11_job_events_purge),
+    (12, "snapshot d'analyse sans modèle", _migration_12_snapshot_with_model),
+    (13, "watermark des flux RSS", _migration_13_feed_cache_watermark),
+    (14, "term_stats sans df", _migration_14_term_stats_drop_df),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+SCHEMA_MIGRATION_LOCK = "veille_ia_schema_migration"
+SCHEMA_MIGRATION_LOCK_TIMEOUT = 60   # secondes
+
+
+def init_db():
+    """
+    Applique les migrations manquantes. Quand le schéma est à jour, une seule
+    requête sur schema_version suffit (plus de scan d'INFORMATION_SCHEMA).
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(255),
+        applied_at DATETIME
+    )
+    """)
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current = cur.fetchone()[0]
+    if current >= SCHEMA_VERSION:
+        conn.close()
+        return
+
+    # verrou MySQL : un seul processus (worker gunicorn) migre à la fois ;
+    # 0 (délai dépassé) ou NULL (erreur) : on ne migre pas sans le verrou
+    cur.execute("SELECT GET_LOCK(%s, %s)", (SCHEMA_MIGRATION_LOCK, SCHEMA_MIGRATION_LOCK_TIMEOUT))
+    if cur.fetchone()[0] != 1:
+        conn.close()
+        raise RuntimeError(
+            f"Verrou de migration {SCHEMA_MIGRATION_LOCK} non obtenu "
+            f"après {SCHEMA_MIGRATION_LOCK_TIMEOUT}s : migrations non appliquées")
+    # nouvelle transaction : relire la version appliquée par un autre processus
     conn.commit()
-    conn.close()
+    try:
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        current = cur.fetchone()[0]
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            migrate(cur)
+            cur.execute("""
+                INSERT INTO schema_version (version, description, applied_at)
+                VALUES (%s, %s, %s)
+            """, (version, description, datetime.utcnow()))
+            conn.commit()
+            print(f"Migration {version} appliquée : {description}")
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (SCHEMA_MIGRATION_LOCK,))
+        cur.fetchone()
+        conn.close()
+
 
 # ---------- HASH ----------
 
@@ -102,119 +541,1381 @@ def article_hash(title, source, published):
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
-# ---------- INSERT ARTICLES ----------
-def save_articles(articles):
+# ---------- VERSION DES DONNÉES ----------
+
+def bump_data_version(cur):
+    """
+    Incrémente la version des données, dans la transaction de l'appelant :
+    invalide les réponses mises en cache (cf. response_cache.py).
+    """
+    cur.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+
+
+def get_data_version():
+    """Version courante des données, None si elle est illisible."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT version FROM data_version WHERE id = 1")
+        row = cur.fetchone()
+        conn.close()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"Erreur lors de la lecture de la version des données : {e}")
+        return None
+
+# ---------- AGRÉGATS (KPIs DÉCIDEUR) ----------
+
+def _rollup_key(source, categorie, classe, collected_at):
+    mois = collected_at.strftime("%Y-%m") if isinstance(collected_at, datetime) else ""
+    return (source or "", categorie or "", classe or "", mois)
+
+
+def _apply_rollup(cur, deltas, last_collected=None):
+    """
+    Applique des variations de comptes à article_rollup, dans la transaction
+    de l'appelant. deltas : {(source, categorie, classe, mois): +/-n}
+    """
+    rows = [(*key, delta, last_collected) for key, delta in deltas.items() if delta]
+    if not rows:
+        return
+    cur.executemany("""
+        INSERT INTO article_rollup (source, categorie, classe, mois, cnt, last_collected)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            cnt = cnt + VALUES(cnt),
+            last_collected = GREATEST(COALESCE(last_collected, VALUES(last_collected)),
+                                      COALESCE(VALUES(last_collected), last_collected))
+    """, rows)
+    cur.execute("DELETE FROM article_rollup WHERE cnt <= 0")
+
+
+def _rollup_category_changes(cur, updates):
+    """
+    Variations d'agrégats dues à un changement de catégorie/classe.
+    updates : liste de (article_id, categorie, classe) ; à appeler AVANT l'UPDATE.
+    """
+    ids = [u[0] for u in updates]
+    if not ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(ids))
+    cur.execute(f"""
+        SELECT id, source, categorie, classe, collected_at
+        FROM articles
+        WHERE id IN ({placeholders}) AND verifie = 0
+        FOR UPDATE
+    """, tuple(ids))
+    current = {row[0]: row[1:] for row in cur.fetchall()}
+    deltas = {}
+    for article_id, categorie, classe in updates:
+        if article_id not in current:
+            continue
+        source, old_cat, old_classe, collected_at = current[article_id]
+        old_key = _rollup_key(source, old_cat, old_classe, collected_at)
+        new_key = _rollup_key(source, categorie, classe, collected_at)
+        if old_key != new_key:
+            deltas[old_key] = deltas.get(old_key, 0) - 1
+            deltas[new_key] = deltas.get(new_key, 0) + 1
+    return deltas
+
+
+def get_decideur_stats():
+    """
+    KPIs et séries du tableau de bord décideur, lus depuis article_rollup
+    (taille indépendante du nombre d'articles).
+    """
     conn = get_connection()
     cur = conn.cursor()
+    cur.execute("""
+        SELECT COALESCE(SUM(cnt), 0), COUNT(DISTINCT source), MAX(last_collected)
+        FROM article_rollup
+    """)
+    total_articles, total_sources, last_fetch = cur.fetchone()
 
-    for a in articles:
-        h = article_hash(a["title"], a["source"], a["published"])
+    cur.execute("""
+        SELECT categorie, SUM(cnt) AS total FROM article_rollup
+        GROUP BY categorie ORDER BY total DESC LIMIT 1
+    """)
+    top = cur.fetchone()
+    top_category = (top[0] or None, int(top[1])) if top else None
 
-        cur.execute("""
-            INSERT IGNORE INTO articles
-            (title, source, published, link, collected_at, hash,
-             verifie, categorie, classe, mots_cles, summary, summary_short)
-            VALUES (%s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s)
-        """, (
-            a["title"],
-            a["source"],
-            a.get("published"),
-            a.get("link"),
-            datetime.utcnow(),
-            h,
-            a.get("verifie", 0),
-            a.get("categorie"),
-            a.get("classe"),
-            a.get("mots_cles"),
-            a.get("summary"),
-            a.get("summary_short"),
-        ))
+    cur.execute("SELECT classe, SUM(cnt) FROM article_rollup GROUP BY classe")
+    by_classe = [(classe or None, int(cnt)) for classe, cnt in cur.fetchall()]
 
-    conn.commit()
+    cur.execute("""
+        SELECT classe, mois, SUM(cnt) FROM article_rollup
+        WHERE mois <> ''
+        GROUP BY classe, mois ORDER BY mois
+    """)
+    by_classe_month = [(classe or None, mois, int(cnt)) for classe, mois, cnt in cur.fetchall()]
     conn.close()
 
-# ---------- SELECT ARTICLES ----------
+    return {
+        "total_articles": int(total_articles or 0),
+        "total_sources": int(total_sources or 0),
+        "top_category": top_category,
+        "last_fetch": last_fetch,
+        "by_classe": by_classe,
+        "by_classe_month": by_classe_month,
+    }
 
-def get_all_articles():
+def get_rollup_breakdown():
     """
-    Récupère tous les articles non rejetés.
+    Nombre d'articles non rejetés par source et par catégorie, lu depuis
+    article_rollup. Retourne (by_source, by_category), ou None en cas d'erreur.
     """
     try:
         conn = get_connection()
-        cur = conn.cursor(dictionary=True)
+        cur = conn.cursor()
         cur.execute("""
-            SELECT id, title, source, published, summary, summary_short,
-                   categorie, classe, mots_cles, link, collected_at, verifie
-            FROM articles
-            WHERE verifie = 0
-            ORDER BY collected_at DESC
+            SELECT source, categorie, SUM(cnt) FROM article_rollup
+            GROUP BY source, categorie
         """)
         rows = cur.fetchall()
         conn.close()
-        return rows
     except Exception as e:
-        print(f"Erreur lors de la récupération des articles : {e}")
-        return []
+        print(f"Erreur lors de la lecture des agrégats d'articles : {e}")
+        return None
 
-# ---------- ARTICLES : CATEGORIES MANQUANTES ----------
+    by_source, by_category = {}, {}
+    for source, categorie, cnt in rows:
+        cnt = int(cnt)
+        if cnt <= 0:
+            continue
+        source = source or "inconnu"
+        categorie = categorie or "Autres sujets IA"
+        by_source[source] = by_source.get(source, 0) + cnt
+        by_category[categorie] = by_category.get(categorie, 0) + cnt
+    return by_source, by_category
+
+# ---------- INSERT ARTICLES ----------
+
+# nombre d'articles par INSERT multi-lignes
+SAVE_BATCH_SIZE = 200
+
+_ARTICLE_COLUMNS = (
+    "title, source, published, link, collected_at, hash, "
+    "verifie, categorie, classe, mots_cles, summary, summary_short"
+)
+_ARTICLE_PLACEHOLDERS = "(" + ", ".join(["%s"] * 12) + ")"
+
+
+def _article_params(a, h, now):
+    return (
+        a["title"],
+        a["source"],
+        a.get("published"),
+        a.get("link"),
+        now,
+        h,
+        a.get("verifie", 0),
+        a.get("categorie"),
+        a.get("classe"),
+        a.get("mots_cles"),
+        a.get("summary"),
+        a.get("summary_short"),
+    )
+
+
+def save_articles(articles, batch_size=SAVE_BATCH_SIZE, term_counter=None):
+    """
+    Insère les articles par INSERT IGNORE multi-lignes (batch_size lignes par
+    requête), le tout dans une seule transaction avec les agrégats décideur et,
+    si term_counter(articles, sign) -> {terme: compte} est fourni, les statistiques
+    de termes des articles insérés.
+    Retourne {"inserted": n, "skipped": n, "inserted_articles": [...]}, où
+    inserted_articles ne contient que les lignes réellement insérées par cet
+    appel (même si un autre processus insère les mêmes articles en parallèle).
+    """
+    result = {"inserted": 0, "skipped": 0, "inserted_articles": []}
+    if not articles:
+        return result
+
+    conn = get_connection()
+    cur = conn.cursor()
+    now = datetime.utcnow()
+
+    try:
+        for i in range(0, len(articles), batch_size):
+            chunk = articles[i:i + batch_size]
+            hashes = [
+                a.get("hash") or article_hash(a["title"], a["source"], a["published"])
+                for a in chunk
+            ]
+
+            # hashes déjà présents : articles attendus à l'insertion
+            placeholders = ", ".join(["%s"] * len(hashes))
+            cur.execute(
+                f"SELECT hash FROM articles WHERE hash IN ({placeholders})",
+                tuple(hashes)
+            )
+            seen = {row[0] for row in cur.fetchall()}
+            expected = []
+            for a, h in zip(chunk, hashes):
+                if h not in seen:
+                    seen.add(h)
+                    expected.append(a)
+
+            params = []
+            for a, h in zip(chunk, hashes):
+                params.extend(_article_params(a, h, now))
+            cur.execute("SAVEPOINT save_articles_chunk")
+            cur.execute(
+                f"INSERT IGNORE INTO articles ({_ARTICLE_COLUMNS}) VALUES "
+                + ", ".join([_ARTICLE_PLACEHOLDERS] * len(chunk)),
+                tuple(params)
+            )
+            if cur.rowcount == len(expected):
+                # aucune insertion concurrente : les attendus sont exactement les insérés
+                result["inserted_articles"].extend(expected)
+                continue
+
+            # un autre processus a inséré une partie de ces articles entre le
+            # SELECT et l'INSERT : ligne par ligne pour savoir lesquels sont à nous
+            cur.execute("ROLLBACK TO SAVEPOINT save_articles_chunk")
+            for a, h in zip(chunk, hashes):
+                cur.execute(
+                    f"INSERT IGNORE INTO articles ({_ARTICLE_COLUMNS}) VALUES "
+                    + _ARTICLE_PLACEHOLDERS,
+                    _article_params(a, h, now)
+                )
+                if cur.rowcount:
+                    result["inserted_articles"].append(a)
+        result["inserted"] = len(result["inserted_articles"])
+
+        # agrégats décideur, dans la même transaction
+        deltas = {}
+        for a in result["inserted_articles"]:
+            if a.get("verifie", 0):
+                continue
+            key = _rollup_key(a["source"], a.get("categorie"), a.get("classe"), now)
+            deltas[key] = deltas.get(key, 0) + 1
+        _apply_rollup(cur, deltas, last_collected=now)
+        _record_term_stats(cur, term_counter, result["inserted_articles"], 1)
+        if result["inserted"]:
+            bump_data_version(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    result["skipped"] = len(articles) - result["inserted"]
+    return result
 
-def get_articles_without_category():
+def get_existing_hashes(hashes, chunk_size=1000):
     """
-    Retourne les articles dont la colonne categorie est NULL ou vide.
+    Retourne le sous-ensemble des hashes déjà présents dans la table articles
+    (une requête IN par paquet de chunk_size hashes).
     """
+    hashes = list(dict.fromkeys(h for h in hashes if h))
+    if not hashes:
+        return set()
+    existing = set()
     try:
         conn = get_connection()
-        cur = conn.cursor(dictionary=True)
+        cur = conn.cursor()
+        for i in range(0, len(hashes), chunk_size):
+            chunk = hashes[i:i + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cur.execute(
+                f"SELECT hash FROM articles WHERE hash IN ({placeholders})",
+                tuple(chunk)
+            )
+            existing.update(row[0] for row in cur.fetchall())
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de la vérification des hashes existants : {e}")
+    return existing
+
+def get_article_ids_by_hash(hashes, chunk_size=1000):
+    """
+    Retourne {hash: id} pour les hashes présents dans la table articles.
+    """
+    hashes = list(dict.fromkeys(h for h in hashes if h))
+    ids = {}
+    if not hashes:
+        return ids
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        for i in range(0, len(hashes), chunk_size):
+            chunk = hashes[i:i + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cur.execute(
+                f"SELECT hash, id FROM articles WHERE hash IN ({placeholders})",
+                tuple(chunk)
+            )
+            ids.update({h: article_id for h, article_id in cur.fetchall()})
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de la récupération des ids par hash : {e}")
+    return ids
+
+# ---------- EMBEDDINGS ARTICLES ----------
+
+def save_article_embeddings(rows, model_id):
+    """
+    Enregistre les embeddings des articles.
+    rows : liste de (article_id, vecteur float32 sous forme de bytes, dim)
+    """
+    if not rows:
+        return
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.executemany("""
+            REPLACE INTO article_embeddings (article_id, model_id, dim, vector)
+            VALUES (%s, %s, %s, %s)
+        """, [(article_id, model_id, dim, vector) for article_id, vector, dim in rows])
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de l'enregistrement des embeddings : {e}")
 
-        cur.execute("""
-            SELECT id, title, summary, source
-            FROM articles
-            WHERE categorie IS NULL OR categorie = ''
-        """)
 
+def get_articles_without_embedding(model_id, limit=2000):
+    """
+    Articles non rejetés sans embedding pour le modèle donné (rattrapage progressif).
+    """
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT a.id, a.title, a.summary
+            FROM articles a
+            LEFT JOIN article_embeddings e
+                   ON e.article_id = a.id AND e.model_id = %s
+            WHERE a.verifie = 0 AND e.article_id IS NULL
+            LIMIT %s
+        """, (model_id, limit))
         rows = cur.fetchall()
         conn.close()
         return rows
     except Exception as e:
-        print(f"Erreur lors de la récupération des articles sans catégorie : {e}")
+        print(f"Erreur lors de la récupération des articles sans embedding : {e}")
         return []
 
 
-def update_article_category_and_classe(article_id, categorie, classe):
+def iter_article_embeddings(model_id, chunk_size=5000):
     """
-    Met à jour la catégorie et la classe d'un article.
+    Parcourt les embeddings des articles non rejetés par paquets (pagination
+    par article_id). Génère des listes de (article_id, dim, vector bytes).
     """
+    conn = get_connection()
     try:
-        conn = get_connection()
         cur = conn.cursor()
+        last_id = 0
+        while True:
+            cur.execute("""
+                SELECT e.article_id, e.dim, e.vector
+                FROM article_embeddings e
+                JOIN articles a ON a.id = e.article_id
+                WHERE e.model_id = %s AND a.verifie = 0 AND e.article_id > %s
+                ORDER BY e.article_id
+                LIMIT %s
+            """, (model_id, last_id, chunk_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1][0]
+    finally:
+        conn.close()
+
+
+def get_articles_by_ids(ids, only_active=False):
+    """
+    Retourne les articles correspondant aux ids, dans l'ordre des ids
+    (only_active=True : articles non rejetés uniquement).
+    """
+    ids = list(ids)
+    if not ids:
+        return []
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        placeholders = ", ".join(["%s"] * len(ids))
+        active_clause = "AND verifie = 0" if only_active else ""
+        cur.execute(f"""
+            SELECT id, title, source, published, summary_short,
+                   categorie, classe, link, collected_at
+            FROM articles
+            WHERE id IN ({placeholders}) {active_clause}
+        """, tuple(ids))
+        by_id = {row["id"]: row for row in cur.fetchall()}
+        conn.close()
+        return [by_id[i] for i in ids if i in by_id]
+    except Exception as e:
+        print(f"Erreur lors de la récupération des articles par id : {e}")
+        return []
+
+# ---------- CACHE HTTP DES FLUX ----------
 
+def get_feed_cache():
+    """
+    Retourne les validateurs HTTP et le watermark connus par source :
+    {source: {"url", "etag", "modified", "filter_key", "last_published"}}.
+    """
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
         cur.execute("""
-            UPDATE articles
-            SET categorie = %s, classe = %s
-            WHERE id = %s
-        """, (categorie, classe, article_id))
+            SELECT source, url, etag, modified, filter_key, last_published
+            FROM feed_cache
+        """)
+        rows = cur.fetchall()
+        conn.close()
+        return {row["source"]: row for row in rows}
+    except Exception as e:
+        print(f"Erreur lors de la lecture du cache des flux : {e}")
+        return {}
 
+
+def save_feed_cache(entries):
+    """
+    Enregistre les validateurs HTTP et le watermark des flux.
+    entries : {source: {"url", "etag", "modified", "filter_key", "last_published"}}
+    """
+    if not entries:
+        return
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        now = datetime.utcnow()
+        cur.executemany("""
+            INSERT INTO feed_cache
+            (source, url, etag, modified, filter_key, last_published, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                url = VALUES(url),
+                etag = VALUES(etag),
+                modified = VALUES(modified),
+                filter_key = VALUES(filter_key),
+                last_published = VALUES(last_published),
+                updated_at = VALUES(updated_at)
+        """, [
+            (source, e.get("url"), e.get("etag"), e.get("modified"),
+             e.get("filter_key"), e.get("last_published"), now)
+            for source, e in entries.items()
+        ])
         conn.commit()
         conn.close()
     except Exception as e:
-        print(f"Erreur lors de la mise à jour de la catégorie/classe : {e}")
-        
-# ---------- DELETE / REJET ARTICLES ----------
-
+        print(f"Erreur lors de l'enregistrement du cache des flux : {e}")
 
-def reject_article(article_id):
-    conn = get_connection()
-    cur = conn.cursor()
+# ---------- STATISTIQUES DE TERMES (TF-IDF incrémental) ----------
 
+def _apply_term_stats(cur, tf, n_docs_delta, chunk_size=1000):
+    """
+    Ajoute (ou retire, valeurs négatives) des occurrences de termes dans la
+    transaction du curseur. tf : {terme: compte}
+    """
+    rows = list(tf.items())
+    for i in range(0, len(rows), chunk_size):
+        cur.executemany("""
+            INSERT INTO term_stats (term, tf) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE tf = tf + VALUES(tf)
+        """, rows[i:i + chunk_size])
+
+    # seuls les termes décrémentés peuvent tomber à 0 (recherche par clé primaire)
+    decremented = [term for term, count in tf.items() if count < 0]
+    for i in range(0, len(decremented), chunk_size):
+        chunk = decremented[i:i + chunk_size]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cur.execute(
+            f"DELETE FROM term_stats WHERE term IN ({placeholders}) AND tf <= 0",
+            tuple(chunk)
+        )
     cur.execute("""
-        UPDATE articles
-        SET verifie = 1
-        WHERE id = %s
-    """, (article_id,))
+        UPDATE term_stats_meta SET n_docs = GREATEST(n_docs + %s, 0) WHERE id = 1
+    """, (n_docs_delta,))
 
+
+def _record_term_stats(cur, term_counter, articles, sign):
+    """
+    Statistiques de termes des articles insérés (sign=1) ou rejetés (sign=-1),
+    dans la transaction de l'écriture des articles. Ignoré tant que les
+    statistiques ne sont pas construites (la reconstruction les comptera).
+    """
+    if term_counter is None or not articles:
+        return
+    cur.execute("SELECT built_at FROM term_stats_meta WHERE id = 1")
+    row = cur.fetchone()
+    built = row and (row["built_at"] if isinstance(row, dict) else row[0])
+    if not built:
+        return
+    tf = term_counter(articles, sign)
+    _apply_term_stats(cur, tf, sign * len(articles))
+
+
+def apply_term_stats(tf, n_docs_delta, chunk_size=1000):
+    """Ajoute (ou retire) des comptes de termes, dans leur propre transaction."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        _apply_term_stats(cur, tf, n_docs_delta, chunk_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def reset_term_stats():
+    """
+    Vide les statistiques de termes avant une reconstruction complète ;
+    built_at reste NULL jusqu'à mark_term_stats_built().
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM term_stats")
+    cur.execute("""
+        REPLACE INTO term_stats_meta (id, n_docs, built_at) VALUES (1, 0, NULL)
+    """)
+    conn.commit()
+    conn.close()
+
+
+def mark_term_stats_built():
+    """Marque la reconstruction comme terminée (après le dernier paquet)."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE term_stats_meta SET built_at = %s WHERE id = 1", (datetime.utcnow(),))
+    conn.commit()
+    conn.close()
+
+
+def term_stats_ready():
+    """True si les statistiques de termes ont déjà été construites."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT built_at FROM term_stats_meta WHERE id = 1")
+        row = cur.fetchone()
+        conn.close()
+        return bool(row and row[0])
+    except Exception as e:
+        print(f"Erreur lors de la lecture des statistiques de termes : {e}")
+        return False
+
+
+def get_top_terms(limit=30):
+    """
+    Termes les plus fréquents du corpus (articles non rejetés),
+    par nombre total d'occurrences décroissant.
+    """
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT term FROM term_stats
+            WHERE tf > 0
+            ORDER BY tf DESC, term
+            LIMIT %s
+        """, (limit,))
+        terms = [row[0] for row in cur.fetchall()]
+        conn.close()
+        return terms
+    except Exception as e:
+        print(f"Erreur lors de la récupération des termes fréquents : {e}")
+        return []
+
+
+def iter_article_texts(chunk_size=5000):
+    """
+    Parcourt (title, summary) des articles non rejetés par paquets
+    (pagination par id).
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        last_id = 0
+        while True:
+            cur.execute("""
+                SELECT id, title, summary FROM articles
+                WHERE verifie = 0 AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1]["id"]
+    finally:
+        conn.close()
+
+# ---------- SNAPSHOT D'ANALYSE ----------
+
+def get_analysis_fingerprint():
+    """
+    Empreinte de l'état des articles non rejetés, calculée sur la table
+    d'agrégats : change à chaque insertion, rejet ou changement de catégorie.
+    """
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COALESCE(SUM(cnt), 0), MAX(last_collected),
+                   COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', source, categorie, classe, mois, cnt))), 0)
+            FROM article_rollup
+        """)
+        total, last_collected, checksum = cur.fetchone()
+        conn.close()
+        return f"{total}:{last_collected or ''}:{checksum}"
+    except Exception as e:
+        print(f"Erreur lors du calcul de l'empreinte des articles : {e}")
+        return None
+
+
+def get_analysis_snapshot(window_days=0):
+    """Retourne le snapshot d'analyse de la fenêtre (dict) ou None."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT window_days, version, fingerprint, payload, created_at, with_model
+            FROM analysis_snapshot
+            WHERE window_days = %s
+        """, (window_days,))
+        row = cur.fetchone()
+        conn.close()
+        return row
+    except Exception as e:
+        print(f"Erreur lors de la lecture du snapshot d'analyse : {e}")
+        return None
+
+
+def save_analysis_snapshot(window_days, version, fingerprint, payload, with_model=True):
+    """
+    Enregistre (ou remplace) le snapshot d'analyse d'une fenêtre.
+    with_model=False : calculé sans le modèle ML, à remplacer dès que possible ;
+    il ne remplace jamais un snapshot avec modèle de même empreinte. Un
+    changement de with_model incrémente la version des données (les pages en
+    cache affichent les mots-clés de l'ancien snapshot).
+    Retourne True si le snapshot a été écrit.
+    """
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT fingerprint, with_model FROM analysis_snapshot
+            WHERE window_days = %s
+            FOR UPDATE
+        """, (window_days,))
+        current = cur.fetchone()
+        if current and current[1] and not with_model and current[0] == fingerprint:
+            conn.rollback()
+            conn.close()
+            return False
+        cur.execute("""
+            REPLACE INTO analysis_snapshot
+                (window_days, version, fingerprint, payload, created_at, with_model)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (window_days, version, fingerprint, payload, datetime.utcnow(), int(with_model)))
+        if current and bool(current[1]) != bool(with_model):
+            bump_data_version(cur)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"Erreur lors de l'enregistrement du snapshot d'analyse : {e}")
+        return False
+
+# ---------- LISTES PAGINÉES (KEYSET) ----------
+
+# collected_at NULL (anciens articles) : trié en dernier par ORDER BY ... DESC
+_NULL_CURSOR = "-"
+
+
+def encode_cursor(row):
+    """Curseur de pagination à partir du dernier article d'une page."""
+    collected_at = row["collected_at"]
+    if collected_at is None:
+        collected_at = _NULL_CURSOR
+    elif isinstance(collected_at, datetime):
+        collected_at = collected_at.strftime("%Y-%m-%dT%H:%M:%S")
+    return f"{collected_at}|{row['id']}"
+
+
+def decode_cursor(cursor):
+    """
+    Retourne (collected_at, id) — collected_at None pour les articles sans
+    date de collecte — ou None si le curseur est invalide.
+    """
+    try:
+        collected_at, article_id = cursor.rsplit("|", 1)
+        if collected_at == _NULL_CURSOR:
+            return None, int(article_id)
+        return datetime.strptime(collected_at, "%Y-%m-%dT%H:%M:%S"), int(article_id)
+    except Exception:
+        return None
+
+
+def _escape_like(text):
+    """Échappe les jokers de LIKE (%, _) d'une saisie utilisateur."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def get_articles_page(limit=30, cursor=None, source=None, categorie=None, q=None):
+    """
+    Page d'articles non rejetés, du plus récent au plus ancien, paginée par
+    curseur (collected_at, id). Filtres optionnels source / catégorie et
+    recherche q (titre ou résumé) côté SQL.
+    Retourne (articles, next_cursor) ; next_cursor vaut None en fin de liste.
+    Lève ValueError si le curseur est invalide.
+    """
+    where = ["verifie = 0"]
+    params = []
+    if source:
+        where.append("source = %s")
+        params.append(source)
+    if categorie:
+        where.append("categorie = %s")
+        params.append(categorie)
+    if q:
+        pattern = f"%{_escape_like(q)}%"
+        where.append("(title LIKE %s OR summary_short LIKE %s)")
+        params.extend((pattern, pattern))
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            raise ValueError(f"Curseur invalide : {cursor}")
+        collected_at, article_id = position
+        if collected_at is None:
+            where.append("(collected_at IS NULL AND id < %s)")
+            params.append(article_id)
+        else:
+            where.append("(collected_at < %s OR (collected_at = %s AND id < %s)"
+                         " OR collected_at IS NULL)")
+            params.extend((collected_at, collected_at, article_id))
+
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute(f"""
+            SELECT id, title, source, published, summary_short,
+                   categorie, classe, link, collected_at
+            FROM articles
+            WHERE {" AND ".join(where)}
+            ORDER BY collected_at DESC, id DESC
+            LIMIT %s
+        """, (*params, limit + 1))
+        rows = cur.fetchall()
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de la récupération de la page d'articles : {e}")
+        return [], None
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def get_source_counts():
+    """Nombre d'articles non rejetés par source (facette de la page veilleur)."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT source, COUNT(*) FROM articles
+            WHERE verifie = 0
+            GROUP BY source
+            ORDER BY source
+        """)
+        counts = {source: count for source, count in cur.fetchall()}
+        conn.close()
+        return counts
+    except Exception as e:
+        print(f"Erreur lors du comptage des articles par source : {e}")
+        return {}
+
+# ---------- PROJECTIONS PAR USAGE ----------
+
+def _window_clause(days):
+    """Filtre optionnel sur les `days` derniers jours de collecte."""
+    if not days:
+        return "", ()
+    return "AND collected_at >= %s", (datetime.utcnow() - timedelta(days=int(days)),)
+
+
+def get_recent_articles(limit=10):
+    """Derniers articles non rejetés, colonnes d'affichage uniquement."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT id, title, source, published, summary_short, link, collected_at
+            FROM articles
+            WHERE verifie = 0
+            ORDER BY collected_at DESC, id DESC
+            LIMIT %s
+        """, (limit,))
+        rows = cur.fetchall()
+        conn.close()
+        return rows
+    except Exception as e:
+        print(f"Erreur lors de la récupération des derniers articles : {e}")
+        return []
+
+
+def get_articles_for_analysis(days=None):
+    """
+    Articles non rejetés de la fenêtre pour Analyste.analyze : source,
+    catégorie et title / summary (extraction TF-IDF).
+    """
+    window, params = _window_clause(days)
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute(f"""
+            SELECT source, categorie, title, summary
+            FROM articles
+            WHERE verifie = 0 {window}
+        """, params)
+        rows = cur.fetchall()
+        conn.close()
+        return rows
+    except Exception as e:
+        print(f"Erreur lors de la récupération des articles à analyser : {e}")
+        return []
+
+
+def get_articles_for_alerts(days=None):
+    """Articles non rejetés avec les seules colonnes utiles au scoring des alertes."""
+    window, params = _window_clause(days)
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute(f"""
+            SELECT title, summary, summary_short, mots_cles, source,
+                   published, link, collected_at
+            FROM articles
+            WHERE verifie = 0 {window}
+            ORDER BY collected_at DESC
+        """, params)
+        rows = cur.fetchall()
+        conn.close()
+        return rows
+    except Exception as e:
+        print(f"Erreur lors de la récupération des articles pour les alertes : {e}")
+        return []
+
+# ---------- ARTICLES : CATEGORIES MANQUANTES ----------
+
+def get_articles_for_backfill(after_id=0, limit=1000, only_missing=True, ids=None):
+    """
+    Paquet d'articles à (re)classer, par id croissant après after_id.
+    only_missing=True : seulement ceux sans catégorie.
+    ids : restreint le paquet à ces articles.
+    Une erreur BDD est propagée : une liste vide signifie « plus rien à
+    traiter » et efface le point de reprise du backfill.
+    """
+    missing_clause = "AND (categorie IS NULL OR categorie = '')" if only_missing else ""
+    params = [after_id]
+    ids_clause = ""
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return []
+        ids_clause = f"AND id IN ({', '.join(['%s'] * len(ids))})"
+        params.extend(ids)
+    params.append(limit)
+    conn = get_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(f"""
+            SELECT id, title, summary, source
+            FROM articles
+            WHERE id > %s {missing_clause} {ids_clause}
+            ORDER BY id
+            LIMIT %s
+        """, tuple(params))
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def bulk_update_categories(rows, checkpoint=None, chunk_size=500):
+    """
+    Applique des mises à jour (article_id, categorie, classe) par UPDATE
+    groupés (CASE ... WHEN), sur une seule connexion et dans une seule
+    transaction. Si checkpoint est fourni, le point de reprise (dernier id
+    traité) est enregistré dans la même transaction.
+    """
+    if not rows:
+        return 0
+    conn = get_connection()
+    cur = conn.cursor()
+    updated = 0
+    try:
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            deltas = _rollup_category_changes(cur, chunk)
+            cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+            placeholders = ", ".join(["%s"] * len(chunk))
+            params = []
+            for article_id, categorie, _ in chunk:
+                params.extend((article_id, categorie))
+            for article_id, _, classe in chunk:
+                params.extend((article_id, classe))
+            params.extend(article_id for article_id, _, _ in chunk)
+            cur.execute(f"""
+                UPDATE articles
+                SET categorie = CASE id {cases} END,
+                    classe = CASE id {cases} END
+                WHERE id IN ({placeholders})
+            """, tuple(params))
+            updated += cur.rowcount
+            _apply_rollup(cur, deltas)
+
+        if checkpoint:
+            cur.execute("""
+                REPLACE INTO backfill_state (name, last_id, updated_at)
+                VALUES (%s, %s, %s)
+            """, (checkpoint, max(r[0] for r in rows), datetime.utcnow()))
+        if updated:
+            bump_data_version(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return updated
+
+
+def get_backfill_checkpoint(name):
+    """
+    Dernier id traité par un backfill interrompu (0 si aucun). Une erreur
+    BDD est propagée plutôt que de repartir de zéro.
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT last_id FROM backfill_state WHERE name = %s", (name,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+    finally:
+        conn.close()
+
+
+def clear_backfill_checkpoint(name):
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM backfill_state WHERE name = %s", (name,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de la suppression du point de reprise : {e}")
+
+# ---------- DELETE / REJET ARTICLES ----------
+
+
+def reject_article(article_id, term_counter=None):
+    """
+    Rejette un article (agrégats et, avec term_counter, statistiques de
+    termes retirés dans la même transaction). Retourne l'article (title,
+    summary) s'il vient d'être rejeté, None s'il l'était déjà ou n'existe pas.
+    """
+    conn = get_connection()
+    cur = conn.cursor(dictionary=True)
+
+    cur.execute("""
+        SELECT id, title, summary, source, categorie, classe, collected_at
+        FROM articles
+        WHERE id = %s AND verifie = 0
+        FOR UPDATE
+    """, (article_id,))
+    article = cur.fetchone()
+
+    cur.execute("""
+        UPDATE articles
+        SET verifie = 1
+        WHERE id = %s
+    """, (article_id,))
+
+    if article:
+        key = _rollup_key(article["source"], article["categorie"],
+                          article["classe"], article["collected_at"])
+        _apply_rollup(cur, {key: -1})
+        _record_term_stats(cur, term_counter, [article], -1)
+        bump_data_version(cur)
+
+    conn.commit()
+    conn.close()
+    return article
+
+# ---------- JOBS DE VEILLE ----------
+# Un job actif (pending / running) porte active_key = config_key : l'index
+# unique empêche deux jobs actifs pour la même configuration, y compris entre
+# processus. active_key repasse à NULL quand le job se termine.
+JOB_STALE_AFTER = timedelta(hours=6)
+# durée de conservation des évènements de progression (flux SSE)
+JOB_EVENTS_RETENTION = timedelta(days=7)
+
+
+def create_veille_job(job_id, config_key, params, created_by=None):
+    """
+    Enregistre un job pending. Si un job actif existe déjà pour la même
+    configuration, retourne (son id, False) ; sinon (job_id, True).
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        # 2 essais : le job actif trouvé en doublon peut se terminer entre-temps
+        for _ in range(2):
+            now = datetime.utcnow()
+            # un job actif trop ancien a été interrompu (processus arrêté)
+            cur.execute("""
+                UPDATE veille_jobs
+                SET status = 'error', message = 'Job interrompu', active_key = NULL,
+                    finished_at = %s
+                WHERE active_key = %s AND created_at < %s
+            """, (now, config_key, now - JOB_STALE_AFTER))
+            try:
+                cur.execute("""
+                    INSERT INTO veille_jobs
+                        (id, config_key, active_key, status, params, created_by, created_at)
+                    VALUES (%s, %s, %s, 'pending', %s, %s, %s)
+                """, (job_id, config_key, config_key, params, created_by, now))
+                conn.commit()
+                return job_id, True
+            except mysql.connector.Error as e:
+                conn.rollback()
+                if e.errno != 1062:  # ER_DUP_ENTRY : job déjà actif pour cette config
+                    raise
+            cur.execute("SELECT id FROM veille_jobs WHERE active_key = %s", (config_key,))
+            row = cur.fetchone()
+            conn.commit()
+            if row:
+                return row[0], False
+        raise RuntimeError("Impossible de créer le job de veille")
+    finally:
+        conn.close()
+
+
+def update_veille_job(job_id, status, message=None, result=None):
+    """Met à jour le statut d'un job (running, done, error)."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        now = datetime.utcnow()
+        if status == "running":
+            cur.execute("""
+                UPDATE veille_jobs SET status = %s, message = %s, started_at = %s
+                WHERE id = %s
+            """, (status, message, now, job_id))
+        else:
+            cur.execute("""
+                UPDATE veille_jobs
+                SET status = %s, message = %s, result = %s,
+                    finished_at = %s, active_key = NULL
+                WHERE id = %s
+            """, (status, message, result, now, job_id))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de la mise à jour du job {job_id} : {e}")
+
+
+def get_veille_job(job_id):
+    """Retourne le job (dict) ou None."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT id, status, message, result, created_at, started_at, finished_at
+            FROM veille_jobs
+            WHERE id = %s
+        """, (job_id,))
+        job = cur.fetchone()
+        conn.close()
+        return job
+    except Exception as e:
+        print(f"Erreur lors de la lecture du job {job_id} : {e}")
+        return None
+
+def add_veille_job_event(job_id, event, data):
+    """Ajoute un évènement de progression (data : JSON sérialisé)."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO veille_job_events (job_id, event, data, created_at)
+            VALUES (%s, %s, %s, %s)
+        """, (job_id, event, data, datetime.utcnow()))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de l'enregistrement de la progression du job {job_id} : {e}")
+
+
+def get_veille_job_events(job_id, after_id=0, limit=200):
+    """Évènements du job postérieurs à after_id, dans l'ordre d'émission."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT id, event, data, created_at
+            FROM veille_job_events
+            WHERE job_id = %s AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (job_id, after_id, limit))
+        rows = cur.fetchall()
+        conn.close()
+        return rows
+    except Exception as e:
+        print(f"Erreur lors de la lecture de la progression du job {job_id} : {e}")
+        return []
+
+
+def prune_veille_job_events(older_than=JOB_EVENTS_RETENTION, batch_size=5000):
+    """
+    Supprime les évènements de progression plus anciens que older_than, par
+    paquets (verrous courts). Retourne le nombre de lignes supprimées.
+    """
+    cutoff = datetime.utcnow() - older_than
+    deleted = 0
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                "DELETE FROM veille_job_events WHERE created_at < %s LIMIT %s",
+                (cutoff, batch_size),
+            )
+            conn.commit()
+            deleted += cur.rowcount
+            if cur.rowcount < batch_size:
+                break
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de la purge des évènements de jobs : {e}")
+    return deleted
+
+# ---------- PLANIFICATEUR ----------
+
+def get_scheduler_states():
+    """
+    Dernière exécution de chaque tâche planifiée : {nom: datetime}, ou None
+    si l'état est illisible (à ne pas confondre avec « jamais exécutée »).
+    """
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT name, last_run_at FROM scheduler_state")
+        states = {name: last_run for name, last_run in cur.fetchall()}
+        conn.close()
+        return states
+    except Exception as e:
+        print(f"Erreur lors de la lecture de l'état du planificateur : {e}")
+        return None
+
+
+def set_scheduler_last_runs(names, when):
+    """Enregistre la date d'exécution de plusieurs tâches (ex. sources) à la fois."""
+    rows = [(name, when, datetime.utcnow()) for name in names]
+    if not rows:
+        return
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.executemany("""
+            REPLACE INTO scheduler_state (name, last_run_at, updated_at)
+            VALUES (%s, %s, %s)
+        """, rows)
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Erreur lors de l'enregistrement de l'état du planificateur : {e}")
+
+def get_last_collected_at():
+    """Date de collecte du dernier article non rejeté (table d'agrégats)."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT MAX(last_collected) FROM article_rollup")
+        row = cur.fetchone()
+        conn.close()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"Erreur lors de la lecture de la dernière collecte : {e}")
+        return None
+
+# ---------- FILE DE TRAVAIL (WORKERS) ----------
+# status : queued -> running -> done | failed (ou queued à nouveau pour un retry).
+# Pour une tâche running, available_at est la fin de son délai de visibilité :
+# passé ce délai (worker mort ou bloqué), elle redevient réclamable.
+# pending_key : au plus une tâche en attente par clé (ex. "fetch:arxiv"),
+# libérée dès qu'un worker réclame la tâche.
+TASK_RETRY_DELAY = 30   # secondes, doublé à chaque nouvel essai
+
+# délai de visibilité (secondes) par type de tâche
+TASK_TIMEOUTS = {
+    "fetch": 600,
+    "classify": 1800,
+    "analysis": 900,
+    "backfill": 3600,
+}
+
+
+def enqueue_task(kind, payload, priority=0, pending_key=None,
+                 max_attempts=3, timeout_seconds=None, delay=0):
+    """
+    Ajoute une tâche (payload : dict sérialisé en JSON). Retourne son id, ou
+    None si une tâche avec la même pending_key est déjà en attente.
+    timeout_seconds : délai de visibilité, TASK_TIMEOUTS[kind] par défaut.
+    """
+    timeout_seconds = timeout_seconds or TASK_TIMEOUTS.get(kind, 600)
+    conn = get_connection()
+    cur = conn.cursor()
+    now = datetime.utcnow()
+    try:
+        cur.execute("""
+            INSERT IGNORE INTO work_queue
+                (kind, payload, status, priority, max_attempts, timeout_seconds,
+                 available_at, pending_key, created_at, updated_at)
+            VALUES (%s, %s, 'queued', %s, %s, %s, %s, %s, %s, %s)
+        """, (kind, json.dumps(payload, default=str), priority, max_attempts,
+              timeout_seconds, now + timedelta(seconds=delay), pending_key, now, now))
+        task_id = cur.lastrowid if cur.rowcount else None
+        conn.commit()
+        return task_id
+    finally:
+        conn.close()
+
+
+def claim_tasks(worker_id, kinds=None, limit=1):
+    """
+    Réclame jusqu'à limit tâches disponibles (SELECT ... FOR UPDATE SKIP
+    LOCKED : plusieurs workers ne se bloquent pas et ne prennent jamais la
+    même tâche). Retourne [{id, kind, payload, attempts, ...}].
+    """
+    conn = get_connection()
+    cur = conn.cursor(dictionary=True)
+    now = datetime.utcnow()
+    kinds = list(kinds or ())
+    kind_clause = f"AND kind IN ({', '.join(['%s'] * len(kinds))})" if kinds else ""
+    try:
+        # délai de visibilité expiré sans plus aucun essai : échec définitif.
+        # SKIP LOCKED ici aussi : un UPDATE direct attendrait les lignes
+        # verrouillées par la réclamation en cours d'un autre worker
+        cur.execute("""
+            SELECT id FROM work_queue
+            WHERE status = 'running' AND available_at <= %s AND attempts >= max_attempts
+            FOR UPDATE SKIP LOCKED
+        """, (now,))
+        expired = [row["id"] for row in cur.fetchall()]
+        if expired:
+            cur.execute(f"""
+                UPDATE work_queue
+                SET status = 'failed', last_error = 'Délai de visibilité dépassé',
+                    updated_at = %s
+                WHERE id IN ({', '.join(['%s'] * len(expired))})
+            """, (now, *expired))
+        cur.execute(f"""
+            SELECT id, kind, payload, attempts, max_attempts, timeout_seconds
+            FROM work_queue
+            WHERE status IN ('queued', 'running') AND available_at <= %s
+              AND attempts < max_attempts {kind_clause}
+            ORDER BY priority DESC, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (now, *kinds, limit))
+        tasks = cur.fetchall()
+        for task in tasks:
+            cur.execute("""
+                UPDATE work_queue
+                SET status = 'running', attempts = attempts + 1, locked_by = %s,
+                    pending_key = NULL, available_at = %s, updated_at = %s
+                WHERE id = %s
+            """, (worker_id, now + timedelta(seconds=task["timeout_seconds"]), now, task["id"]))
+            task["attempts"] += 1
+            task["payload"] = json.loads(task["payload"]) if task["payload"] else {}
+        conn.commit()
+        return tasks
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def start_task(task_id, worker_id, timeout_seconds):
+    """
+    Repart du délai de visibilité complet au démarrage effectif de la tâche
+    (les tâches réclamées par lot attendent leur tour chez le worker).
+    Retourne False si la tâche a expiré et été reprise par un autre worker.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    now = datetime.utcnow()
+    cur.execute("""
+        UPDATE work_queue
+        SET available_at = %s, updated_at = %s
+        WHERE id = %s AND locked_by = %s AND status = 'running'
+    """, (now + timedelta(seconds=timeout_seconds), now, task_id, worker_id))
+    started = cur.rowcount == 1
     conn.commit()
     conn.close()
+    return started
+
+
+def complete_task(task_id, worker_id, result=None):
+    """Marque la tâche terminée (ignoré si un autre worker l'a reprise entre-temps)."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE work_queue
+        SET status = 'done', result = %s, updated_at = %s
+        WHERE id = %s AND locked_by = %s AND status = 'running'
+    """, (json.dumps(result, default=str) if result is not None else None,
+          datetime.utcnow(), task_id, worker_id))
+    conn.commit()
+    conn.close()
+
+
+def fail_task(task_id, worker_id, error):
+    """
+    Échec d'un essai : la tâche repasse en attente avec un délai croissant,
+    ou échoue définitivement après max_attempts essais.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    now = datetime.utcnow()
+    cur.execute("""
+        UPDATE work_queue
+        SET status = IF(attempts >= max_attempts, 'failed', 'queued'),
+            available_at = DATE_ADD(%s, INTERVAL %s * POW(2, attempts - 1) SECOND),
+            last_error = %s, updated_at = %s
+        WHERE id = %s AND locked_by = %s AND status = 'running'
+    """, (now, TASK_RETRY_DELAY, str(error)[:2000], now, task_id, worker_id))
+    conn.commit()
+    conn.close()
+
+
+def count_pending_tasks(kinds=None):
+    """Nombre de tâches en attente ou en cours (tous types ou kinds)."""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        kinds = list(kinds or ())
+        kind_clause = f"AND kind IN ({', '.join(['%s'] * len(kinds))})" if kinds else ""
+        cur.execute(f"""
+            SELECT COUNT(*) FROM work_queue
+            WHERE status IN ('queued', 'running') {kind_clause}
+        """, tuple(kinds))
+        count = cur.fetchone()[0]
+        conn.close()
+        return count
+    except Exception as e:
+        print(f"Erreur lors du comptage des tâches : {e}")
+        return 0
 
 # ---------- LOGIN FUNCTIONS ----------
 
@@ -329,6 +2030,7 @@ def create_user(username, email, password, role):
             INSERT INTO users (username, email, password_hash, role, is_first_login)
             VALUES (%s, %s, %s, %s, 1)
         """, (username, email, hashed_pw, role))
+        bump_data_version(cur)
 
         conn.commit()
         conn.close()
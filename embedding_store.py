@@ -0,0 +1,241 @@
+import os
+import hashlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+# ---------- CONFIG ----------
+BASE_DIR = os.path.dirname(__file__)
+EMBEDDINGS_DIR = os.path.join(BASE_DIR, "data", "embeddings")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Cache disque des embeddings, un répertoire par modèle, partagé entre
+    processus (workers web, planificateur, workers de la file) :
+      - index.log            : en-tête "dim génération", puis une ligne
+                               "hash ligne" par vecteur, en ajout seul,
+      - vectors.<gen>.f32    : matrice float32 (une ligne par texte), en memmap,
+      - lock                 : verrou fcntl (partagé en lecture, exclusif en écriture).
+    Chaque processus relit la fin de index.log quand le fichier a grandi, et
+    le recharge entièrement quand compact() l'a remplacé (nouvelle génération).
+    Borné à max_entries : au-delà, compact() garde les entrées les plus
+    récentes (accès vus par ce processus, sinon ordre d'ajout).
+    """
+
+    def __init__(self, model_id: str, directory: str = EMBEDDINGS_DIR, max_entries: int = 200_000):
+        self.directory = os.path.join(directory, model_id)
+        self.max_entries = max_entries
+        self.index_path = os.path.join(self.directory, "index.log")
+        self.lock_path = os.path.join(self.directory, "lock")
+        self._lock = threading.Lock()
+        self._clear_state()
+
+    def _clear_state(self):
+        self.dim = None
+        self.generation = 0
+        self.rows = {}          # hash -> [ligne, dernier accès]
+        self.tick = 0
+        self._index_id = None   # (st_dev, st_ino) de l'index lu
+        self._offset = 0        # octets de index.log déjà lus
+        self._corrupt = False
+        self._matrix = None
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.directory, f"vectors.{self.generation}.f32")
+
+    # --------- verrou inter-processus ---------
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.lock_path, "a+b") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    self._sync()
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # --------- index ---------
+
+    def _sync(self):
+        """Met l'état mémoire à jour avec index.log (appelé sous verrou)."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            if self._index_id is not None:
+                self._clear_state()
+            return
+        index_id = (st.st_dev, st.st_ino)
+        if index_id != self._index_id:
+            # nouvel index (création ou compaction par un autre processus)
+            self._clear_state()
+            self._index_id = index_id
+        if st.st_size > self._offset:
+            self._read_tail(st.st_size)
+
+    def _read_tail(self, size):
+        with open(self.index_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1     # ligne incomplète : relue plus tard
+        if not end:
+            return
+        try:
+            lines = data[:end].decode("utf-8").splitlines()
+            if self._offset == 0:
+                dim, generation = lines.pop(0).split()
+                self.dim, self.generation = int(dim), int(generation)
+            for line in lines:
+                key, row = line.split()
+                row = int(row)
+                self.rows[key] = [row, row]
+                self.tick = max(self.tick, row + 1)
+        except ValueError as e:
+            # ignoré jusqu'à la prochaine écriture, qui repart de zéro
+            print(f"⚠️ Index d'embeddings illisible, cache réinitialisé : {e}")
+            index_id = self._index_id
+            self._clear_state()
+            self._index_id, self._offset, self._corrupt = index_id, size, True
+            return
+        self._offset += end
+        self._matrix = None
+
+    def _write_index(self, dim, generation, entries):
+        """Remplace atomiquement index.log (en-tête + entrées [(hash, ligne)])."""
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{dim} {generation}\n")
+            f.writelines(f"{key} {row}\n" for key, row in entries)
+        os.replace(tmp, self.index_path)
+
+    def _reset(self):
+        for name in os.listdir(self.directory):
+            if name.startswith(("vectors", "index")):
+                os.remove(os.path.join(self.directory, name))
+        self._clear_state()
+
+    def _n_rows(self) -> int:
+        if not self.dim or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dim)
+
+    def _get_matrix(self):
+        if self._matrix is None:
+            n = self._n_rows()
+            if n == 0:
+                return None
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return self._matrix
+
+    def __len__(self):
+        with self._locked(exclusive=False):
+            return len(self.rows)
+
+    # --------- lecture / écriture ---------
+
+    def get_many(self, keys):
+        """Retourne une liste alignée sur keys : vecteur (np.ndarray) ou None."""
+        with self._locked(exclusive=False):
+            matrix = self._get_matrix()
+            result = []
+            for key in keys:
+                entry = self.rows.get(key)
+                if entry is None or matrix is None or entry[0] >= matrix.shape[0]:
+                    result.append(None)
+                    continue
+                self.tick += 1
+                entry[1] = self.tick
+                result.append(np.array(matrix[entry[0]]))
+            return result
+
+    def put_many(self, keys, vectors):
+        """Ajoute des vecteurs (un par clé) en fin de fichier, puis leurs lignes d'index."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys) or vectors.ndim != 2:
+            return
+        with self._locked(exclusive=True):
+            if self._corrupt or (self.dim is not None and self.dim != vectors.shape[1]):
+                # dimension différente = autre modèle sous le même id : on repart de zéro
+                self._reset()
+            if self.dim is None:
+                self._reset()   # fichiers orphelins ou ancien format
+                self._write_index(int(vectors.shape[1]), 0, [])
+                self._sync()
+
+            new_keys, new_vectors, seen = [], [], set()
+            for key, vec in zip(keys, vectors):
+                if key in self.rows or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_vectors.append(vec)
+            if not new_keys:
+                return
+
+            # vecteurs d'abord : une interruption laisse au pire des lignes orphelines
+            start = self._n_rows()
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(start * 4 * self.dim)    # ligne partielle éventuelle
+                f.write(np.stack(new_vectors).astype(np.float32).tobytes())
+            with open(self.index_path, "r+b") as f:
+                f.truncate(self._offset)            # ligne d'index partielle éventuelle
+                f.seek(self._offset)
+                f.write("".join(f"{key} {start + i}\n" for i, key in enumerate(new_keys)).encode("utf-8"))
+            self._sync()
+            for key in new_keys:
+                self.tick += 1
+                self.rows[key][1] = self.tick
+
+            # on tolère un peu de dépassement pour ne pas compacter à chaque lot
+            if self._n_rows() > int(self.max_entries * 1.25):
+                self._compact_locked(self.max_entries)
+
+    # --------- éviction ---------
+
+    def compact(self, max_entries: int = None):
+        """Réécrit le cache en ne gardant que les max_entries entrées les plus récentes."""
+        with self._locked(exclusive=True):
+            self._compact_locked(max_entries or self.max_entries)
+
+    def _compact_locked(self, max_entries: int):
+        matrix = self._get_matrix()
+        if matrix is None:
+            return
+        kept = sorted(self.rows.items(), key=lambda kv: kv[1][1], reverse=True)[:max_entries]
+        kept = [(k, v) for k, v in kept if v[0] < matrix.shape[0]]
+        data = np.array(matrix[[v[0] for _, v in kept]], dtype=np.float32) if kept else None
+        self._matrix = None
+
+        # nouvelle génération : les lectures en cours d'autres processus gardent
+        # l'ancien fichier jusqu'à ce qu'ils relisent l'index remplacé
+        old_vectors = self.vectors_path
+        generation = self.generation + 1
+        with open(os.path.join(self.directory, f"vectors.{generation}.f32"), "wb") as f:
+            if data is not None:
+                f.write(data.tobytes())
+        self._write_index(self.dim, generation, [(k, i) for i, (k, _) in enumerate(kept)])
+        try:
+            os.remove(old_vectors)
+        except OSError:
+            pass    # encore ouvert ailleurs (Windows) : supprimé au prochain _reset
+
+        ticks = {k: v[1] for k, v in kept}
+        self._sync()
+        for key, entry in self.rows.items():
+            entry[1] = ticks.get(key, entry[1])
+        self.tick = max([self.tick, *ticks.values()])
@@ -0,0 +1,95 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session, make_response
+
+from db_mysql import get_data_version
+
+
+class ResponseCache:
+    """
+    Cache mémoire (par processus) des réponses rendues, LRU borné à
+    max_entries et expiré après ttl secondes. Les clés contiennent la version
+    des données : une écriture en BDD rend les anciennes entrées inatteignables,
+    elles sortent ensuite par LRU / TTL.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # clé -> (expiration, valeur)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_view(cache, vary=None):
+    """
+    Décorateur de route GET : la réponse est mise en cache par
+    (vue, URL, rôle, version des données[, vary()]) et servie avec un ETag ;
+    un navigateur qui renvoie If-None-Match reçoit un 304 sans corps.
+    À placer sous @require_role (l'accès est vérifié avant le cache).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # messages flash en attente : page propre à cette requête
+            if request.method != "GET" or session.get("_flashes"):
+                return f(*args, **kwargs)
+            version = get_data_version()
+            if version is None:
+                return f(*args, **kwargs)
+
+            key = (
+                f.__name__,
+                request.full_path,
+                session.get("role"),
+                version,
+                vary() if vary else None,
+            )
+            entry = cache.get(key)
+            if entry is None:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                etag = f"{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+                entry = (body, response.content_type, etag)
+                cache.set(key, entry)
+
+            body, content_type, etag = entry
+            response = make_response(body)
+            response.content_type = content_type
+            response.set_etag(etag)
+            # le navigateur garde la page mais la revalide à chaque affichage
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response.make_conditional(request)
+        return decorated_function
+    return decorator
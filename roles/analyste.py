@@ -1,37 +1,205 @@
 import os
+import re
 import json
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
 import joblib
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from sklearn.feature_extraction.text import TfidfVectorizer, ENGLISH_STOP_WORDS
 
+from embedding_store import EmbeddingStore, text_hash
+from db_mysql import (
+    iter_article_embeddings,
+    get_articles_by_ids,
+    apply_term_stats,
+    reset_term_stats,
+    mark_term_stats_built,
+    term_stats_ready,
+    get_top_terms,
+    iter_article_texts,
+    get_articles_for_analysis,
+    get_rollup_breakdown,
+    get_analysis_fingerprint,
+    get_analysis_snapshot,
+    save_analysis_snapshot,
+    enqueue_task,
+    AdvisoryLock,
+)
 
-class Analyste:
-    def __init__(self, load_model: bool = True):
-        # base du projet : .../Veille_ai
-        base_dir = os.path.dirname(os.path.dirname(__file__))
 
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "models", "sentence_transformer_model")
+CLASSIFIEUR_PATH = os.path.join(BASE_DIR, "models", "classifieur_model.pkl")
+LE_PATH = os.path.join(BASE_DIR, "models", "label_encoder.pkl")
+
+
+# ---------- MOTS-CLÉS (TF-IDF) ----------
+CUSTOM_STOPWORDS = {
+    "ai", "llm", "large", "language", "model", "models", "based",
+    "using", "use", "dataset", "data", "paper", "study", "result",
+    "results", "method", "methods", "approach", "task", "tasks",
+    "abstract", "announced", "announce", "arxiv", "cross"
+}
+STOP_WORDS = ENGLISH_STOP_WORDS.union(CUSTOM_STOPWORDS)
+TOKEN_PATTERN = r"(?u)\b[a-zA-Z][a-zA-Z\-]{2,}\b"
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+# une seule reconstruction des statistiques de termes à la fois
+TERM_STATS_REBUILD_LOCK = "veille_ia_term_stats_rebuild"
+
+
+def count_terms(texts):
+    """
+    Compte les termes comme le TfidfVectorizer d'extract_keywords
+    (minuscules, même token_pattern, mêmes stop words).
+    Retourne tf : occurrences totales par terme.
+    """
+    tf = Counter()
+    for text in texts:
+        tf.update(t for t in _TOKEN_RE.findall((text or "").lower())
+                  if t not in STOP_WORDS and len(t) <= 64)
+    return tf
+
+
+def _article_corpus_text(item) -> str:
+    return ((item.get("title") or "") + " " + (item.get("summary") or "")).strip()
+
+
+def article_term_counts(articles, sign: int = 1):
+    """
+    Occurrences des termes des articles, multipliées par sign : 1 pour des
+    articles insérés, -1 pour des articles rejetés. Passé à save_articles /
+    reject_article (term_counter) pour une mise à jour dans leur transaction.
+    """
+    tf = count_terms(_article_corpus_text(a) for a in articles)
+    return {t: sign * c for t, c in tf.items()}
+
+
+def record_term_stats(articles, sign: int = 1):
+    """
+    Met à jour les statistiques de termes : sign=1 pour des articles insérés,
+    sign=-1 pour des articles rejetés.
+    """
+    if not articles:
+        return
+    apply_term_stats(article_term_counts(articles, sign), sign * len(articles))
+
+
+def rebuild_term_stats():
+    """
+    Reconstruit entièrement les statistiques de termes depuis la BDD. Un seul
+    processus à la fois ; built_at n'est écrit qu'après le dernier paquet
+    (une reconstruction interrompue sera reprise au run suivant).
+    """
+    lock = AdvisoryLock(TERM_STATS_REBUILD_LOCK)
+    if not lock.acquire():
+        print("ℹ️ Reconstruction des statistiques de termes déjà en cours")
+        return
+    try:
+        reset_term_stats()
+        for rows in iter_article_texts():
+            record_term_stats(rows)
+        mark_term_stats_built()
+    finally:
+        lock.release()
+
+
+class ModelRegistry:
+    """
+    Modèles ML partagés par tout le processus (SentenceTransformer +
+    classifieur + label encoder). Chargés paresseusement une seule fois,
+    réutilisés par les veilles planifiées et manuelles.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, classifieur_path=CLASSIFIEUR_PATH, le_path=LE_PATH):
+        self.model_dir = model_dir
+        self.classifieur_path = classifieur_path
+        self.le_path = le_path
+        self._lock = threading.Lock()
+        self._models = None
+        self._embedding_store = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._models is not None
+
+    @property
+    def model_id(self) -> str:
+        """Identifiant du modèle : nom du répertoire + date de modification."""
+        try:
+            mtime = int(os.path.getmtime(self.model_dir))
+        except OSError:
+            mtime = 0
+        return f"{os.path.basename(os.path.normpath(self.model_dir))}-{mtime}"
+
+    def embedding_store(self) -> EmbeddingStore:
+        """Cache disque des embeddings associé au modèle courant."""
+        with self._lock:
+            if self._embedding_store is None:
+                self._embedding_store = EmbeddingStore(self.model_id)
+            return self._embedding_store
+
+    def get(self):
+        """Retourne (model, classifieur, le), en les chargeant au premier appel."""
+        models = self._models
+        if models is not None:
+            return models
+        with self._lock:
+            # double vérification : un autre thread a pu charger entre-temps
+            if self._models is None:
+                model = SentenceTransformer(self.model_dir)
+                classifieur = joblib.load(self.classifieur_path)
+                le = joblib.load(self.le_path)
+                self._models = (model, classifieur, le)
+            return self._models
+
+    def warm_up(self) -> bool:
+        """Charge les modèles à l'avance (ex. au démarrage). Retourne False si échec."""
+        try:
+            self.get()
+            return True
+        except Exception as e:
+            print(f"⚠️ Impossible de précharger le modèle ML : {e}")
+            return False
+
+    def unload(self):
+        """Libère les modèles ; ils seront rechargés au prochain get()."""
+        with self._lock:
+            self._models = None
+            self._embedding_store = None
+
+
+# instance partagée par le processus
+model_registry = ModelRegistry()
+
+
+class Analyste:
+    def __init__(self, load_model: bool = True, registry: ModelRegistry = None):
         # chemins des données (optionnels, pour compatibilité)
-        self.input_path = os.path.join(base_dir, "data", "raw_data.json")
+        self.input_path = os.path.join(BASE_DIR, "data", "raw_data.json")
         # on ne forcera plus l'écriture dans analyzed_data.json
         self.output_path = None
 
-        # chemins des modèles
-        model_dir = os.path.join(base_dir, "models", "sentence_transformer_model")
-        classifieur_path = os.path.join(base_dir, "models", "classifieur_model.pkl")
-        le_path = os.path.join(base_dir, "models", "label_encoder.pkl")
-
         # flag pour savoir si le ML est dispo
         self.use_ml = False
         self.model = None
         self.classifieur = None
         self.le = None
+        self.embeddings = None
+        self.model_id = None
 
         if load_model:
             try:
-                self.model = SentenceTransformer(model_dir)
-                self.classifieur = joblib.load(classifieur_path)
-                self.le = joblib.load(le_path)
+                # modèles partagés : chargés au premier run seulement
+                registry = registry or model_registry
+                self.model, self.classifieur, self.le = registry.get()
+                self.model_id = registry.model_id
                 self.use_ml = True
+                try:
+                    self.embeddings = registry.embedding_store()
+                except Exception as e:
+                    print(f"⚠️ Cache d'embeddings indisponible : {e}")
             except Exception as e:
                 print(f"⚠️ Impossible de charger le modèle ML Analyste : {e}")
                 self.use_ml = False
@@ -39,23 +207,65 @@ class Analyste:
             print("ℹ️ Analyste : ML désactivé (utilisation des catégories BDD uniquement).")
 
     # --------- ML : classification ---------
+    def encode_texts(self, texts, batch_size: int = 64):
+        """
+        Encode des textes en passant par le cache disque : seuls les textes
+        absents du cache sont envoyés à model.encode.
+        """
+        texts = [t or "" for t in texts]
+        if self.embeddings is None:
+            return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+        keys = [text_hash(t) for t in texts]
+        cached = self.embeddings.get_many(keys)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            new_vecs = np.asarray(
+                self.model.encode([texts[i] for i in missing], batch_size=batch_size),
+                dtype=np.float32,
+            )
+            for i, vec in zip(missing, new_vecs):
+                cached[i] = vec
+            try:
+                self.embeddings.put_many([keys[i] for i in missing], new_vecs)
+            except Exception as e:
+                print(f"⚠️ Erreur d'écriture du cache d'embeddings : {e}")
+        return np.stack(cached)
+
     def classify_article_ml(self, text: str) -> str:
-        if not text:
-            text = ""
-        emb = self.model.encode([text])
-        pred_idx = self.classifieur.predict(emb)[0]
-        pred_cat = self.le.inverse_transform([pred_idx])[0]
-        return pred_cat
-
-    def categorize_article(self, item) -> str:
-        """Classe un article complet via le modèle ML."""
-        text = (item.get("title", "") + " " + item.get("summary", "")).strip()
-        if self.use_ml:
+        return self.classify_texts_ml([text])[0]
+
+    def classify_texts_ml(self, texts, batch_size: int = 64) -> list:
+        """Classe une liste de textes : un encode + un predict par lot."""
+        if not texts:
+            return []
+        embs = self.encode_texts(texts, batch_size=batch_size)
+        pred_idx = self.classifieur.predict(embs)
+        return list(self.le.inverse_transform(pred_idx))
+
+    def _article_text(self, item) -> str:
+        return ((item.get("title") or "") + " " + (item.get("summary") or "")).strip()
+
+    def categorize_articles(self, items, batch_size: int = 64, with_embeddings: bool = False):
+        """
+        Classe plusieurs articles en lot via le modèle ML.
+        Retourne la liste des catégories dans l'ordre des articles ; avec
+        with_embeddings=True, retourne (catégories, matrice d'embeddings ou None).
+        """
+        default = ["Autres sujets IA"] * len(items)
+        categories, embs = default, None
+        if items and self.use_ml:
+            texts = [self._article_text(item) for item in items]
             try:
-                return self.classify_article_ml(text)
+                embs = self.encode_texts(texts, batch_size=batch_size)
+                pred_idx = self.classifieur.predict(embs)
+                categories = list(self.le.inverse_transform(pred_idx))
             except Exception as e:
-                print(f"⚠️ Erreur classification ML : {e}")
-        return "Autres sujets IA"
+                print(f"⚠️ Erreur classification ML par lot : {e}")
+                categories, embs = default, None
+        if with_embeddings:
+            return categories, embs
+        return categories
 
     def categorize_keyword(self, kw: str) -> str:
         """Catégorise un mot-clé via le modèle ML."""
@@ -66,32 +276,83 @@ class Analyste:
                 print(f"⚠️ Erreur classification ML pour keyword : {e}")
         return "Autres sujets IA"
 
+    # --------- recherche sémantique ---------
+
+    def semantic_search(self, query: str, top_k: int = 10, chunk_size: int = 5000):
+        """
+        Retourne les top_k articles les plus proches de la requête (similarité
+        cosinus), en parcourant les embeddings stockés par paquets vectorisés.
+        Chaque article retourné porte un champ "score".
+        """
+        if not self.use_ml or not (query or "").strip():
+            return []
+
+        q = self.encode_texts([query.strip()])[0]
+        q = q / (np.linalg.norm(q) or 1.0)
+
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for rows in iter_article_embeddings(self.model_id, chunk_size=chunk_size):
+            dim = rows[0][1]
+            ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+            mat = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.float32).reshape(-1, dim)
+            norms = np.linalg.norm(mat, axis=1)
+            norms[norms == 0] = 1.0
+            scores = (mat @ q) / norms
+
+            # on ne garde que le top_k courant (fusion avec le paquet)
+            ids = np.concatenate([best_ids, ids])
+            scores = np.concatenate([best_scores, scores])
+            if len(scores) > top_k:
+                keep = np.argpartition(-scores, top_k)[:top_k]
+                ids, scores = ids[keep], scores[keep]
+            best_ids, best_scores = ids, scores
+
+        order = np.argsort(-best_scores)
+        score_by_id = {int(best_ids[i]): float(best_scores[i]) for i in order}
+        articles = get_articles_by_ids(list(score_by_id))
+        for art in articles:
+            art["score"] = round(score_by_id[art["id"]], 4)
+        return articles
+
     # --------- utils ---------
 
     def extract_keywords(self, corpus, top_n=15, extra_stopwords=None):
         """
         Extraction de mots-clés lisibles via TF‑IDF, avec filtrage.
         """
-        custom_sw = {
-            "ai", "llm", "large", "language", "model", "models", "based",
-            "using", "use", "dataset", "data", "paper", "study", "result",
-            "results", "method", "methods", "approach", "task", "tasks",
-            "abstract", "announced", "announce", "arxiv", "cross"
-        }
+        custom_sw = set(CUSTOM_STOPWORDS)
         if extra_stopwords:
             custom_sw.update(extra_stopwords)
 
         # sklearn veut 'english', une liste ou None -> on convertit en liste
         stop_words = list(ENGLISH_STOP_WORDS.union(custom_sw))
 
+        corpus = [text for text in corpus if text and text.strip()]
+        if not corpus:
+            return []
         vectorizer = TfidfVectorizer(
             stop_words=stop_words,
             max_features=top_n,
-            token_pattern=r"(?u)\b[a-zA-Z][a-zA-Z\-]{2,}\b",
+            token_pattern=TOKEN_PATTERN,
         )
-        vectorizer.fit(corpus)
+        try:
+            vectorizer.fit(corpus)
+        except ValueError:
+            # vocabulaire vide : textes sans aucun terme retenu
+            return []
         return vectorizer.get_feature_names_out().tolist()
 
+    def keywords_from_stats(self, top_n=15, extra_stopwords=None):
+        """
+        Même résultat qu'extract_keywords sur tout le corpus (les top_n termes
+        les plus fréquents, triés alphabétiquement) mais lu depuis les
+        statistiques maintenues en BDD : pas de refit TF-IDF.
+        """
+        extra = set(extra_stopwords or ())
+        terms = [t for t in get_top_terms(top_n + len(extra)) if t not in extra]
+        return sorted(terms[:top_n])
+
     def load_data(self):
         """
         Méthode de compatibilité : si le fichier n'existe pas, on renvoie une liste vide.
@@ -111,23 +372,10 @@ class Analyste:
     # --------- analyse globale ---------
 
     def analyze(self, data=None):
-            # Si aucun data n'est fourni, on tente de charger depuis un fichier (optionnel).
+        """Analyse d'une liste d'articles (comptes par catégorie / source, mots-clés TF-IDF)."""
+        # Si aucun data n'est fourni, on tente de charger depuis un fichier (optionnel).
         if data is None:
             data = self.load_data()
-            
-        if not data:
-            return {
-                "total_documents": 0,
-                "by_source": {},
-                "by_category": {},
-                "emerging_keywords": [],
-                "emerging_by_category": {},
-                "trends": {
-                    "top_categories": [],
-                    "top_keywords": [],
-                },
-               
-            }
 
         # On utilise la catégorie déjà en BDD
         by_category = {}
@@ -142,10 +390,34 @@ class Analyste:
             by_category[cat] = by_category.get(cat, 0) + 1
             by_source[src] = by_source.get(src, 0) + 1
 
-        corpus = self.prepare_corpus(data)
+        emerging_keywords = []
+        if data:
+            corpus = self.prepare_corpus(data)
+            emerging_keywords = self.extract_keywords(corpus, top_n=30)
+        return self._summarize(len(data), by_source, by_category, emerging_keywords)
 
-        # Mots-clés globaux
-        emerging_keywords = self.extract_keywords(corpus, top_n=30)
+    def analyze_corpus(self, by_source, by_category):
+        """
+        Analyse du corpus complet sans lire les articles : comptes issus de
+        article_rollup, mots-clés lus depuis les statistiques de termes.
+        """
+        total = sum(by_source.values())
+        emerging_keywords = self.keywords_from_stats(top_n=30) if total else []
+        return self._summarize(total, by_source, by_category, emerging_keywords)
+
+    def _summarize(self, total, by_source, by_category, emerging_keywords):
+        if not total:
+            return {
+                "total_documents": 0,
+                "by_source": {},
+                "by_category": {},
+                "emerging_keywords": [],
+                "emerging_by_category": {},
+                "trends": {
+                    "top_categories": [],
+                    "top_keywords": [],
+                },
+            }
 
         # Mots-clés classés par catégorie (si modèle dispo)
         emerging_by_category = {}
@@ -158,21 +430,102 @@ class Analyste:
             by_category.items(), key=lambda x: x[1], reverse=True
         )[:17]
         top_categories = [c for c, _ in top_cat_items]
-        top_keywords = emerging_keywords
 
         trends = {
             "top_categories": top_categories,
-            "top_keywords": top_keywords,
+            "top_keywords": emerging_keywords,
         }
 
         return {
-            "total_documents": len(data),
+            "total_documents": total,
             "by_source": by_source,
             "by_category": by_category,
             "emerging_keywords": emerging_keywords,
             "emerging_by_category": emerging_by_category,
             "trends": trends,
-          
         }
-    
 
+
+# ---------- SNAPSHOT D'ANALYSE ----------
+# Format du payload stocké : à incrémenter si la structure d'analyze change
+ANALYSIS_SNAPSHOT_VERSION = 1
+# Au-delà, le snapshot est recalculé même si les articles n'ont pas bougé
+# (fenêtres glissantes en jours)
+ANALYSIS_SNAPSHOT_MAX_AGE = timedelta(hours=24)
+
+
+def compute_analysis(analyste=None, days=None):
+    """
+    Analyse des articles non rejetés. Sans fenêtre et avec les statistiques
+    de termes, aucun article n'est lu : comptes depuis article_rollup et
+    mots-clés depuis term_stats. Avec une fenêtre, projection légère des
+    articles de la fenêtre.
+    """
+    if analyste is None:
+        # modèle utilisé seulement s'il est déjà en mémoire (pas de chargement ici)
+        analyste = Analyste(load_model=model_registry.is_loaded)
+    if not days and term_stats_ready():
+        breakdown = get_rollup_breakdown()
+        if breakdown is not None:
+            return analyste.analyze_corpus(*breakdown)
+    return analyste.analyze(data=get_articles_for_analysis(days=days))
+
+
+def refresh_analysis_snapshot(analyste=None, days=None):
+    """
+    Recalcule l'analyse et la persiste comme snapshot de la fenêtre, marqué
+    with_model=False s'il a été calculé sans le modèle ML (mots-clés non
+    classés par catégorie) : il sera remplacé par le prochain calcul avec
+    le modèle (fin de veille, tâche "analysis", processus où il est chargé).
+    """
+    if analyste is None:
+        # modèle utilisé seulement s'il est déjà en mémoire (pas de chargement ici)
+        analyste = Analyste(load_model=model_registry.is_loaded)
+    fingerprint = get_analysis_fingerprint()
+    analysis = compute_analysis(analyste, days)
+    save_analysis_snapshot(
+        days or 0,
+        ANALYSIS_SNAPSHOT_VERSION,
+        fingerprint,
+        json.dumps(analysis, ensure_ascii=False),
+        with_model=analyste.use_ml,
+    )
+    return analysis
+
+
+def get_analysis(days=None, max_age=ANALYSIS_SNAPSHOT_MAX_AGE, queue_refresh=False):
+    """
+    Analyse lue depuis le snapshot produit en fin de veille. Recalculée
+    seulement s'il manque, a un autre format, est trop vieux, si les
+    articles ont changé depuis (rejet, nouvelle catégorie...) ou s'il a été
+    calculé sans le modèle ML alors que ce processus l'a en mémoire.
+    Un snapshot avec modèle n'est jamais recalculé par un processus sans
+    modèle (mots-clés non classés) : il est servi tel quel et, avec
+    queue_refresh, une tâche "analysis" est mise en file pour les workers.
+    """
+    snapshot = get_analysis_snapshot(days or 0)
+    if snapshot and snapshot["version"] == ANALYSIS_SNAPSHOT_VERSION:
+        with_model = bool(snapshot.get("with_model", 1))
+        fingerprint = get_analysis_fingerprint()
+        fresh = (datetime.utcnow() - snapshot["created_at"] < max_age
+                 and fingerprint is not None and snapshot["fingerprint"] == fingerprint)
+        if not with_model and model_registry.is_loaded:
+            fresh = False
+        elif with_model and not model_registry.is_loaded and not fresh:
+            if queue_refresh:
+                _queue_analysis_refresh(days)
+            fresh = True
+        if fresh:
+            try:
+                return json.loads(snapshot["payload"])
+            except ValueError as e:
+                print(f"⚠️ Snapshot d'analyse illisible : {e}")
+    return refresh_analysis_snapshot(days=days)
+
+
+def _queue_analysis_refresh(days):
+    """Recalcul du snapshot par un worker (avec le modèle) ; une seule tâche en attente."""
+    try:
+        enqueue_task("analysis", {"days": days}, pending_key="analysis")
+    except Exception as e:
+        print(f"⚠️ Impossible de planifier le recalcul de l'analyse : {e}")
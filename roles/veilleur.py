@@ -1,13 +1,36 @@
 import os
 import re
 import time
+import hashlib
 import feedparser
 from html import unescape
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from scholarly import scholarly
 
-from db_mysql import init_db, save_articles, get_articles_without_category, update_article_category_and_classe
-from roles.analyste import Analyste
+from db_mysql import (
+    init_db,
+    article_hash,
+    save_articles,
+    get_existing_hashes,
+    get_articles_for_backfill,
+    bulk_update_categories,
+    get_backfill_checkpoint,
+    clear_backfill_checkpoint,
+    get_feed_cache,
+    save_feed_cache,
+    get_article_ids_by_hash,
+    save_article_embeddings,
+    get_articles_without_embedding,
+    term_stats_ready,
+)
+from roles.analyste import (
+    Analyste,
+    article_term_counts,
+    rebuild_term_stats,
+    refresh_analysis_snapshot,
+)
+from ann_index import update_related_index
 
 # ---------- MAPPING CATEGORIE (22) → CLASSE (7) ----------
 BIG_CLASSES = [
@@ -73,9 +96,17 @@ class Veilleur:
             "mlops_community": "https://mlops.community/feed/"
         }
 
+    # nombre de flux téléchargés en parallèle par défaut
+    MAX_WORKERS = 8
+
+    # taille des lots d'encodage pour la classification ML
+    BATCH_SIZE = 64
+
     def __init__(self, sources=None, scholar_query=None,
                 custom_sources=None, date_from=None, date_to=None,
-                data_path=None, keywords=None, frequency=None):
+                data_path=None, keywords=None, frequency=None,
+                max_workers=None, use_feed_cache=True,
+                analysis_window_days=None, progress=None):
 
         self.rss_sources = dict(self.RSS_SOURCES)
         self.active_sources = []
@@ -106,6 +137,18 @@ class Veilleur:
         self.date_to = date_to
         self.data_path = data_path
         self.frequency = frequency
+        # 1 = collecte séquentielle, >1 = collecte concurrente des flux
+        self.max_workers = self.MAX_WORKERS if max_workers is None else max(1, int(max_workers))
+        # fenêtre (en jours) du snapshot d'analyse produit en fin de run
+        self.analysis_window_days = analysis_window_days
+        # callback progress(event, data) : suivi du run (ex. flux SSE d'un job)
+        self.progress = progress
+
+        # --- cache HTTP conditionnel (ETag / Last-Modified) ---
+        self.use_feed_cache = use_feed_cache
+        # validateurs + watermark (dernière date publiée vue) par source
+        self._feed_cache = {}      # lus en BDD au début de la collecte
+        self._feed_updates = {}    # reçus, persistés après l'enregistrement
 
         # --- normaliser dates ---
         def _to_datetime(v):
@@ -139,6 +182,19 @@ class Veilleur:
         text = text.lower()
         return any(k in text for k in self.keywords)
 
+    def _filter_key(self) -> str:
+        """
+        Empreinte des filtres de collecte (mots-clés + dates).
+        Un 304 n'est exploitable que si les filtres sont identiques à ceux
+        du run qui a enregistré les validateurs.
+        """
+        raw = "|".join([
+            ",".join(sorted(self.keywords)),
+            str(self.date_from or ""),
+            str(self.date_to or ""),
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
     def _compute_classe(self, categorie: str) -> str:
         """
         Détermine la 'classe' (7 grandes catégories) à partir de la catégorie fine (22).
@@ -163,6 +219,15 @@ class Veilleur:
                     return None
         return None
 
+    @staticmethod
+    def _naive_datetime(value):
+        """Ramène une date (éventuellement avec fuseau) à un datetime naïf local."""
+        if not isinstance(value, datetime):
+            return None
+        if value.tzinfo is not None:
+            return value.astimezone().replace(tzinfo=None)
+        return value
+
     def _clean_text(self, text: str) -> str:
         """Nettoie HTML + bouts WordPress (Read more, The post...)."""
         t = str(text or "").strip()
@@ -242,36 +307,108 @@ class Veilleur:
     
     # ------------------ RSS ------------------
 
-    def collect_rss(self):
-        all_articles = []
-        for source in self.active_sources:
-            if source not in self.rss_sources:
-                continue
-            feed = feedparser.parse(self.rss_sources[source])
-            for entry in feed.entries:
-                title = entry.title
-                summary = getattr(entry, "summary", "")
-                full_text = f"{title} {summary}"
-                
-                # KHELI
+    def _fetch_source(self, source):
+        """Télécharge et filtre les entrées d'un seul flux RSS."""
+        articles = []
+        url = self.rss_sources[source]
+        started = time.perf_counter()
+        self._emit("fetch_started", source=source)
+        filter_key = self._filter_key()
+
+        # validateurs + watermark du run précédent, seulement si même URL et mêmes filtres
+        cached = self._feed_cache.get(source) or {}
+        etag = modified = watermark = None
+        if cached.get("url") == url and cached.get("filter_key") == filter_key:
+            etag = cached.get("etag")
+            modified = cached.get("modified")
+            watermark = cached.get("last_published")
 
-                if not self._match_keywords(full_text):
+        try:
+            feed = feedparser.parse(url, etag=etag, modified=modified)
+        except Exception as e:
+            print(f"⚠️ Erreur flux RSS {source} : {e}")
+            self._emit("fetch_finished", source=source, status="error", error=str(e),
+                       entries=0, kept=0, latency_ms=self._elapsed_ms(started))
+            return articles
+
+        # 304 Not Modified : rien de nouveau, on ne parse rien
+        if feed.get("status") == 304:
+            self._emit("fetch_finished", source=source, status="not_modified",
+                       entries=0, kept=0, latency_ms=self._elapsed_ms(started))
+            return articles
+
+        latest = watermark
+        skipped = 0
+        for entry in feed.entries:
+            # la date est lue en premier : les entrées déjà vues (plus anciennes
+            # que le watermark) sont écartées avant tout nettoyage / classification
+            published = self._format_rss_date(entry)
+            published_cmp = self._naive_datetime(published)
+            if published_cmp is not None:
+                if watermark is not None and published_cmp < watermark:
+                    skipped += 1
                     continue
+                if latest is None or published_cmp > latest:
+                    latest = published_cmp
 
-                published = self._format_rss_date(entry)
-                if not self._date_in_range(published):
-                    continue
+            title = entry.title
+            summary = getattr(entry, "summary", "")
+            full_text = f"{title} {summary}"
 
-                all_articles.append({
-                    "title": title,
-                    "summary": self._clean_text(summary),
-                    "summary_short": self._short_summary(summary),
-                    "published": published,
-                    "source": source,
-                    "link": getattr(entry, "link", ""),
-                    "validated": False,
-                    "collected_at": datetime.now().strftime("%Y-%m-%d %H:%M")
-                })
+            if not self._match_keywords(full_text):
+                continue
+
+            if not self._date_in_range(published):
+                continue
+
+            articles.append({
+                "title": title,
+                "summary": self._clean_text(summary),
+                "summary_short": self._short_summary(summary),
+                "published": published,
+                "source": source,
+                "link": getattr(entry, "link", ""),
+                "validated": False,
+                "collected_at": datetime.now().strftime("%Y-%m-%d %H:%M")
+            })
+
+        if skipped:
+            print(f"ℹ️ {source} : {skipped} entrées déjà traitées ignorées")
+
+        if self.use_feed_cache:
+            self._feed_updates[source] = {
+                "url": url,
+                "etag": feed.get("etag"),
+                "modified": feed.get("modified"),
+                "filter_key": filter_key,
+                "last_published": latest,
+            }
+        self._emit("fetch_finished", source=source, status="ok",
+                   entries=len(feed.entries), kept=len(articles), skipped=skipped,
+                   latency_ms=self._elapsed_ms(started))
+        return articles
+
+    def collect_rss(self):
+        sources = [s for s in dict.fromkeys(self.active_sources) if s in self.rss_sources]
+        if not sources:
+            return []
+
+        self._feed_updates = {}
+        self._feed_cache = get_feed_cache() if self.use_feed_cache else {}
+
+        # Les flux sont indépendants (I/O réseau) : on les télécharge en parallèle,
+        # la durée totale est alors proche de celle du flux le plus lent.
+        if self.max_workers > 1 and len(sources) > 1:
+            workers = min(self.max_workers, len(sources))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(self._fetch_source, sources))
+        else:
+            results = [self._fetch_source(source) for source in sources]
+
+        # fusion dans l'ordre des sources actives
+        all_articles = []
+        for articles in results:
+            all_articles.extend(articles)
         return all_articles
 
     # ------------------ Google Scholar ------------------
@@ -309,40 +446,264 @@ class Veilleur:
 
     # ------------------ RUN ------------------
     def run(self):
+        """Exécute la veille complète. Retourne {"inserted": n, "skipped": n}."""
         print("🔍 Démarrage de la veille technologique...")
+        self._emit("run_started", sources=list(dict.fromkeys(self.active_sources)),
+                   scholar=bool(self.scholar_query))
         items = []
 
+        started = time.perf_counter()
         items.extend(self.collect_rss() or [])
         items.extend(self.collect_scholar() or [])
+        self._emit("stage", stage="collect", count=len(items),
+                   duration_ms=self._elapsed_ms(started))
 
+        started = time.perf_counter()
+        collected = len(items)
         items = self.clean_data(items)
+        cleaned = len(items)
+        items = self._drop_known_items(items)
+        self._emit("stage", stage="clean", count=len(items), input=collected,
+                   duplicates=cleaned - len(items), duration_ms=self._elapsed_ms(started))
 
         # ⚠️ ici on a besoin du modèle -> load_model=True (par défaut)
         analyste = Analyste(load_model=True)
 
         # 1) Compléter les catégories/classe manquantes pour les articles déjà en BDD
         try:
-            uncategorized = get_articles_without_category()
-            print(f"➡️ {len(uncategorized)} articles sans categorie trouvés en BDD")
-            for art in uncategorized:
-                cat = analyste.categorize_article(art)
-                classe = self._compute_classe(cat)
-                update_article_category_and_classe(art["id"], cat, classe)
+            self.backfill_categories(analyste, only_missing=True)
         except Exception as e:
             print(f"⚠️ Erreur lors du remplissage des catégories existantes : {e}")
 
         # 2) Classer les nouveaux articles collectés + leur classe
-        for it in items:
-            cat = analyste.categorize_article(it)
+        started = time.perf_counter()
+        categories, embs = analyste.categorize_articles(
+            items, batch_size=self.BATCH_SIZE, with_embeddings=True)
+        for it, cat in zip(items, categories):
             it["categorie"] = cat
             it["classe"] = self._compute_classe(cat)
+        self._emit("stage", stage="classify", count=len(items),
+                   duration_ms=self._elapsed_ms(started))
 
         if not items:
             print("⚠️ Aucun article collecté")
+            self._save_feed_cache()
+            self._update_term_stats()
+            self._backfill_embeddings(analyste)
+            self._refresh_analysis(analyste)
+            self._emit("run_finished", inserted=0, skipped=0)
+            return {"inserted": 0, "skipped": 0}
+
+        started = time.perf_counter()
+        saved = save_articles(items, term_counter=article_term_counts)
+        print(f"➡️ {saved['inserted']} articles insérés, {saved['skipped']} ignorés (doublons)")
+        self._emit("stage", stage="save", inserted=saved["inserted"], skipped=saved["skipped"],
+                   duration_ms=self._elapsed_ms(started))
+        self._update_term_stats()
+        # validateurs / watermarks persistés seulement une fois les articles enregistrés,
+        # sinon un run interrompu masquerait ces articles au run suivant
+        self._save_feed_cache()
+
+        # 3) Embeddings des nouveaux articles (ids connus après insertion)
+        ids_by_hash = get_article_ids_by_hash(it["hash"] for it in items)
+        self._save_embeddings(analyste, [ids_by_hash.get(it["hash"]) for it in items], embs)
+        self._backfill_embeddings(analyste)
+        self._refresh_analysis(analyste)
+        print(f"✅ {saved['inserted']} articles collectés, classés et enregistrés")
+        self._emit("run_finished", inserted=saved["inserted"], skipped=saved["skipped"])
+        return {"inserted": saved["inserted"], "skipped": saved["skipped"]}
+
+    # ------------------ Étapes séparées (file de travail) ------------------
+    def fetch_and_store(self):
+        """
+        Tâche "fetch" d'un worker : collecte, nettoyage, dédoublonnage puis
+        enregistrement sans classification (catégorie NULL) ; une tâche
+        "classify" s'en charge ensuite. Retourne les ids des articles insérés.
+        """
+        items = []
+        items.extend(self.collect_rss() or [])
+        items.extend(self.collect_scholar() or [])
+        items = self.clean_data(items)
+        items = self._drop_known_items(items)
+        if not items:
+            self._save_feed_cache()
+            return []
+
+        saved = save_articles(items, term_counter=article_term_counts)
+        print(f"➡️ {saved['inserted']} articles insérés, {saved['skipped']} ignorés (doublons)")
+        self._update_term_stats()
+        self._save_feed_cache()
+
+        inserted = saved["inserted_articles"]
+        ids_by_hash = get_article_ids_by_hash(it["hash"] for it in inserted)
+        return [ids_by_hash[it["hash"]] for it in inserted if it["hash"] in ids_by_hash]
+
+    def classify_stored(self, article_ids, analyste=None):
+        """
+        Tâche "classify" d'un worker : classe ceux des articles donnés qui n'ont
+        pas encore de catégorie (rejouable sans effet de bord), puis enregistre
+        catégories, classes et embeddings. Retourne le nombre d'articles classés.
+        """
+        analyste = analyste or Analyste(load_model=True)
+        batch = get_articles_for_backfill(0, limit=len(article_ids), only_missing=True, ids=article_ids)
+        if not batch:
+            return 0
+        categories, embs = analyste.categorize_articles(
+            batch, batch_size=self.BATCH_SIZE, with_embeddings=True)
+        if analyste.use_ml and embs is None:
+            # erreur ML : l'exception fait échouer la tâche, qui sera retentée
+            raise RuntimeError("Erreur de classification ML")
+
+        rows = [
+            (art["id"], cat, self._compute_classe(cat))
+            for art, cat in zip(batch, categories)
+        ]
+        bulk_update_categories(rows)
+        self._save_embeddings(analyste, [art["id"] for art in batch], embs)
+        return len(rows)
+
+    def _emit(self, event, **data):
+        """Transmet un évènement de progression au callback, s'il y en a un."""
+        if self.progress is None:
             return
+        try:
+            self.progress(event, data)
+        except Exception as e:
+            print(f"⚠️ Erreur lors du suivi de progression ({event}) : {e}")
+
+    @staticmethod
+    def _elapsed_ms(started):
+        return int((time.perf_counter() - started) * 1000)
+
+    def _refresh_analysis(self, analyste):
+        """
+        Produit le snapshot d'analyse lu par les tableaux de bord, avec le
+        modèle déjà chargé (catégorisation ML des mots-clés).
+        """
+        try:
+            refresh_analysis_snapshot(analyste, days=self.analysis_window_days)
+        except Exception as e:
+            print(f"⚠️ Erreur lors du calcul du snapshot d'analyse : {e}")
+
+    def backfill_categories(self, analyste=None, only_missing=True, chunk_size=1000):
+        """
+        (Re)classe les articles déjà en BDD par paquets : classification en lot,
+        UPDATE groupés et point de reprise dans une même transaction par paquet.
+        Un backfill interrompu reprend après le dernier paquet validé.
+        only_missing=False : reclassification complète (ex. après un changement
+        de modèle), le point de reprise est alors propre au modèle.
+        Les erreurs BDD sont propagées : le point de reprise n'est effacé
+        qu'après un dernier paquet vide lu avec succès.
+        """
+        analyste = analyste or Analyste(load_model=True)
+        if not only_missing and not analyste.use_ml:
+            print("⚠️ Reclassification impossible : modèle ML indisponible")
+            return 0
+
+        checkpoint = "categories" if only_missing else f"reclassify:{analyste.model_id}"
+        last_id = get_backfill_checkpoint(checkpoint)
+        total = 0
+        while True:
+            batch = get_articles_for_backfill(last_id, limit=chunk_size, only_missing=only_missing)
+            if not batch:
+                break
+            categories, embs = analyste.categorize_articles(
+                batch, batch_size=self.BATCH_SIZE, with_embeddings=True)
+            if analyste.use_ml and embs is None:
+                # erreur ML : on s'arrête, la reprise se fera au prochain run
+                print("⚠️ Backfill des catégories interrompu (erreur de classification)")
+                return total
+
+            rows = [
+                (art["id"], cat, self._compute_classe(cat))
+                for art, cat in zip(batch, categories)
+            ]
+            bulk_update_categories(rows, checkpoint=checkpoint)
+            self._save_embeddings(analyste, [art["id"] for art in batch], embs)
+            total += len(rows)
+            last_id = batch[-1]["id"]
+
+        clear_backfill_checkpoint(checkpoint)
+        if total:
+            print(f"➡️ {total} articles (re)classés en BDD")
+        return total
+
+    def _update_term_stats(self):
+        """
+        Statistiques de mots-clés construites au premier run (ensuite tenues
+        à jour par save_articles, dans la transaction d'insertion).
+        """
+        try:
+            if not term_stats_ready():
+                rebuild_term_stats()
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la mise à jour des statistiques de termes : {e}")
+
+    def _save_embeddings(self, analyste, article_ids, embs):
+        """Persiste les embeddings calculés pendant la classification."""
+        if embs is None or not analyste.model_id:
+            return
+        rows = [
+            (article_id, vec.astype("float32").tobytes(), int(vec.shape[0]))
+            for article_id, vec in zip(article_ids, embs)
+            if article_id is not None
+        ]
+        save_article_embeddings(rows, analyste.model_id)
+
+        # mise à jour incrémentale de l'index "articles similaires"
+        try:
+            kept = [i for i, article_id in enumerate(article_ids) if article_id is not None]
+            if kept:
+                update_related_index(
+                    analyste.model_id,
+                    [article_ids[i] for i in kept],
+                    embs[kept],
+                )
+        except Exception as e:
+            print(f"⚠️ Erreur de mise à jour de l'index des articles similaires : {e}")
+
+    def _backfill_embeddings(self, analyste, limit=2000):
+        """Rattrapage progressif des embeddings des articles déjà en BDD."""
+        if not analyste.use_ml or not analyste.model_id:
+            return
+        try:
+            missing = get_articles_without_embedding(analyste.model_id, limit=limit)
+            if not missing:
+                return
+            embs = analyste.encode_texts(
+                [analyste._article_text(art) for art in missing], batch_size=self.BATCH_SIZE)
+            self._save_embeddings(analyste, [art["id"] for art in missing], embs)
+            print(f"➡️ {len(missing)} embeddings d'articles complétés")
+        except Exception as e:
+            print(f"⚠️ Erreur lors du rattrapage des embeddings : {e}")
+
+    def _drop_known_items(self, items):
+        """
+        Calcule le hash de chaque article et écarte, en une requête groupée,
+        ceux déjà présents en BDD (et les doublons internes au run) afin
+        de ne classer que les articles réellement nouveaux.
+        """
+        if not items:
+            return items
+        for it in items:
+            it["hash"] = article_hash(it["title"], it["source"], it["published"])
+
+        existing = get_existing_hashes(it["hash"] for it in items)
+        new_items = []
+        seen = set(existing)
+        for it in items:
+            if it["hash"] in seen:
+                continue
+            seen.add(it["hash"])
+            new_items.append(it)
+
+        if len(new_items) < len(items):
+            print(f"ℹ️ {len(items) - len(new_items)} articles déjà en BDD ignorés")
+        return new_items
 
-        save_articles(items)
-        print(f"✅ {len(items)} articles collectés, classés et enregistrés")
+    def _save_feed_cache(self):
+        if self.use_feed_cache and self._feed_updates:
+            save_feed_cache(self._feed_updates)
 
 
 
@@ -9,12 +9,145 @@ CREATE TABLE articles (
     title VARCHAR(512) NOT NULL,
     source VARCHAR(100) NOT NULL,
     published VARCHAR(20),
+    summary TEXT,
+    summary_short VARCHAR(512),
+    categorie VARCHAR(100),
+    classe VARCHAR(100),
+    mots_cles TEXT,
     link TEXT,
     collected_at DATETIME,
     hash CHAR(64) UNIQUE,
-    verifie TINYINT(1) DEFAULT 0,
-     categorie VARCHAR(100),     
-     mots_cles TEXT               
+    verifie INT DEFAULT 0
+);
+
+-- Index secondaires (chemins d'accès filtrés sur verifie)
+CREATE INDEX idx_articles_verifie_collected ON articles (verifie, collected_at);
+CREATE INDEX idx_articles_verifie_categorie ON articles (verifie, categorie);
+CREATE INDEX idx_articles_verifie_classe ON articles (verifie, classe, collected_at);
+CREATE INDEX idx_articles_verifie_source ON articles (verifie, source);
+CREATE INDEX idx_articles_verifie_source_collected ON articles (verifie, source, collected_at);
+CREATE INDEX idx_articles_verifie_categorie_collected ON articles (verifie, categorie, collected_at);
+
+CREATE TABLE feed_cache (
+    source VARCHAR(100) PRIMARY KEY,
+    url TEXT,
+    etag VARCHAR(255),
+    modified VARCHAR(64),
+    filter_key CHAR(64),
+    last_published DATETIME,
+    updated_at DATETIME
+);
+
+-- Embeddings des articles (vecteurs float32 sérialisés)
+CREATE TABLE article_embeddings (
+    article_id INT PRIMARY KEY,
+    model_id VARCHAR(128) NOT NULL,
+    dim INT NOT NULL,
+    vector BLOB NOT NULL,
+    INDEX idx_embeddings_model (model_id)
+);
+
+-- Statistiques de termes (occurrences) maintenues incrémentalement
+CREATE TABLE term_stats (
+    term VARCHAR(64) PRIMARY KEY,
+    tf INT NOT NULL DEFAULT 0,
+    INDEX idx_term_stats_tf (tf)
+);
+
+CREATE TABLE term_stats_meta (
+    id TINYINT PRIMARY KEY,
+    n_docs INT NOT NULL DEFAULT 0,
+    built_at DATETIME
+);
+
+-- Points de reprise des traitements par lots (backfill des catégories)
+CREATE TABLE backfill_state (
+    name VARCHAR(150) PRIMARY KEY,
+    last_id INT NOT NULL DEFAULT 0,
+    updated_at DATETIME
+);
+
+-- Agrégats des articles non rejetés (KPIs du tableau de bord décideur)
+CREATE TABLE article_rollup (
+    source VARCHAR(100) NOT NULL,
+    categorie VARCHAR(100) NOT NULL,
+    classe VARCHAR(100) NOT NULL,
+    mois CHAR(7) NOT NULL,
+    cnt INT NOT NULL DEFAULT 0,
+    last_collected DATETIME,
+    PRIMARY KEY (source, categorie, classe, mois)
+);
+
+-- Snapshot de l'analyse produit en fin de veille (0 = toutes les dates)
+CREATE TABLE analysis_snapshot (
+    window_days INT PRIMARY KEY,
+    version INT NOT NULL,
+    fingerprint VARCHAR(64),
+    payload LONGTEXT NOT NULL,
+    created_at DATETIME NOT NULL,
+    with_model TINYINT(1) NOT NULL DEFAULT 1
+);
+
+-- Version des données (incrémentée à chaque écriture, invalide le cache des pages)
+CREATE TABLE data_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO data_version (id, version) VALUES (1, 0);
+
+-- Jobs de veille lancés en arrière-plan (active_key non NULL tant que le job est actif)
+CREATE TABLE veille_jobs (
+    id CHAR(32) PRIMARY KEY,
+    config_key CHAR(64) NOT NULL,
+    active_key CHAR(64) NULL,
+    status VARCHAR(20) NOT NULL,
+    params LONGTEXT,
+    message TEXT,
+    result LONGTEXT,
+    created_by INT NULL,
+    created_at DATETIME NOT NULL,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    UNIQUE KEY uq_veille_jobs_active (active_key)
+);
+
+-- Progression des jobs de veille (flux SSE)
+CREATE TABLE veille_job_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    job_id CHAR(32) NOT NULL,
+    event VARCHAR(50) NOT NULL,
+    data TEXT,
+    created_at DATETIME NOT NULL,
+    INDEX idx_veille_job_events_job (job_id, id),
+    INDEX idx_veille_job_events_created (created_at)
+);
+
+-- Dernière exécution des tâches planifiées
+CREATE TABLE scheduler_state (
+    name VARCHAR(100) PRIMARY KEY,
+    last_run_at DATETIME,
+    updated_at DATETIME
+);
+
+-- File de travail des workers (python worker.py)
+CREATE TABLE work_queue (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(30) NOT NULL,
+    payload LONGTEXT,
+    status VARCHAR(20) NOT NULL,
+    priority INT NOT NULL DEFAULT 0,
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 3,
+    timeout_seconds INT NOT NULL DEFAULT 600,
+    available_at DATETIME NOT NULL,
+    pending_key VARCHAR(191) NULL,
+    locked_by VARCHAR(100) NULL,
+    last_error TEXT,
+    result TEXT,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    UNIQUE KEY uq_work_queue_pending (pending_key),
+    INDEX idx_work_queue_claim (status, available_at)
 );
 
 CREATE TABLE users (
@@ -37,3 +170,25 @@ CREATE TABLE syntheses (
     date DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Migrations déjà couvertes par ce script (cf. MIGRATIONS dans db_mysql.py) :
+-- init_db() n'applique ensuite que les suivantes
+CREATE TABLE schema_version (
+    version INT PRIMARY KEY,
+    description VARCHAR(255),
+    applied_at DATETIME
+);
+INSERT INTO schema_version (version, description, applied_at) VALUES
+    (1, 'schéma de base', NOW()),
+    (2, 'index secondaires sur articles', NOW()),
+    (3, 'index des listes paginées', NOW()),
+    (4, 'agrégats des KPIs décideur', NOW()),
+    (5, 'snapshot de l''analyse', NOW()),
+    (6, 'version des données', NOW()),
+    (7, 'jobs de veille en arrière-plan', NOW()),
+    (8, 'progression des jobs de veille', NOW()),
+    (9, 'état du planificateur', NOW()),
+    (10, 'file de travail des workers', NOW()),
+    (11, 'purge des évènements de jobs', NOW()),
+    (12, 'snapshot d''analyse sans modèle', NOW()),
+    (13, 'watermark des flux RSS', NOW()),
+    (14, 'term_stats sans df', NOW());
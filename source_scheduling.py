@@ -0,0 +1,93 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from db_mysql import get_scheduler_states
+
+# ---------- CONFIG ----------
+FREQUENCY_INTERVALS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "monthly": timedelta(weeks=4),
+}
+# préfixe des lignes scheduler_state par source
+SOURCE_STATE_PREFIX = "source:"
+# dernière veille globale (planification d'avant les échéances par source)
+GLOBAL_RUN_STATE = "veille_job"
+
+
+def custom_source_name(item):
+    """
+    Nom de planification d'un flux personnalisé : son nom, ou pour un flux
+    sans nom "Custom Source #<empreinte de l'URL>" (chaque flux a ainsi sa
+    propre échéance, et une clé courte pour scheduler_state / work_queue).
+    """
+    if isinstance(item, dict):
+        if item.get("name"):
+            return item["name"]
+        url = item.get("url", "")
+    else:
+        url = item
+    return f"Custom Source #{hashlib.sha1(str(url).encode('utf-8')).hexdigest()[:8]}"
+
+
+def source_schedules(cfg):
+    """
+    Planification de chaque source configurée : [(nom, intervalle, priorité)].
+    Par source : clés interval_hours / priority, dans cfg["source_settings"][nom]
+    ou directement dans l'entrée d'un flux personnalisé. Sans interval_hours,
+    la fréquence globale s'applique ; "once" sans intervalle = non planifiée.
+    Priorité : plus elle est haute, plus la source passe tôt (0 par défaut).
+    """
+    default = FREQUENCY_INTERVALS.get(cfg.get("frequency", "once"))
+    settings = cfg.get("source_settings", {})
+    schedules = []
+
+    def add(name, opts):
+        hours = opts.get("interval_hours")
+        try:
+            interval = timedelta(hours=float(hours)) if hours else default
+            priority = int(opts.get("priority") or 0)
+        except (TypeError, ValueError, OverflowError):
+            print(f"⚠️ Planification ignorée pour {name} : interval_hours / priority invalides")
+            return
+        if interval is not None and interval <= timedelta(0):
+            print(f"⚠️ Planification ignorée pour {name} : interval_hours doit être positif")
+            return
+        if interval:
+            schedules.append((name, interval, priority))
+
+    for source in cfg.get("sources", []):
+        add(source, settings.get(source, {}))
+    for item in cfg.get("custom_sources", []):
+        name = custom_source_name(item)
+        opts = dict(settings.get(name, {}))
+        if isinstance(item, dict):
+            opts.update({k: item[k] for k in ("interval_hours", "priority") if k in item})
+        add(name, opts)
+    return schedules
+
+
+def due_sources(cfg, now=None):
+    """
+    Sources dont l'échéance est passée, par priorité décroissante, limitées à
+    max_sources_per_run (les moins prioritaires attendent le dispatch suivant).
+    """
+    now = now or datetime.now()
+    states = get_scheduler_states()
+    if states is None:
+        # état illisible : toutes les sources sembleraient dues
+        print("⚠️ Dispatch ignoré : état du planificateur illisible")
+        return []
+    # sources jamais lancées individuellement : dernière veille globale
+    fallback = states.get(GLOBAL_RUN_STATE)
+    due = []
+    for name, interval, priority in source_schedules(cfg):
+        last_run = states.get(SOURCE_STATE_PREFIX + name) or fallback
+        if last_run is None or last_run + interval <= now:
+            due.append((name, priority))
+    due.sort(key=lambda x: x[1], reverse=True)
+
+    limit = cfg.get("max_sources_per_run")
+    if limit:
+        due = due[:int(limit)]
+    return [name for name, _ in due]
@@ -0,0 +1,31 @@
+// Articles similaires : affiche / masque la liste des voisins d'un article
+async function toggleRelated(articleId, btn) {
+    const card = btn.closest('.article-card');
+    let box = card.querySelector('.related-list');
+    if (box) { box.remove(); return; }
+
+    box = document.createElement('div');
+    box.className = 'related-list';
+    box.textContent = 'Chargement...';
+    card.appendChild(box);
+
+    try {
+        const res = await fetch(`/api/articles/${articleId}/related?k=5`);
+        const data = await res.json();
+        const items = data.results || [];
+        box.textContent = items.length ? '' : 'Aucun article similaire.';
+        items.forEach((a) => {
+            const link = document.createElement('a');
+            link.href = a.link || '#';
+            link.target = '_blank';
+            link.rel = 'noopener noreferrer';
+            link.textContent = `${a.title} (${a.source})`;
+            const row = document.createElement('div');
+            row.className = 'related-item';
+            row.appendChild(link);
+            box.appendChild(row);
+        });
+    } catch (e) {
+        box.textContent = 'Erreur lors du chargement.';
+    }
+}
@@ -0,0 +1,100 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+db_mysql = pytest.importorskip("db_mysql")
+
+from conftest import prefix_handler
+
+
+def _snapshot_handler(current):
+    """current : (fingerprint, with_model) du snapshot enregistré, ou None."""
+    return prefix_handler({
+        "SELECT fingerprint, with_model FROM analysis_snapshot": [current] if current else []})
+
+
+def test_first_snapshot_does_not_bump(fake_db):
+    fake_db.handler = _snapshot_handler(None)
+    assert db_mysql.save_analysis_snapshot(0, 1, "fp", "{}", with_model=False) is True
+    assert len(fake_db.statements("REPLACE INTO analysis_snapshot")) == 1
+    assert fake_db.statements("UPDATE data_version") == []
+
+
+def test_model_snapshot_replacing_no_model_bumps(fake_db):
+    fake_db.handler = _snapshot_handler(("fp", 0))
+    assert db_mysql.save_analysis_snapshot(0, 1, "fp", "{}", with_model=True) is True
+    assert len(fake_db.statements("UPDATE data_version")) == 1
+    assert fake_db.commits == 1
+
+
+def test_same_model_state_does_not_bump(fake_db):
+    fake_db.handler = _snapshot_handler(("old", 1))
+    assert db_mysql.save_analysis_snapshot(0, 1, "new", "{}", with_model=True) is True
+    assert fake_db.statements("UPDATE data_version") == []
+
+
+def test_no_model_never_overwrites_model_snapshot(fake_db):
+    fake_db.handler = _snapshot_handler(("fp", 1))
+    assert db_mysql.save_analysis_snapshot(0, 1, "fp", "{}", with_model=False) is False
+    assert fake_db.statements("REPLACE INTO analysis_snapshot") == []
+    assert fake_db.rollbacks == 1
+
+
+@pytest.fixture
+def analyste(monkeypatch):
+    pytest.importorskip("sklearn")
+    pytest.importorskip("sentence_transformers")
+    from roles import analyste
+
+    queued, refreshed = [], []
+    monkeypatch.setattr(analyste, "enqueue_task",
+                        lambda kind, payload, pending_key=None: queued.append((kind, payload)))
+    monkeypatch.setattr(analyste, "refresh_analysis_snapshot",
+                        lambda days=None: refreshed.append(days) or {"recomputed": True})
+    monkeypatch.setattr(analyste, "get_analysis_fingerprint", lambda: "fp-new")
+    monkeypatch.setattr(analyste, "queued", queued, raising=False)
+    monkeypatch.setattr(analyste, "refreshed", refreshed, raising=False)
+    return analyste
+
+
+def _stored(analyste, monkeypatch, with_model, fingerprint="fp-old", model_loaded=False):
+    snapshot = {
+        "version": analyste.ANALYSIS_SNAPSHOT_VERSION,
+        "fingerprint": fingerprint,
+        "payload": json.dumps({"emerging_keywords": ["gpu"]}),
+        "created_at": datetime.utcnow() - timedelta(minutes=5),
+        "with_model": with_model,
+    }
+    monkeypatch.setattr(analyste, "get_analysis_snapshot", lambda window_days=0: snapshot)
+    monkeypatch.setattr(analyste.model_registry, "_models", object() if model_loaded else None)
+
+
+def test_stale_model_snapshot_served_without_model(analyste, monkeypatch):
+    _stored(analyste, monkeypatch, with_model=1)
+    assert analyste.get_analysis(queue_refresh=True) == {"emerging_keywords": ["gpu"]}
+    assert analyste.refreshed == []
+    assert analyste.queued == [("analysis", {"days": None})]
+
+
+def test_stale_model_snapshot_without_queue(analyste, monkeypatch):
+    _stored(analyste, monkeypatch, with_model=1)
+    assert analyste.get_analysis() == {"emerging_keywords": ["gpu"]}
+    assert analyste.refreshed == [] and analyste.queued == []
+
+
+def test_stale_model_snapshot_recomputed_with_model(analyste, monkeypatch):
+    _stored(analyste, monkeypatch, with_model=1, model_loaded=True)
+    assert analyste.get_analysis(queue_refresh=True) == {"recomputed": True}
+    assert analyste.queued == []
+
+
+def test_no_model_snapshot_replaced_once_model_loaded(analyste, monkeypatch):
+    _stored(analyste, monkeypatch, with_model=0, fingerprint="fp-new", model_loaded=True)
+    assert analyste.get_analysis() == {"recomputed": True}
+
+
+def test_stale_no_model_snapshot_recomputed(analyste, monkeypatch):
+    _stored(analyste, monkeypatch, with_model=0)
+    assert analyste.get_analysis(queue_refresh=True) == {"recomputed": True}
+    assert analyste.queued == []
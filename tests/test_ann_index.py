@@ -0,0 +1,157 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+ann_index = pytest.importorskip("ann_index")
+
+from ann_index import IVFIndex, PersistentIVFIndex
+
+
+def _vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def _exact(vecs, ids, q, k):
+    norm = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+    scores = norm @ (q / np.linalg.norm(q))
+    return [int(ids[i]) for i in np.argsort(-scores)[:k]]
+
+
+def test_small_index_search_is_exact():
+    vecs = _vectors(50)
+    ids = np.arange(100, 150)
+    index = IVFIndex()
+    index.build(ids, vecs)
+
+    assert index.centroids is None
+    assert [i for i, _ in index.search(vecs[3], k=5)] == _exact(vecs, ids, vecs[3], 5)
+    assert 103 not in [i for i, _ in index.related(103, k=5)]
+
+
+def test_add_replace_remove():
+    vecs = _vectors(20)
+    index = IVFIndex()
+    index.build(range(20), vecs)
+    new = _vectors(2, seed=1)
+
+    index.add([5, 30], new)
+    assert len(index) == 21
+    assert np.allclose(index.get_vector(5), new[0] / np.linalg.norm(new[0]), atol=1e-2)
+    assert index.search(new[1], k=1)[0][0] == 30
+
+    index.remove([5, 30, 7])
+    assert len(index) == 18
+    assert index.get_vector(5) is None and index.get_vector(7) is None
+    found = [i for i, _ in index.search(vecs[7], k=20)]
+    assert not {5, 7, 30} & set(found)
+
+
+def test_compaction_keeps_content():
+    vecs = _vectors(3000)
+    index = IVFIndex()
+    index.build(range(3000), vecs)
+    assert index.nlist > 1
+    extra = _vectors(10, seed=2)
+    index.add(range(3000, 3010), extra)
+    index.remove([0, 3001])
+
+    before = index.search(vecs[10], k=10, nprobe=index.nlist)
+    index.compact()
+    assert len(index) == 3008
+    assert len(index._delta_ids) == 0 and not index._removed
+    assert index.search(vecs[10], k=10, nprobe=index.nlist) == pytest.approx(before)
+    assert index.get_vector(0) is None
+
+
+def _open(directory):
+    index = PersistentIVFIndex.open(str(directory))
+    assert index is not None
+    return index
+
+
+def test_delta_log_round_trip(tmp_path):
+    writer = PersistentIVFIndex(str(tmp_path))
+    vecs = _vectors(30)
+    writer.build(range(30), vecs)
+    writer.write_generation()
+
+    writer.append(ann_index._OP_ADD, [40, 41], _vectors(2, seed=3))
+    writer.append(ann_index._OP_REMOVE, [2, 41])
+
+    reader = _open(tmp_path)
+    assert isinstance(reader._vecs, np.memmap)
+    assert len(reader) == len(writer) == 30
+    assert reader.get_vector(2) is None and reader.get_vector(41) is None
+    assert np.allclose(reader.get_vector(40), writer.get_vector(40))
+
+
+def test_reader_refreshes_from_tail(tmp_path):
+    writer = PersistentIVFIndex(str(tmp_path))
+    writer.build(range(10), _vectors(10))
+    writer.write_generation()
+    reader = _open(tmp_path)
+    base = reader._vecs
+
+    writer.append(ann_index._OP_ADD, [11], _vectors(1, seed=4))
+    assert reader.is_current()
+    reader.refresh()
+    # seule la fin du journal est relue : la base n'est pas rechargée
+    assert reader._vecs is base
+    assert reader.get_vector(11) is not None
+    assert reader._delta_offset == writer._delta_offset
+
+
+def test_partial_record_ignored_then_truncated(tmp_path):
+    writer = PersistentIVFIndex(str(tmp_path))
+    writer.build(range(10), _vectors(10))
+    writer.write_generation()
+    with open(writer._path("delta"), "ab") as f:
+        f.write(b"\x01\x02\x03")   # écrivain interrompu
+
+    reader = _open(tmp_path)
+    assert len(reader) == 10 and reader._delta_offset == 0
+
+    writer.append(ann_index._OP_ADD, [12], _vectors(1, seed=5))
+    reader.refresh()
+    assert reader.get_vector(12) is not None
+
+
+def test_generation_switch(tmp_path, monkeypatch):
+    monkeypatch.setattr(ann_index, "ANN_DIR", str(tmp_path))
+    model_id = "model-1"
+    directory = tmp_path / model_id
+    writer = PersistentIVFIndex(str(directory))
+    writer.build(range(10), _vectors(10))
+    writer.write_generation()
+    monkeypatch.setattr(ann_index, "_indexes", {})
+
+    reader = ann_index.get_related_index(model_id)
+    assert reader.generation == 1
+
+    monkeypatch.setattr(PersistentIVFIndex, "COMPACT_MIN_DELTA", 2)
+    monkeypatch.setattr(PersistentIVFIndex, "COMPACT_RATIO", 0.0)
+    ann_index._indexes.clear()   # l'écrivain est un autre processus
+    ann_index.update_related_index(model_id, [20, 21, 22], _vectors(3, seed=6))
+    ann_index._indexes[model_id] = reader
+
+    fresh = ann_index.get_related_index(model_id)
+    assert fresh is not reader
+    assert fresh.generation == 2 and len(fresh) == 13
+    assert len(fresh._delta_ids) == 0
+
+    ann_index.remove_from_related_index(model_id, [21])
+    assert ann_index.get_related_index(model_id).get_vector(21) is None
+
+
+def test_first_update_builds_from_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(ann_index, "ANN_DIR", str(tmp_path))
+    monkeypatch.setattr(ann_index, "_indexes", {})
+    vecs = _vectors(4)
+    rows = [(i, 8, vecs[i].tobytes()) for i in range(4)]
+    monkeypatch.setattr(ann_index, "iter_article_embeddings", lambda model_id: iter([rows]))
+    (tmp_path / "m.npz").write_bytes(b"old")
+
+    ann_index.update_related_index("m", [3], vecs[3:])
+    index = ann_index.get_related_index("m")
+    assert len(index) == 4 and index.generation == 1
+    assert not (tmp_path / "m.npz").exists()
+    assert ann_index.get_related_index("absent") is None
@@ -0,0 +1,126 @@
+import os
+import re
+
+import pytest
+
+db_mysql = pytest.importorskip("db_mysql")
+
+from conftest import FakeConnection, prefix_handler
+
+SCRIPT_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "script.sql")
+
+
+def _migration_handler(versions, lock_result=1):
+    """versions : MAX(version) renvoyé à chaque lecture successive."""
+    reads = iter(versions)
+    return prefix_handler({
+        "SELECT COALESCE(MAX(version), 0)": lambda params: [(next(reads),)],
+        "SELECT GET_LOCK": [(lock_result,)],
+        "SELECT RELEASE_LOCK": [(1,)],
+    })
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    """Remplace les migrations par des fonctions qui notent leur passage."""
+    calls = []
+
+    def recorder(version):
+        return lambda cur: calls.append(version)
+
+    migrations = [(v, d, recorder(v)) for v, d, _ in db_mysql.MIGRATIONS]
+    monkeypatch.setattr(db_mysql, "MIGRATIONS", migrations)
+    return calls
+
+
+def test_migrations_are_contiguous():
+    versions = [v for v, _, _ in db_mysql.MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+    assert db_mysql.SCHEMA_VERSION == versions[-1]
+    assert all(callable(m) for _, _, m in db_mysql.MIGRATIONS)
+
+
+def test_up_to_date_schema_skips_lock(fake_db, applied):
+    fake_db.handler = _migration_handler([db_mysql.SCHEMA_VERSION])
+    db_mysql.init_db()
+    assert applied == []
+    assert fake_db.statements("SELECT GET_LOCK") == []
+    assert fake_db.closed == 1
+
+
+@pytest.mark.parametrize("lock_result", [0, None])
+def test_lock_not_acquired_raises(fake_db, applied, lock_result):
+    fake_db.handler = _migration_handler([3], lock_result=lock_result)
+    with pytest.raises(RuntimeError):
+        db_mysql.init_db()
+    assert applied == []
+    assert fake_db.statements("INSERT INTO schema_version") == []
+    assert fake_db.closed == 1
+
+
+def test_pending_migrations_applied_in_order(fake_db, applied):
+    fake_db.handler = _migration_handler([8, 8])
+    db_mysql.init_db()
+
+    expected = list(range(9, db_mysql.SCHEMA_VERSION + 1))
+    assert applied == expected
+    inserted = [params[0] for _, params in fake_db.statements("INSERT INTO schema_version")]
+    assert inserted == expected
+    # une transaction par migration, verrou libéré en fin de passe
+    assert fake_db.commits == 1 + len(expected)
+    assert fake_db.statements("SELECT RELEASE_LOCK") == [
+        ("SELECT RELEASE_LOCK(%s)", (db_mysql.SCHEMA_MIGRATION_LOCK,))]
+    assert fake_db.closed == 1
+
+
+def test_version_reread_under_lock(fake_db, applied):
+    # un autre processus a migré pendant l'attente du verrou
+    fake_db.handler = _migration_handler([5, db_mysql.SCHEMA_VERSION])
+    db_mysql.init_db()
+    assert applied == []
+    assert fake_db.statements("SELECT GET_LOCK") == [
+        ("SELECT GET_LOCK(%s, %s)",
+         (db_mysql.SCHEMA_MIGRATION_LOCK, db_mysql.SCHEMA_MIGRATION_LOCK_TIMEOUT))]
+
+
+def test_failed_migration_releases_lock(fake_db, monkeypatch):
+    def boom(cur):
+        raise RuntimeError("échec")
+
+    migrations = [(v, d, boom if v == db_mysql.SCHEMA_VERSION else (lambda cur: None))
+                  for v, d, _ in db_mysql.MIGRATIONS]
+    monkeypatch.setattr(db_mysql, "MIGRATIONS", migrations)
+    fake_db.handler = _migration_handler([db_mysql.SCHEMA_VERSION - 2] * 2)
+
+    with pytest.raises(RuntimeError, match="échec"):
+        db_mysql.init_db()
+    inserted = [params[0] for _, params in fake_db.statements("INSERT INTO schema_version")]
+    assert inserted == [db_mysql.SCHEMA_VERSION - 1]
+    assert len(fake_db.statements("SELECT RELEASE_LOCK")) == 1
+    assert fake_db.closed == 1
+
+
+def test_script_sql_matches_migrations():
+    with open(SCRIPT_SQL, encoding="utf-8") as f:
+        script = f.read()
+    block = script.split("INSERT INTO schema_version", 1)[1].split(";", 1)[0]
+    rows = [(int(v), d.replace("''", "'"))
+            for v, d in re.findall(r"\((\d+), '((?:[^']|'')*)', NOW\(\)\)", block)]
+    assert rows == [(v, d) for v, d, _ in db_mysql.MIGRATIONS]
+
+
+@pytest.mark.parametrize("helper, args, errno", [
+    (db_mysql._create_index, ("articles", "idx_x", "verifie"), 1061),
+    (db_mysql._add_column, ("feed_cache", "last_published", "DATETIME"), 1060),
+])
+def test_helpers_tolerate_rerun(helper, args, errno):
+    def already_applied(sql, params):
+        raise db_mysql.mysql.connector.Error(errno=errno)
+
+    helper(FakeConnection(already_applied).cursor(), *args)
+
+    def other_error(sql, params):
+        raise db_mysql.mysql.connector.Error(errno=1146)
+
+    with pytest.raises(db_mysql.mysql.connector.Error):
+        helper(FakeConnection(other_error).cursor(), *args)
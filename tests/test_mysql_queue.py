@@ -0,0 +1,84 @@
+import threading
+from datetime import timedelta
+
+import pytest
+
+db_mysql = pytest.importorskip("db_mysql")
+
+from conftest import requires_mysql
+
+pytestmark = requires_mysql
+
+
+def _task(conn, task_id):
+    conn.commit()   # nouvelle transaction : lire l'état validé
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT * FROM work_queue WHERE id = %s", (task_id,))
+    return cur.fetchone()
+
+
+def test_claim_skips_locked_rows(mysql_db):
+    first = db_mysql.enqueue_task("fetch", {"source": "arxiv"}, priority=5)
+    second = db_mysql.enqueue_task("fetch", {"source": "nvidia"})
+
+    # un autre worker tient la première tâche (transaction ouverte)
+    cur = mysql_db.cursor()
+    cur.execute("SELECT id FROM work_queue WHERE id = %s FOR UPDATE", (first,))
+    cur.fetchall()
+
+    tasks = db_mysql.claim_tasks("w1", limit=2)
+    assert [t["id"] for t in tasks] == [second]
+    mysql_db.rollback()
+
+    (task,) = db_mysql.claim_tasks("w2", limit=2)
+    assert task["id"] == first and task["payload"] == {"source": "arxiv"}
+    row = _task(mysql_db, first)
+    assert row["status"] == "running" and row["locked_by"] == "w2"
+    assert row["pending_key"] is None
+
+
+def test_concurrent_claims_never_share_a_task(mysql_db):
+    ids = {db_mysql.enqueue_task("classify", {"n": n}) for n in range(20)}
+    claimed = {}
+    barrier = threading.Barrier(4)
+
+    def work(worker_id):
+        barrier.wait()
+        while True:
+            tasks = db_mysql.claim_tasks(worker_id, limit=3)
+            if not tasks:
+                return
+            claimed.setdefault(worker_id, []).extend(t["id"] for t in tasks)
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    all_claimed = [i for worker_ids in claimed.values() for i in worker_ids]
+    assert sorted(all_claimed) == sorted(ids)
+
+
+def test_fail_task_backoff_then_failed(mysql_db):
+    task_id = db_mysql.enqueue_task("fetch", {}, max_attempts=2)
+    delays = []
+    for attempt in (1, 2):
+        # rend la tâche disponible sans attendre le délai
+        mysql_db.cursor().execute(
+            "UPDATE work_queue SET available_at = %s WHERE id = %s",
+            (db_mysql.datetime.utcnow() - timedelta(seconds=1), task_id))
+        mysql_db.commit()
+        (task,) = db_mysql.claim_tasks("w1")
+        assert task["attempts"] == attempt
+        db_mysql.fail_task(task_id, "w1", ValueError("flux indisponible"))
+        row = _task(mysql_db, task_id)
+        delays.append(row["available_at"] - row["updated_at"])
+
+    assert delays == [timedelta(seconds=db_mysql.TASK_RETRY_DELAY * f) for f in (1, 2)]
+    assert row["status"] == "failed"
+    assert row["last_error"] == "flux indisponible"
+
+    # écriture d'un worker qui ne tient pas la tâche : ignorée
+    db_mysql.fail_task(task_id, "w2", "autre")
+    assert _task(mysql_db, task_id)["last_error"] == "flux indisponible"
@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+
+db_mysql = pytest.importorskip("db_mysql")
+
+from conftest import requires_mysql
+
+pytestmark = requires_mysql
+
+
+def _article(n):
+    return {"title": f"Article {n}", "source": "arxiv", "published": "2024-05-01",
+            "hash": f"h{n:04d}", "categorie": "NLP", "classe": "Recherche"}
+
+
+def test_concurrent_save_articles_report_each_row_once(mysql_db):
+    batches = [[_article(n) for n in range(0, 60)],
+               [_article(n) for n in range(30, 90)],
+               [_article(n) for n in range(45, 100)]]
+    results = [None] * len(batches)
+    barrier = threading.Barrier(len(batches))
+
+    def save(i):
+        barrier.wait()
+        results[i] = db_mysql.save_articles(batches[i], batch_size=10)
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(len(batches))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    inserted = [a["hash"] for r in results for a in r["inserted_articles"]]
+    assert sorted(inserted) == [f"h{n:04d}" for n in range(100)]
+    assert sum(r["inserted"] for r in results) == 100
+    assert sum(r["skipped"] for r in results) == sum(map(len, batches)) - 100
+
+    mysql_db.commit()
+    cur = mysql_db.cursor()
+    cur.execute("SELECT COUNT(*) FROM articles")
+    assert cur.fetchone()[0] == 100
+    cur.execute("SELECT SUM(cnt) FROM article_rollup")
+    assert int(cur.fetchone()[0]) == 100
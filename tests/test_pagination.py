@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pytest
+
+db_mysql = pytest.importorskip("db_mysql")
+
+
+def _rows():
+    # égalités de collected_at et anciens articles sans date de collecte
+    t1 = datetime(2024, 5, 2, 10, 0, 0)
+    t2 = datetime(2024, 5, 1, 9, 30, 0)
+    rows = [{"id": i, "collected_at": t1} for i in (10, 11, 12)]
+    rows += [{"id": i, "collected_at": t2} for i in (3, 7, 8)]
+    rows += [{"id": i, "collected_at": None} for i in (1, 2, 4, 5)]
+    return rows
+
+
+def _keyset_handler(rows):
+    """Évalue la condition de curseur de get_articles_page comme MySQL."""
+    def sort_key(r):
+        # ORDER BY collected_at DESC, id DESC : NULL en dernier
+        return (r["collected_at"] is not None, r["collected_at"] or datetime.min, r["id"])
+
+    def handler(sql, params):
+        if "FROM articles" not in sql:
+            return None
+        *cond, limit = params
+        selected = rows
+        if "(collected_at IS NULL AND id < %s)" in sql:
+            (article_id,) = cond
+            selected = [r for r in rows if r["collected_at"] is None and r["id"] < article_id]
+        elif "collected_at = %s AND id < %s" in sql:
+            ts, _, article_id = cond
+            selected = [r for r in rows
+                        if r["collected_at"] is None
+                        or r["collected_at"] < ts
+                        or (r["collected_at"] == ts and r["id"] < article_id)]
+        return sorted(selected, key=sort_key, reverse=True)[:limit]
+
+    return handler
+
+
+def test_cursor_round_trip():
+    row = {"id": 42, "collected_at": datetime(2024, 1, 2, 3, 4, 5)}
+    cursor = db_mysql.encode_cursor(row)
+    assert cursor == "2024-01-02T03:04:05|42"
+    assert db_mysql.decode_cursor(cursor) == (row["collected_at"], 42)
+
+
+def test_null_cursor_round_trip():
+    cursor = db_mysql.encode_cursor({"id": 7, "collected_at": None})
+    assert cursor == "-|7"
+    assert db_mysql.decode_cursor(cursor) == (None, 7)
+
+
+@pytest.mark.parametrize("cursor", ["", "abc", "2024-01-02|x", "None|3", "2024-13-01T00:00:00|1"])
+def test_decode_invalid_cursor(cursor):
+    assert db_mysql.decode_cursor(cursor) is None
+
+
+def test_invalid_cursor_raises(fake_db):
+    with pytest.raises(ValueError):
+        db_mysql.get_articles_page(limit=5, cursor="pas-un-curseur")
+    assert fake_db.executed == []
+
+
+def test_pages_cover_every_row_once(fake_db):
+    rows = _rows()
+    fake_db.handler = _keyset_handler(rows)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = db_mysql.get_articles_page(limit=4, cursor=cursor)
+        seen.extend(r["id"] for r in page)
+        pages += 1
+        if cursor is None:
+            break
+        assert pages < 10
+
+    assert seen == [12, 11, 10, 8, 7, 3, 5, 4, 2, 1]
+    assert pages == 3
+
+
+def test_last_full_page_has_no_cursor(fake_db):
+    fake_db.handler = _keyset_handler(_rows()[:4])
+    page, cursor = db_mysql.get_articles_page(limit=4)
+    assert len(page) == 4
+    assert cursor is None
+    # LIMIT demande une ligne de plus pour détecter la page suivante
+    assert fake_db.executed[-1][1][-1] == 5
+
+
+def test_null_segment_cursor_condition(fake_db):
+    fake_db.handler = lambda sql, params: []
+    db_mysql.get_articles_page(limit=3, cursor="-|9")
+    sql, params = fake_db.executed[-1]
+    assert "(collected_at IS NULL AND id < %s)" in sql
+    assert "collected_at < %s" not in sql
+    assert params == (9, 4)
+
+
+def test_search_escapes_like_wildcards(fake_db):
+    fake_db.handler = lambda sql, params: []
+    db_mysql.get_articles_page(limit=3, source="arxiv", q="100%_gpu")
+    sql, params = fake_db.executed[-1]
+    assert "(title LIKE %s OR summary_short LIKE %s)" in sql
+    assert params == ("arxiv", "%100\\%\\_gpu%", "%100\\%\\_gpu%", 4)
+
+
+def test_escape_like():
+    assert db_mysql._escape_like("a\\b%c_d") == "a\\\\b\\%c\\_d"
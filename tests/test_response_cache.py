@@ -0,0 +1,122 @@
+import pytest
+
+flask = pytest.importorskip("flask")
+response_cache = pytest.importorskip("response_cache")
+
+from response_cache import ResponseCache, cached_view
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # "a" redevient le plus récent
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_expires_entries(clock):
+    cache = ResponseCache(max_entries=8, ttl=10)
+    cache.set("a", 1)
+    clock[0] += 9
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+@pytest.fixture
+def app(monkeypatch):
+    version = {"value": 1}
+    monkeypatch.setattr(response_cache, "get_data_version", lambda: version["value"])
+
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    app.config["version"] = version
+    app.config["renders"] = []
+    cache = ResponseCache(max_entries=16, ttl=300)
+
+    @app.route("/dashboard")
+    @cached_view(cache)
+    def dashboard():
+        app.config["renders"].append(version["value"])
+        return f"page v{version['value']}"
+
+    @app.route("/login-role/<role>")
+    def login_role(role):
+        flask.session["role"] = role
+        return "ok"
+
+    @app.route("/flash")
+    def flash_then_dashboard():
+        flask.flash("Article rejeté")
+        return "ok"
+
+    return app
+
+
+def test_same_version_is_served_from_cache(app):
+    client = app.test_client()
+    first = client.get("/dashboard")
+    second = client.get("/dashboard")
+    assert first.data == second.data == b"page v1"
+    assert app.config["renders"] == [1]
+    assert first.headers["ETag"] == second.headers["ETag"]
+
+
+def test_bumped_version_recomputes(app):
+    client = app.test_client()
+    client.get("/dashboard")
+    app.config["version"]["value"] = 2
+    response = client.get("/dashboard")
+    assert response.data == b"page v2"
+    assert app.config["renders"] == [1, 2]
+    assert response.headers["ETag"].strip('"').startswith("2-")
+
+
+def test_matching_etag_returns_304(app):
+    client = app.test_client()
+    etag = client.get("/dashboard").headers["ETag"]
+    response = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    app.config["version"]["value"] = 2
+    response = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_role_is_part_of_the_key(app):
+    client = app.test_client()
+    client.get("/login-role/analyste")
+    client.get("/dashboard")
+    client.get("/login-role/decideur")
+    client.get("/dashboard")
+    assert app.config["renders"] == [1, 1]
+
+
+def test_pending_flash_bypasses_cache(app):
+    client = app.test_client()
+    client.get("/dashboard")
+    client.get("/flash")
+    client.get("/dashboard")
+    assert app.config["renders"] == [1, 1]
+
+
+def test_unknown_version_bypasses_cache(app):
+    app.config["version"]["value"] = None
+    client = app.test_client()
+    client.get("/dashboard")
+    client.get("/dashboard")
+    assert app.config["renders"] == [None, None]
+    assert "ETag" not in client.get("/dashboard").headers
@@ -0,0 +1,174 @@
+import pytest
+
+db_mysql = pytest.importorskip("db_mysql")
+
+from conftest import SqlSimulator
+
+HASH_INDEX = 5          # position de hash dans _article_params
+ROW_WIDTH = 12
+
+
+class ArticlesTable(SqlSimulator):
+    """
+    Table articles simulée pour save_articles : clé unique sur hash,
+    INSERT IGNORE, SAVEPOINT / ROLLBACK TO SAVEPOINT. concurrent contient
+    les hashes insérés par un autre processus entre le SELECT et l'INSERT.
+    """
+
+    ROUTES = {
+        "SELECT hash FROM articles": "select_hashes",
+        "INSERT IGNORE INTO articles": "insert_ignore",
+        "SELECT built_at FROM term_stats_meta": "built_at_row",
+    }
+    STATE = ("hashes",)
+    STRICT = False
+
+    def __init__(self, existing=(), concurrent=(), built_at=None):
+        self.hashes = set(existing)
+        self.concurrent = set(concurrent)
+        self.built_at = built_at
+
+    def select_hashes(self, params):
+        found = [(h,) for h in params if h in self.hashes]
+        # l'autre processus insère juste après notre lecture
+        self.hashes |= self.concurrent
+        return found
+
+    def insert_ignore(self, params):
+        inserted = 0
+        for i in range(0, len(params), ROW_WIDTH):
+            h = params[i + HASH_INDEX]
+            if h not in self.hashes:
+                self.hashes.add(h)
+                inserted += 1
+        return inserted
+
+    def built_at_row(self, params):
+        return [(self.built_at,)]
+
+
+def _article(n, **extra):
+    a = {"title": f"Article {n}", "source": "arxiv", "published": "2024-05-01",
+         "hash": f"h{n}", "categorie": "NLP", "classe": "Recherche"}
+    a.update(extra)
+    return a
+
+
+def test_no_concurrent_insert(fake_db):
+    fake_db.handler = ArticlesTable(existing={"h2"})
+    articles = [_article(n) for n in range(1, 5)]
+
+    result = db_mysql.save_articles(articles)
+
+    assert result["inserted"] == 3
+    assert result["skipped"] == 1
+    assert [a["hash"] for a in result["inserted_articles"]] == ["h1", "h3", "h4"]
+    assert fake_db.statements("ROLLBACK TO SAVEPOINT") == []
+    assert len(fake_db.statements("INSERT IGNORE INTO articles")) == 1
+    assert fake_db.commits == 1
+    assert fake_db.closed == 1
+
+
+def test_concurrent_insert_falls_back_row_by_row(fake_db):
+    fake_db.handler = ArticlesTable(existing={"h1"}, concurrent={"h3"})
+    articles = [_article(n) for n in range(1, 5)]
+
+    result = db_mysql.save_articles(articles)
+
+    # h3 a été inséré par l'autre processus : il n'est pas à nous
+    assert [a["hash"] for a in result["inserted_articles"]] == ["h2", "h4"]
+    assert result["inserted"] == 2
+    assert result["skipped"] == 2
+    assert len(fake_db.statements("ROLLBACK TO SAVEPOINT save_articles_chunk")) == 1
+    # 1 INSERT multi-lignes annulé puis 1 INSERT par article
+    assert len(fake_db.statements("INSERT IGNORE INTO articles")) == 1 + len(articles)
+
+
+def test_duplicates_in_batch_counted_once(fake_db):
+    fake_db.handler = ArticlesTable()
+    articles = [_article(1), _article(1), _article(2)]
+
+    result = db_mysql.save_articles(articles)
+
+    assert result["inserted"] == 2
+    assert result["skipped"] == 1
+    assert fake_db.statements("ROLLBACK TO SAVEPOINT") == []
+
+
+def test_chunks_follow_batch_size(fake_db):
+    fake_db.handler = ArticlesTable(existing={"h3"})
+    articles = [_article(n) for n in range(1, 6)]
+
+    result = db_mysql.save_articles(articles, batch_size=2)
+
+    assert result["inserted"] == 4
+    assert len(fake_db.statements("SELECT hash FROM articles")) == 3
+    assert len(fake_db.statements("INSERT IGNORE INTO articles")) == 3
+
+
+def test_nothing_inserted_keeps_data_version(fake_db):
+    fake_db.handler = ArticlesTable(existing={"h1", "h2"})
+
+    result = db_mysql.save_articles([_article(1), _article(2)])
+
+    assert result == {"inserted": 0, "skipped": 2, "inserted_articles": []}
+    assert fake_db.statements("UPDATE data_version") == []
+    assert fake_db.executed_many == []
+
+
+def test_rollup_counts_only_active_articles(fake_db):
+    fake_db.handler = ArticlesTable()
+    articles = [_article(1), _article(2), _article(3, classe="Industrie"),
+                _article(4, verifie=1)]
+
+    db_mysql.save_articles(articles)
+
+    (sql, rows), = fake_db.executed_many
+    assert sql.startswith("INSERT INTO article_rollup")
+    counts = {row[:3]: row[4] for row in rows}
+    assert counts == {("arxiv", "NLP", "Recherche"): 2, ("arxiv", "NLP", "Industrie"): 1}
+    assert len(fake_db.statements("UPDATE data_version")) == 1
+
+
+def test_term_counter_waits_for_built_stats(fake_db):
+    calls = []
+
+    def counter(articles, sign):
+        calls.append(([a["hash"] for a in articles], sign))
+        return {"gpu": 2}
+
+    fake_db.handler = ArticlesTable(built_at=None)
+    db_mysql.save_articles([_article(1)], term_counter=counter)
+    assert calls == []
+    assert fake_db.statements("UPDATE term_stats_meta") == []
+
+
+def test_term_counter_sees_inserted_articles(fake_db):
+    calls = []
+
+    def counter(articles, sign):
+        calls.append(([a["hash"] for a in articles], sign))
+        return {"gpu": 2}
+
+    fake_db.handler = ArticlesTable(existing={"h1"}, built_at="2024-05-01 00:00:00")
+    db_mysql.save_articles([_article(1), _article(2)], term_counter=counter)
+
+    assert calls == [(["h2"], 1)]
+    assert fake_db.statements("UPDATE term_stats_meta") == [
+        ("UPDATE term_stats_meta SET n_docs = GREATEST(n_docs + %s, 0) WHERE id = 1", (1,))]
+
+
+def test_error_rolls_back(fake_db):
+    table = ArticlesTable()
+
+    def handler(sql, params):
+        if sql.startswith("UPDATE data_version"):
+            raise RuntimeError("connexion perdue")
+        return table(sql, params)
+
+    fake_db.handler = handler
+    with pytest.raises(RuntimeError):
+        db_mysql.save_articles([_article(1)])
+    assert fake_db.rollbacks == 1
+    assert fake_db.commits == 0
+    assert fake_db.closed == 1
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+source_scheduling = pytest.importorskip("source_scheduling")
+
+from source_scheduling import (
+    GLOBAL_RUN_STATE,
+    SOURCE_STATE_PREFIX,
+    custom_source_name,
+    due_sources,
+    source_schedules,
+)
+
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def states(monkeypatch):
+    """Lignes scheduler_state renvoyées par get_scheduler_states()."""
+    states = {}
+    monkeypatch.setattr(source_scheduling, "get_scheduler_states", lambda: states)
+    return states
+
+
+def _cfg(**extra):
+    cfg = {
+        "frequency": "daily",
+        "sources": ["arxiv", "nvidia", "huggingface"],
+        "source_settings": {
+            "arxiv": {"interval_hours": 1, "priority": 10},
+            "nvidia": {"priority": 5},
+        },
+    }
+    cfg.update(extra)
+    return cfg
+
+
+def test_never_run_sources_are_due_by_priority(states):
+    assert due_sources(_cfg(), now=NOW) == ["arxiv", "nvidia", "huggingface"]
+
+
+def test_max_sources_per_run_keeps_highest_priority(states):
+    assert due_sources(_cfg(max_sources_per_run=2), now=NOW) == ["arxiv", "nvidia"]
+
+
+def test_per_source_interval(states):
+    states[SOURCE_STATE_PREFIX + "arxiv"] = NOW - timedelta(minutes=59)
+    states[SOURCE_STATE_PREFIX + "nvidia"] = NOW - timedelta(hours=2)
+    states[SOURCE_STATE_PREFIX + "huggingface"] = NOW - timedelta(days=1)
+    # arxiv (1 h) pas encore dû ; nvidia suit la fréquence globale (1 jour)
+    assert due_sources(_cfg(), now=NOW) == ["huggingface"]
+
+
+def test_global_run_is_the_fallback(states):
+    states[GLOBAL_RUN_STATE] = NOW - timedelta(hours=3)
+    assert due_sources(_cfg(), now=NOW) == ["arxiv"]
+
+
+def test_unreadable_state_skips_dispatch(monkeypatch):
+    monkeypatch.setattr(source_scheduling, "get_scheduler_states", lambda: None)
+    assert due_sources(_cfg(), now=NOW) == []
+
+
+def test_once_without_interval_is_not_scheduled(states):
+    cfg = _cfg(frequency="once")
+    assert [name for name, _, _ in source_schedules(cfg)] == ["arxiv"]
+    assert due_sources(cfg, now=NOW) == ["arxiv"]
+
+
+@pytest.mark.parametrize("opts", [
+    {"interval_hours": "souvent"},
+    {"interval_hours": -2},
+    {"interval_hours": 1e400},
+    {"priority": "haute"},
+    {"priority": [1]},
+])
+def test_invalid_settings_are_skipped(opts, capsys):
+    cfg = {"frequency": "daily", "sources": ["arxiv", "nvidia"],
+           "source_settings": {"arxiv": opts}}
+    assert [name for name, _, _ in source_schedules(cfg)] == ["nvidia"]
+    assert "Planification ignorée pour arxiv" in capsys.readouterr().out
+
+
+def test_custom_feed_settings(states):
+    cfg = {
+        "frequency": "weekly",
+        "custom_sources": [
+            {"url": "https://example.com/rss.xml", "name": "Mon blog",
+             "interval_hours": 6, "priority": 3},
+            "https://other.example/feed",
+        ],
+    }
+    schedules = source_schedules(cfg)
+    assert schedules[0] == ("Mon blog", timedelta(hours=6), 3)
+    assert schedules[1][1:] == (timedelta(weeks=1), 0)
+
+
+def test_unnamed_custom_feeds_get_distinct_names(states):
+    feeds = [{"url": "https://a.example/rss"}, {"url": "https://b.example/rss"},
+             "https://c.example/rss"]
+    names = [custom_source_name(f) for f in feeds]
+    assert len(set(names)) == 3
+    assert all(n.startswith("Custom Source #") for n in names)
+    # même URL : même nom, en dict comme en chaîne
+    assert custom_source_name("https://a.example/rss") == names[0]
+
+    states[SOURCE_STATE_PREFIX + names[0]] = NOW
+    due = due_sources({"frequency": "daily", "custom_sources": feeds}, now=NOW)
+    assert due == names[1:]
@@ -0,0 +1,153 @@
+import pytest
+
+db_mysql = pytest.importorskip("db_mysql")
+
+from conftest import FakeConnection, prefix_handler
+
+
+def _replay(conn, table):
+    """Rejoue sur table ({terme: tf}) les écritures de _apply_term_stats."""
+    for sql, rows in conn.executed_many:
+        assert sql.startswith("INSERT INTO term_stats")
+        for term, tf in rows:
+            table[term] = table.get(term, 0) + tf
+    for sql, params in conn.statements("DELETE FROM term_stats"):
+        for term in params:
+            if term in table and table[term] <= 0:
+                del table[term]
+    return table
+
+
+def test_increment_does_not_delete():
+    conn = FakeConnection()
+    db_mysql._apply_term_stats(conn.cursor(), {"gpu": 3, "llama": 1}, 2)
+
+    assert _replay(conn, {}) == {"gpu": 3, "llama": 1}
+    assert conn.statements("DELETE FROM term_stats") == []
+    assert conn.statements("UPDATE term_stats_meta") == [
+        ("UPDATE term_stats_meta SET n_docs = GREATEST(n_docs + %s, 0) WHERE id = 1", (2,))]
+
+
+def test_decrement_deletes_only_decremented_terms():
+    conn = FakeConnection()
+    table = {"gpu": 3, "llama": 1, "orphan": 0}
+    db_mysql._apply_term_stats(conn.cursor(), {"llama": -1, "gpu": -1}, -1)
+
+    # "orphan" n'est pas touché : la suppression cible les termes décrémentés
+    assert _replay(conn, table) == {"gpu": 2, "orphan": 0}
+    (sql, params), = conn.statements("DELETE FROM term_stats")
+    assert sql == "DELETE FROM term_stats WHERE term IN (%s, %s) AND tf <= 0"
+    assert sorted(params) == ["gpu", "llama"]
+    assert conn.statements("UPDATE term_stats_meta")[0][1] == (-1,)
+
+
+def test_decrement_is_chunked():
+    conn = FakeConnection()
+    terms = [f"t{i}" for i in range(5)]
+    db_mysql._apply_term_stats(conn.cursor(), {t: -1 for t in terms}, -1, chunk_size=2)
+    assert [len(rows) for _, rows in conn.executed_many] == [2, 2, 1]
+    assert [len(params) for _, params in conn.statements("DELETE FROM term_stats")] == [2, 2, 1]
+
+
+@pytest.mark.parametrize("row", [None, (None,), {"built_at": None}])
+def test_record_skipped_until_built(row):
+    conn = FakeConnection(lambda sql, params: [row] if row is not None else [])
+    calls = []
+    db_mysql._record_term_stats(conn.cursor(), lambda a, s: calls.append(s), [{"title": "x"}], 1)
+    assert calls == []
+    assert conn.executed_many == []
+
+
+@pytest.mark.parametrize("row", [("2024-05-01",), {"built_at": "2024-05-01"}])
+def test_record_applies_signed_counts(row):
+    conn = FakeConnection(lambda sql, params: [row])
+    articles = [{"title": "a"}, {"title": "b"}]
+    db_mysql._record_term_stats(conn.cursor(), lambda a, s: {"gpu": s}, articles, -1)
+
+    assert conn.executed_many[0][1] == [("gpu", -1)]
+    assert conn.statements("UPDATE term_stats_meta")[0][1] == (-2,)
+
+
+def test_record_without_counter_skips_query():
+    conn = FakeConnection()
+    db_mysql._record_term_stats(conn.cursor(), None, [{"title": "x"}], 1)
+    assert conn.executed == []
+
+
+def test_reject_article_removes_terms(fake_db):
+    article = {"id": 5, "title": "GPU kernels", "summary": "", "source": "arxiv",
+               "categorie": "NLP", "classe": "Recherche", "collected_at": None}
+
+    fake_db.handler = prefix_handler({
+        "SELECT id, title, summary": [article],
+        "SELECT built_at": [{"built_at": "2024-05-01"}],
+    })
+    seen = []
+
+    def counter(articles, sign):
+        seen.append(sign)
+        return {"gpu": sign}
+
+    assert db_mysql.reject_article(5, term_counter=counter) == article
+    assert seen == [-1]
+    assert ("gpu", -1) in fake_db.executed_many[-1][1]
+    assert len(fake_db.statements("UPDATE data_version")) == 1
+
+
+def test_article_term_counts_sign():
+    pytest.importorskip("sklearn")
+    pytest.importorskip("sentence_transformers")
+    from roles.analyste import article_term_counts, count_terms
+
+    articles = [{"title": "Sparse attention", "summary": "attention kernels for GPU"},
+                {"title": "GPU scheduling", "summary": None}]
+    tf = count_terms(["Sparse attention attention kernels for GPU", "GPU scheduling"])
+    assert tf["attention"] == 2
+    assert tf["gpu"] == 2
+    assert "for" not in tf
+
+    assert article_term_counts(articles, sign=-1) == {t: -c for t, c in tf.items()}
+
+
+def test_rollup_breakdown(fake_db):
+    fake_db.handler = lambda sql, params: [
+        ("arxiv", "NLP", 4), ("arxiv", "", 1), ("nvidia", "NLP", 2), ("nvidia", "Vision", 0)]
+    by_source, by_category = db_mysql.get_rollup_breakdown()
+    assert by_source == {"arxiv": 5, "nvidia": 2}
+    assert by_category == {"NLP": 6, "Autres sujets IA": 1}
+    (sql, _), = fake_db.executed
+    assert "FROM article_rollup" in sql
+
+
+def test_corpus_analysis_reads_no_article(monkeypatch):
+    pytest.importorskip("sklearn")
+    pytest.importorskip("sentence_transformers")
+    from roles import analyste
+
+    monkeypatch.setattr(analyste, "term_stats_ready", lambda: True)
+    monkeypatch.setattr(analyste, "get_rollup_breakdown",
+                        lambda: ({"arxiv": 3, "nvidia": 1}, {"NLP": 4}))
+    monkeypatch.setattr(analyste, "get_top_terms", lambda limit: ["gpu", "agents"])
+
+    def no_scan(days=None):
+        raise AssertionError("articles lus")
+
+    monkeypatch.setattr(analyste, "get_articles_for_analysis", no_scan)
+    result = analyste.compute_analysis(analyste.Analyste(load_model=False))
+    assert result["total_documents"] == 4
+    assert result["by_source"] == {"arxiv": 3, "nvidia": 1}
+    assert result["emerging_keywords"] == ["agents", "gpu"]
+    assert result["emerging_by_category"] == {"Autres sujets IA": ["agents", "gpu"]}
+
+
+def test_count_terms_matches_vectorizer_vocabulary():
+    pytest.importorskip("sentence_transformers")
+    sklearn_text = pytest.importorskip("sklearn.feature_extraction.text")
+    from roles.analyste import STOP_WORDS, TOKEN_PATTERN, count_terms
+
+    texts = ["Mixture-of-experts routing on TPU pods", "Routing tables and x86 ops"]
+    vectorizer = sklearn_text.CountVectorizer(stop_words=list(STOP_WORDS),
+                                              token_pattern=TOKEN_PATTERN)
+    vectorizer.fit(texts)
+    tf = count_terms(texts)
+    assert set(tf) == set(vectorizer.vocabulary_)
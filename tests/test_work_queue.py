@@ -0,0 +1,253 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+db_mysql = pytest.importorskip("db_mysql")
+
+from conftest import T0, SqlSimulator
+
+
+class WorkQueue(SqlSimulator):
+    """Table work_queue simulée."""
+
+    ROUTES = {
+        "SELECT id FROM work_queue WHERE status = 'running'": "select_expired",
+        "UPDATE work_queue SET status = 'failed'": "expire",
+        "SELECT id, kind, payload": "select_ready",
+        "UPDATE work_queue SET status = 'running'": "claim",
+        "UPDATE work_queue SET available_at": "start",
+        "UPDATE work_queue SET status = IF": "fail",
+        "UPDATE work_queue SET status = 'done'": "complete",
+        "INSERT IGNORE INTO work_queue": "enqueue",
+    }
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, task_id, kind="fetch", priority=0, attempts=0, max_attempts=3,
+            timeout_seconds=600, available_at=T0, status="queued", payload=None):
+        self.tasks[task_id] = {
+            "id": task_id, "kind": kind, "priority": priority, "attempts": attempts,
+            "max_attempts": max_attempts, "timeout_seconds": timeout_seconds,
+            "available_at": available_at, "status": status, "locked_by": None,
+            "pending_key": f"{kind}:{task_id}", "last_error": None,
+            "payload": json.dumps(payload or {}),
+        }
+        return self.tasks[task_id]
+
+    def _owned(self, task_id, worker_id):
+        task = self.tasks.get(task_id)
+        if task and task["locked_by"] == worker_id and task["status"] == "running":
+            return task
+        return None
+
+    def select_expired(self, params):
+        (now,) = params
+        return [{"id": t["id"]} for t in self.tasks.values()
+                if t["status"] == "running" and t["available_at"] <= now
+                and t["attempts"] >= t["max_attempts"]]
+
+    def expire(self, params):
+        _, *ids = params
+        for task_id in ids:
+            self.tasks[task_id].update(status="failed", last_error="Délai de visibilité dépassé")
+        return len(ids)
+
+    def select_ready(self, params):
+        now, *kinds, limit = params
+        ready = [t for t in self.tasks.values()
+                 if t["status"] in ("queued", "running") and t["available_at"] <= now
+                 and t["attempts"] < t["max_attempts"]
+                 and (not kinds or t["kind"] in kinds)]
+        ready.sort(key=lambda t: (-t["priority"], t["id"]))
+        return [{k: t[k] for k in ("id", "kind", "payload", "attempts",
+                                   "max_attempts", "timeout_seconds")}
+                for t in ready[:limit]]
+
+    def claim(self, params):
+        worker_id, available_at, _, task_id = params
+        t = self.tasks[task_id]
+        t.update(status="running", locked_by=worker_id, pending_key=None,
+                 available_at=available_at, attempts=t["attempts"] + 1)
+        return 1
+
+    def start(self, params):
+        available_at, _, task_id, worker_id = params
+        t = self._owned(task_id, worker_id)
+        if t:
+            t["available_at"] = available_at
+        return int(bool(t))
+
+    def fail(self, params):
+        now, delay, error, _, task_id, worker_id = params
+        t = self._owned(task_id, worker_id)
+        if t:
+            t["status"] = "failed" if t["attempts"] >= t["max_attempts"] else "queued"
+            t["available_at"] = now + timedelta(seconds=delay * 2 ** (t["attempts"] - 1))
+            t["last_error"] = error
+        return int(bool(t))
+
+    def complete(self, params):
+        result, _, task_id, worker_id = params
+        t = self._owned(task_id, worker_id)
+        if t:
+            t["status"] = "done"
+        return int(bool(t))
+
+    def enqueue(self, params):
+        return 1
+
+
+@pytest.fixture
+def queue(fake_db, clock):
+    queue = WorkQueue()
+    fake_db.handler = queue
+    return queue
+
+
+def test_claim_sql_uses_skip_locked(fake_db, clock):
+    fake_db.handler = lambda sql, params: []
+    db_mysql.claim_tasks("w1", kinds=["fetch", "classify"], limit=4)
+    sql, params = fake_db.statements("SELECT id, kind, payload")[0]
+    assert sql.endswith("FOR UPDATE SKIP LOCKED")
+    # l'expiration ne verrouille pas non plus les tâches d'un autre worker
+    (sql_expired, _), = fake_db.statements("SELECT id FROM work_queue")
+    assert sql_expired.endswith("FOR UPDATE SKIP LOCKED")
+    assert fake_db.statements("UPDATE work_queue") == []
+    assert "AND kind IN (%s, %s)" in sql
+    assert params == (T0, "fetch", "classify", 4)
+
+
+def test_claim_order_and_visibility(queue, clock):
+    queue.add(1, priority=0)
+    queue.add(2, priority=5, kind="classify", timeout_seconds=1800, payload={"article_ids": [3]})
+    queue.add(3, priority=5, available_at=T0 + timedelta(minutes=1))
+
+    tasks = db_mysql.claim_tasks("w1", limit=2)
+
+    assert [t["id"] for t in tasks] == [2, 1]
+    assert tasks[0]["payload"] == {"article_ids": [3]}
+    assert tasks[0]["attempts"] == 1
+    # délai de visibilité propre à chaque tâche
+    assert queue.tasks[2]["available_at"] == T0 + timedelta(seconds=1800)
+    assert queue.tasks[1]["available_at"] == T0 + timedelta(seconds=600)
+    assert queue.tasks[1]["pending_key"] is None
+    assert db_mysql.claim_tasks("w2", limit=5) == []
+
+
+def test_expired_task_is_reclaimed(queue, clock):
+    queue.add(1, timeout_seconds=60)
+    db_mysql.claim_tasks("w1")
+
+    clock["now"] = T0 + timedelta(seconds=59)
+    assert db_mysql.claim_tasks("w2") == []
+
+    clock["now"] = T0 + timedelta(seconds=60)
+    (task,) = db_mysql.claim_tasks("w2")
+    assert task["attempts"] == 2
+    assert queue.tasks[1]["locked_by"] == "w2"
+
+    # le premier worker a perdu la tâche : ses écritures sont ignorées
+    assert db_mysql.start_task(1, "w1", 60) is False
+    db_mysql.complete_task(1, "w1", {"inserted": 3})
+    assert queue.tasks[1]["status"] == "running"
+
+
+def test_start_task_restarts_visibility(queue, clock):
+    queue.add(1, timeout_seconds=600)
+    db_mysql.claim_tasks("w1")
+
+    clock["now"] = T0 + timedelta(seconds=500)
+    assert db_mysql.start_task(1, "w1", 600) is True
+    assert queue.tasks[1]["available_at"] == clock["now"] + timedelta(seconds=600)
+
+
+def test_fail_task_backoff_then_failed(queue, clock):
+    queue.add(1, max_attempts=3)
+    delays = []
+    for attempt in range(1, 4):
+        (task,) = db_mysql.claim_tasks("w1")
+        assert task["attempts"] == attempt
+        db_mysql.fail_task(1, "w1", ValueError("flux indisponible"))
+        delays.append(queue.tasks[1]["available_at"] - clock["now"])
+        clock["now"] = queue.tasks[1]["available_at"]
+
+    assert delays == [timedelta(seconds=db_mysql.TASK_RETRY_DELAY * f) for f in (1, 2, 4)]
+    assert queue.tasks[1]["status"] == "failed"
+    assert queue.tasks[1]["last_error"] == "flux indisponible"
+    assert db_mysql.claim_tasks("w1") == []
+
+
+def test_expired_last_attempt_fails(queue, clock):
+    queue.add(1, max_attempts=1, timeout_seconds=60)
+    db_mysql.claim_tasks("w1")
+    clock["now"] = T0 + timedelta(seconds=61)
+
+    assert db_mysql.claim_tasks("w2") == []
+    assert queue.tasks[1]["status"] == "failed"
+    assert queue.tasks[1]["last_error"] == "Délai de visibilité dépassé"
+
+
+def test_fail_task_truncates_error(fake_db, clock):
+    fake_db.handler = lambda sql, params: 1
+    db_mysql.fail_task(7, "w1", "x" * 5000)
+    (sql, params), = fake_db.executed
+    assert "POW(2, attempts - 1)" in sql
+    assert params == (T0, db_mysql.TASK_RETRY_DELAY, "x" * 2000, T0, 7, "w1")
+
+
+@pytest.mark.parametrize("kind, timeout", [("classify", 1800), ("backfill", 3600), ("inconnu", 600)])
+def test_enqueue_default_timeout(fake_db, clock, kind, timeout):
+    fake_db.handler = lambda sql, params: 1
+    assert db_mysql.enqueue_task(kind, {}) is not None
+    params = fake_db.executed[-1][1]
+    assert params[4] == timeout
+
+
+def test_enqueue_duplicate_pending_key(fake_db, clock):
+    fake_db.handler = lambda sql, params: 0
+    assert db_mysql.enqueue_task("analysis", {}, pending_key="analysis") is None
+
+
+@pytest.fixture
+def worker():
+    pytest.importorskip("sentence_transformers")
+    pytest.importorskip("feedparser")
+    pytest.importorskip("scholarly")
+    import worker
+    return worker
+
+
+def test_worker_skips_lost_and_fails_broken_tasks(worker, monkeypatch):
+    tasks = [
+        {"id": 1, "kind": "fetch", "payload": {}, "attempts": 1, "max_attempts": 3,
+         "timeout_seconds": 600},
+        {"id": 2, "kind": "fetch", "payload": {}, "attempts": 1, "max_attempts": 3,
+         "timeout_seconds": 600},
+        {"id": 3, "kind": "analysis", "payload": {}, "attempts": 2, "max_attempts": 3,
+         "timeout_seconds": 900},
+    ]
+    batches = [tasks, []]
+    events = []
+
+    def fetch(payload):
+        events.append("fetch")
+        return {"inserted": 0}
+
+    def analysis(payload):
+        raise RuntimeError("modèle absent")
+
+    monkeypatch.setattr(worker, "claim_tasks", lambda worker_id, kinds, limit: batches.pop(0))
+    monkeypatch.setattr(worker, "start_task",
+                        lambda task_id, worker_id, timeout: task_id != 2)
+    monkeypatch.setattr(worker, "complete_task",
+                        lambda task_id, worker_id, result: events.append(("done", task_id)))
+    monkeypatch.setattr(worker, "fail_task",
+                        lambda task_id, worker_id, error: events.append(("failed", task_id, str(error))))
+    monkeypatch.setitem(worker.TASK_HANDLERS, "fetch", fetch)
+    monkeypatch.setitem(worker.TASK_HANDLERS, "analysis", analysis)
+
+    worker.run_worker(batch=3, once=True)
+
+    assert events == ["fetch", ("done", 1), ("failed", 3, "modèle absent")]
@@ -0,0 +1,146 @@
+"""
+Worker de la file de travail MySQL (table work_queue).
+
+    python worker.py                      # tous les types de tâches
+    python worker.py --kinds fetch        # collecte seulement (I/O réseau)
+    python worker.py --kinds classify,analysis --batch 2
+
+Autant de workers que nécessaire peuvent tourner, sur une ou plusieurs
+machines : chaque tâche est réclamée par un seul worker (SKIP LOCKED),
+retentée en cas d'échec et reprise par un autre worker si elle dépasse
+son délai de visibilité.
+"""
+import os
+import time
+import socket
+import argparse
+
+from db_mysql import init_db, enqueue_task, claim_tasks, start_task, complete_task, fail_task
+from roles.veilleur import Veilleur
+from roles.analyste import Analyste, refresh_analysis_snapshot
+
+# ---------- CONFIG ----------
+POLL_INTERVAL = 5            # secondes d'attente quand la file est vide
+CLASSIFY_BATCH_SIZE = 200    # articles par tâche de classification
+
+
+# ---------- TÂCHES ----------
+
+def handle_fetch(payload):
+    """Collecte d'une source, puis mise en file de sa classification par paquets."""
+    article_ids = Veilleur(**payload.get("veilleur", {})).fetch_and_store()
+    for i in range(0, len(article_ids), CLASSIFY_BATCH_SIZE):
+        enqueue_task(
+            "classify",
+            {
+                "article_ids": article_ids[i:i + CLASSIFY_BATCH_SIZE],
+                "analysis_window_days": payload.get("analysis_window_days"),
+            },
+            priority=payload.get("priority", 0),
+        )
+    return {"inserted": len(article_ids)}
+
+
+def _enqueue_analysis(days):
+    enqueue_task("analysis", {"days": days}, pending_key="analysis")
+
+
+def handle_classify(payload):
+    """Classification d'un paquet d'articles, puis snapshot d'analyse à refaire."""
+    classified = Veilleur().classify_stored(payload.get("article_ids", []))
+    if classified:
+        _enqueue_analysis(payload.get("analysis_window_days"))
+    return {"classified": classified}
+
+
+def handle_backfill(payload):
+    """
+    Rattrapage périodique des articles restés sans catégorie (tâches
+    "classify" en échec définitif), avec point de reprise.
+    """
+    classified = Veilleur().backfill_categories(only_missing=True)
+    if classified:
+        _enqueue_analysis(payload.get("analysis_window_days"))
+    return {"classified": classified}
+
+
+def handle_analysis(payload):
+    """Recalcul du snapshot d'analyse lu par les tableaux de bord."""
+    refresh_analysis_snapshot(Analyste(load_model=True), days=payload.get("days"))
+    return {}
+
+
+TASK_HANDLERS = {
+    "fetch": handle_fetch,
+    "classify": handle_classify,
+    "analysis": handle_analysis,
+    "backfill": handle_backfill,
+}
+
+
+# ---------- BOUCLE DU WORKER ----------
+
+def run_worker(kinds=None, batch=1, once=False, poll_interval=POLL_INTERVAL):
+    """
+    Réclame et exécute les tâches en boucle. once=True : s'arrête dès que
+    la file est vide (utile en cron ou en test).
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    kinds = [k for k in (kinds or TASK_HANDLERS) if k in TASK_HANDLERS]
+    print(f"👷 Worker {worker_id} démarré ({', '.join(kinds)})")
+
+    while True:
+        try:
+            tasks = claim_tasks(worker_id, kinds=kinds, limit=batch)
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la récupération des tâches : {e}")
+            tasks = []
+
+        if not tasks:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        for task in tasks:
+            # délai de visibilité compté depuis le démarrage, pas la réclamation
+            try:
+                if not start_task(task["id"], worker_id, task["timeout_seconds"]):
+                    print(f"ℹ️ Tâche {task['id']} ({task['kind']}) reprise par un autre worker")
+                    continue
+            except Exception as e:
+                print(f"⚠️ Impossible de démarrer la tâche {task['id']} : {e}")
+                continue
+            started = time.perf_counter()
+            try:
+                result = TASK_HANDLERS[task["kind"]](task["payload"])
+                complete_task(task["id"], worker_id, result)
+                print(f"✅ Tâche {task['id']} ({task['kind']}) terminée "
+                      f"en {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                print(f"⚠️ Tâche {task['id']} ({task['kind']}) en échec "
+                      f"(essai {task['attempts']}/{task['max_attempts']}) : {e}")
+                try:
+                    fail_task(task["id"], worker_id, e)
+                except Exception as e2:
+                    print(f"⚠️ Impossible d'enregistrer l'échec de la tâche {task['id']} : {e2}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de la file de travail de la veille")
+    parser.add_argument("--kinds", default="",
+                        help="types de tâches traités, séparés par des virgules "
+                             f"({', '.join(TASK_HANDLERS)}) ; tous par défaut")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="nombre de tâches réclamées à la fois")
+    parser.add_argument("--once", action="store_true",
+                        help="s'arrêter quand la file est vide")
+    args = parser.parse_args()
+
+    init_db()
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()] or None
+    run_worker(kinds=kinds, batch=max(1, args.batch), once=args.once)
+
+
+if __name__ == "__main__":
+    main()